@@ -0,0 +1,71 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Measures ComponentManager initialization: full parsing, compiled configuration cache and
+lazy configuration followed by access to a single component.
+
+Usage: python benchmarks/bench_config.py [-n COMPONENTS]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.manager import ComponentManager
+
+
+def write_config(path, components):
+    with open(path, "w") as f:
+        f.write("basePort = 10000\n")
+        for g in xrange(components / 50):
+            f.write("[group:g{0}]\nlogPath = $HOME/log/$EC_COMPONENT\ndataPath = $HOME/data\nbasePort = {1}\n".format(g, 10000 + g * 100))
+            for i in xrange(50):
+                f.write("   [[g{0}.q{1}]]\n   type = q:rdb\n   command = q rdb.q\n   port = $basePort + {1}\n".format(g, i))
+                if i:
+                    f.write("   requires = g{0}.q{1}\n".format(g, i - 1))
+                f.write("   startWait = 2\n   memCap = 1000\n")
+
+
+def measure(name, config_file, status_file, lazy = False):
+    started = time.time()
+    manager = ComponentManager(config_file, status_file, lazy)
+    manager.components["g0.q0"].stdout, manager.configuration["g0.q0"].port
+    print "{0:<8} {1:>10.2f} ms".format(name, (time.time() - started) * 1000)
+
+
+if __name__ == "__main__":
+    opt_parser = OptionParser()
+    opt_parser.add_option("-n", "--components", type = "int", default = 1000, help = "number of components [default: %default]")
+    (options, args) = opt_parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(tmp, "system.cfg")
+        status_file = os.path.join(tmp, "yak.status")
+        write_config(config_file, options.components)
+        print "{0} lines".format(sum(1 for _ in open(config_file)))
+        measure("parsed", config_file, status_file)
+        measure("cached", config_file, status_file)
+        measure("lazy", config_file, os.path.join(tmp, "lazy.status"), True)
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,78 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Compares parsing each instance of multi-instance component separately with template expansion
+used by load_configuration.
+
+Usage: python benchmarks/bench_instances.py [-n INSTANCES]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from configobj import ConfigObj
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.component import ComponentConfiguration
+import components.q
+
+
+SECTIONS = {"shared": "   port = $basePort + 1\n",
+            "per-instance": "   port = $basePort + $EC_COMPONENT_INSTANCE\n   logPath = $HOME/log/${EC_COMPONENT}_$EC_COMPONENT_INSTANCE\n"}
+
+
+def write_config(path, instances, section):
+    with open(path, "w") as f:
+        f.write("basePort = 10000\n[group:feed]\nlogPath = $HOME/log/$EC_COMPONENT\ndataPath = $HOME/data\nexport = handler, venue\n")
+        f.write("handler = fh\nvenue = xnas\n   [[feed.fh:{0}]]\n   type = q:feed\n   command = q fh.q\n   libs = a.q, b.q, c.q\n".format(instances))
+        f.write("   commandArgs = -t 1000\n   memCap = 1000\n   startWait = 2\n   cpuAffinity = 1, 2\n")
+        f.write(SECTIONS[section])
+
+
+def separately(path):
+    confobj = ConfigObj(path)
+    header = confobj["group:feed"].sections[0]
+    cfg = (confobj["group:feed"][header], confobj["group:feed"], dict((p, confobj[p]) for p in confobj.scalars))
+    return [ComponentConfiguration.create_instance("q", ("feed", "fh", str(i)), cfg) for i in xrange(int(header.split(":")[1]))]
+
+
+def measure(name, f, path):
+    started = time.time()
+    f(path)
+    return (time.time() - started) * 1000
+
+
+if __name__ == "__main__":
+    opt_parser = OptionParser()
+    opt_parser.add_option("-n", "--instances", type = "int", default = 500, help = "number of instances [default: %default]")
+    (options, args) = opt_parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "system.cfg")
+        for section in sorted(SECTIONS):
+            write_config(path, options.instances, section)
+            before = measure("separately", separately, path)
+            after = measure("template", ComponentConfiguration.load_configuration, path)
+            print "{0:<14} separately {1:>8.2f} ms   template {2:>8.2f} ms".format(section, before, after)
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,73 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Compares per-property psutil calls with the bulk process snapshot readers.
+
+Usage: python benchmarks/bench_osutil.py [-n PIDS] [-r REPEAT]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import osutil
+
+
+def per_property(pids):
+    for pid in pids:
+        if osutil.is_alive(pid):
+            osutil.get_command_line(pid)
+            osutil.get_cpu_user(pid)
+            osutil.get_cpu_sys(pid)
+            osutil.get_memory_rss(pid)
+            osutil.get_memory_vms(pid)
+            osutil.get_memory_percent(pid)
+
+
+def measure(name, f, pids, repeat):
+    best = None
+    for _ in xrange(repeat):
+        started = time.time()
+        f(pids)
+        elapsed = time.time() - started
+        best = min(best, elapsed) if best is not None else elapsed
+    print "{0:<24} {1:>10.2f} ms {2:>10.1f} us/pid".format(name, best * 1000, best * 1e6 / len(pids))
+
+
+if __name__ == "__main__":
+    opt_parser = OptionParser()
+    opt_parser.add_option("-n", "--pids", type = "int", default = 1000, help = "number of processes [default: %default]")
+    opt_parser.add_option("-r", "--repeat", type = "int", default = 5, help = "number of repetitions [default: %default]")
+    (options, args) = opt_parser.parse_args()
+
+    children = [subprocess.Popen(["sleep", "600"]) for _ in xrange(options.pids)]
+    pids = [p.pid for p in children]
+    try:
+        measure("per-property psutil", per_property, pids, options.repeat)
+        measure("psutil snapshot", osutil.psutil_snapshot, pids, options.repeat)
+        if sys.platform.lower().startswith("linux"):
+            from osutil._linux import read_processes
+            measure("native /proc snapshot", read_processes, pids, options.repeat)
+    finally:
+        for p in children:
+            p.kill()
+            p.wait()
@@ -0,0 +1,82 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Measures ComponentManager.reload executed before each shell command: full rebuild,
+status file unchanged and single component changed by another process.
+
+Usage: python benchmarks/bench_reload.py [-n COMPONENTS] [-r REPEAT]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.component import Component
+from components.manager import ComponentManager
+from components.status import StatusPersistance
+
+
+def measure(name, manager, repeat, prepare):
+    elapsed = 0.0
+    for _ in xrange(repeat):
+        prepare()
+        started = time.time()
+        manager.reload()
+        elapsed += time.time() - started
+    print "{0:<12} {1:>10.3f} ms".format(name, elapsed * 1000 / repeat)
+
+
+if __name__ == "__main__":
+    opt_parser = OptionParser()
+    opt_parser.add_option("-n", "--components", type = "int", default = 500, help = "number of components [default: %default]")
+    opt_parser.add_option("-r", "--repeat", type = "int", default = 20, help = "number of reloads [default: %default]")
+    (options, args) = opt_parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        config_file = os.path.join(tmp, "system.cfg")
+        status_file = os.path.join(tmp, "yak.status")
+        with open(config_file, "w") as f:
+            f.write("[group:core]\nlogPath = {0}\ndataPath = {0}\n".format(tmp))
+            for i in xrange(options.components):
+                f.write("   [[core.c{0}]]\n   type = cmd\n   command = sleep 60\n".format(i))
+
+        writer = StatusPersistance(status_file)
+        with writer.transaction():
+            for i in xrange(options.components):
+                writer.save_status(Component("core.c{0}".format(i), executed_cmd = "sleep 60", started = datetime.now(), stopped = datetime.now()))
+
+        manager = ComponentManager(config_file, status_file)
+
+        def invalidate():
+            manager._loaded_version = (None, None)
+
+        def touch():
+            writer.save_status(Component("core.c0", executed_cmd = "sleep 60", started = datetime.now(), stopped = datetime.now()))
+
+        measure("full", manager, options.repeat, invalidate)
+        measure("unchanged", manager, options.repeat, lambda: None)
+        measure("one changed", manager, options.repeat, touch)
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,66 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Compares per-spawn latency of Popen with preexec_fn and posix_spawn based process launch.
+
+Usage: python benchmarks/bench_spawn.py [-n SPAWNS] [-m MEGABYTES]
+"""
+
+import os
+import sys
+import time
+
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from osutil import _spawn
+
+
+def popen(cmd, env):
+    from osutil import execute_popen
+    return execute_popen(cmd, bin_path = os.curdir, env = env)
+
+
+def posix_spawn(cmd, env):
+    return _spawn.spawn(cmd, cwd = os.curdir, env = env, stdin = open(os.devnull, "r+"))
+
+
+def measure(name, f, spawns):
+    cmd, env = ["true"], os.environ.copy()
+    elapsed = 0.0
+    for _ in xrange(spawns):
+        started = time.time()
+        p = f(cmd, env)
+        elapsed += time.time() - started
+        p.wait()
+    print "{0:<16} {1:>10.1f} us/spawn".format(name, elapsed * 1e6 / spawns)
+
+
+if __name__ == "__main__":
+    opt_parser = OptionParser()
+    opt_parser.add_option("-n", "--spawns", type = "int", default = 500, help = "number of processes started [default: %default]")
+    opt_parser.add_option("-m", "--megabytes", type = "int", default = 0, help = "size of memory allocated by the parent process [default: %default]")
+    (options, args) = opt_parser.parse_args()
+
+    ballast = bytearray(options.megabytes * 1024 * 1024)  # touched pages enlarge the page tables copied by fork
+    for i in xrange(0, len(ballast), 4096):
+        ballast[i] = 1
+
+    measure("Popen", popen, options.spawns)
+    if _spawn.is_supported():
+        measure("posix_spawn", posix_spawn, options.spawns)
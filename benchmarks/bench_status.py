@@ -0,0 +1,78 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Compares per-row commits with per-phase transactions of status writes made by 'start *' and 'stop *'.
+Per-row mode is emulated by disabling StatusPersistance.transaction.
+
+Usage: python benchmarks/bench_status.py [-n COMPONENTS]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from contextlib import contextmanager
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.manager import ComponentManager
+
+
+@contextmanager
+def no_transaction():
+    yield
+
+
+def write_config(path, count):
+    with open(path, "w") as f:
+        f.write("[group:core]\nstartWait = 0.01\nstopWait = 2\n")
+        f.write("binPath = {0}\ndataPath = {0}\nlogPath = {0}\n".format(os.path.dirname(path)))
+        for i in xrange(count):
+            f.write("  [[core.c{0}]]\n  type = cmd\n  command = sleep 600\n".format(i))
+
+
+def measure(name, tmp, count, batched):
+    config_file = os.path.join(tmp, name + ".cfg")
+    write_config(config_file, count)
+    manager = ComponentManager(config_file, os.path.join(tmp, name + ".status"))
+    persistance = manager._persistance
+    if not batched:
+        persistance.transaction = no_transaction
+    components = manager.dependencies_order
+
+    for operation, run in (("start", manager.start), ("stop", manager.stop)):
+        commits = persistance.commits
+        started = time.time()
+        run(components if operation == "start" else list(reversed(components)))
+        elapsed = time.time() - started
+        print "{0:<8} {1:<6} {2:>6} commits {3:>10.2f} ms".format(name, operation, persistance.commits - commits, elapsed * 1000)
+
+
+if __name__ == "__main__":
+    opt_parser = OptionParser()
+    opt_parser.add_option("-n", "--components", type = "int", default = 100, help = "number of components [default: %default]")
+    (options, args) = opt_parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        measure("per-row", tmp, options.components, False)
+        measure("batched", tmp, options.components, True)
+    finally:
+        shutil.rmtree(tmp)
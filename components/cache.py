@@ -0,0 +1,163 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import cPickle
+import gc
+import hashlib
+import os
+import re
+import sys
+import tempfile
+
+from components import version
+from components.component import ComponentConfiguration, itersubclasses
+
+
+ENV_VARS_RE = re.compile("\$(\w+)|\$\{(\w+)\}|%(\w+)%")
+CACHE_FORMAT = 5
+
+
+class ConfigurationCache(object):
+    """
+    Persistent cache of compiled configuration. Cache entry is valid as long as the configuration
+    file contents, values of environment variables referenced by the configuration and the yak
+    installation are unchanged.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+
+    @staticmethod
+    def digest(content):
+        """Returns digest of the configuration file contents"""
+        return hashlib.sha1(content).hexdigest()
+
+    @staticmethod
+    def key(content):
+        """
+        Returns cache key for the configuration file contents.
+        @param content: contents of the configuration file
+        """
+        variables = sorted(set(name for match in ENV_VARS_RE.findall(content) for name in match if name))
+        key = [CACHE_FORMAT, version.__version__, ConfigurationCache.digest(content),
+               [(name, os.environ.get(name)) for name in variables],
+               ConfigurationCache._parsers()]
+        return hashlib.sha1(repr(key)).hexdigest()
+
+    @staticmethod
+    def _parsers():
+        """Returns modification times of modules implementing configuration parsing"""
+        classes = [ComponentConfiguration] + list(itersubclasses(ComponentConfiguration))
+        sources = sorted(set(os.path.splitext(sys.modules[cls.__module__].__file__)[0] + ".py" for cls in classes))
+        return [(source, os.path.getmtime(source) if os.path.exists(source) else None) for source in sources]
+
+    @staticmethod
+    def _trusted(stat):
+        """
+        Unpickling can execute arbitrary code, so the cache is loaded only if it is owned by the current user
+        (or root) and cannot be modified by other users. Checked on the opened file, so it cannot be swapped.
+        """
+        if not hasattr(os, "getuid"):  # windows
+            return True
+        return stat.st_uid in (os.getuid(), 0) and not stat.st_mode & 022
+
+    def load(self, key):
+        """
+        Loads compiled configuration from the cache.
+        @param key: cache key computed for the configuration file
+        @return: compiled configuration or None if cache is missing, outdated, cannot be read or is not trusted
+        """
+        collect = gc.isenabled()
+        gc.disable()  # unpickling creates many objects, avoid repeated collections
+        try:
+            with open(self.cache_file, "rb") as f:
+                if not self._trusted(os.fstat(f.fileno())):
+                    return None
+                cached_key, data = cPickle.load(f)
+            return data if cached_key == key else None
+        except Exception:
+            return None
+        finally:
+            if collect:
+                gc.enable()
+
+    def store(self, key, data):
+        """
+        Stores compiled configuration in the cache. Failures are ignored, cache is rebuilt by the next invocation.
+        @param key: cache key computed for the configuration file
+        @param data: compiled configuration
+        """
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir = os.path.dirname(self.cache_file) or os.curdir, prefix = ".yak")
+            with os.fdopen(fd, "wb") as f:
+                cPickle.dump((key, data), f, cPickle.HIGHEST_PROTOCOL)
+            if os.path.exists(self.cache_file) and sys.platform == "win32":
+                os.remove(self.cache_file)
+            os.rename(tmp, self.cache_file)
+        except (IOError, OSError, cPickle.PicklingError):
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+
+
+class CompletionCache(object):
+    """
+    Names of managed components, groups and namespaces used by the bash completion script (one name
+    per line). The first line holds the digest of the configuration the names were taken from, followed
+    by the path of the configuration file, so that the script can verify whether the cache is up to date.
+    """
+
+    def __init__(self, cache_file, config_file = None):
+        """
+        @param cache_file: location of the cache
+        @param config_file: configuration file the names are taken from
+        """
+        self.cache_file = cache_file
+        self.config_file = os.path.abspath(config_file) if config_file else None
+
+    def _header(self):
+        try:
+            with open(self.cache_file, "rb") as f:
+                return f.readline().lstrip("#").strip().split(" ", 1)
+        except IOError:
+            return [""]
+
+    def digest(self):
+        """Returns digest of the configuration stored in the cache, None if cache cannot be read"""
+        return self._header()[0] or None
+
+    def store(self, digest, names):
+        """
+        Stores names in the cache unless cache has been already created for the same configuration.
+        Failures are ignored.
+        @param digest: digest of the configuration file contents
+        @param names: list of names
+        """
+        header = [digest, self.config_file] if self.config_file else [digest]
+        if self._header() == header:
+            return
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir = os.path.dirname(self.cache_file) or os.curdir, prefix = ".yak")
+            with os.fdopen(fd, "wb") as f:
+                f.write("# {0}\n".format(" ".join(header)))
+                f.write("".join("{0}\n".format(name) for name in names))
+            if os.path.exists(self.cache_file) and sys.platform == "win32":
+                os.remove(self.cache_file)
+            os.rename(tmp, self.cache_file)
+        except (IOError, OSError):
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
@@ -0,0 +1,137 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Resource isolation with cgroup v2. Each component is placed in its own cgroup <cgroupRoot>/<component id>,
+the root has to be a cgroup delegated to the user running yak (e.g.: a systemd unit with Delegate=yes).
+Component command is started by a shell which moves itself to the cgroup before it executes the command,
+so that processes forked by the component at startup are created in the cgroup as well.
+"""
+
+import errno
+import os
+
+from components import ComponentManagerError
+
+
+CPU_PERIOD = 100000
+
+# interface file -> (controller, value restoring the default)
+INTERFACE_FILES = {"memory.max": ("memory", "max"),
+                   "cpu.max": ("cpu", "max {0}".format(CPU_PERIOD)),
+                   "cpu.weight": ("cpu", "100"),
+                   "io.weight": ("io", "default 100"),
+                   }
+
+
+class CgroupError(ComponentManagerError):
+    pass
+
+
+class Cgroup(object):
+    """
+    cgroup of a single component.
+    """
+
+    def __init__(self, root, name):
+        """
+        @param root: path of the parent cgroup in cgroupfs
+        @param name: name of the cgroup, component identifier
+        """
+        self.root = root
+        self.path = os.path.join(root, name)
+
+    def _read(self, name):
+        with open(os.path.join(self.path, name), "r") as f:
+            return f.read()
+
+    def _write(self, path, value):
+        try:
+            with open(path, "w") as f:
+                f.write(value)
+        except (IOError, OSError), e:
+            raise CgroupError("Cannot write {0} to {1}: {2}".format(value, path, e.strerror or e))
+
+    def create(self, limits):
+        """
+        Creates the cgroup and applies resource limits. Cgroup left by the previous run is recreated if possible,
+        so that its statistics are reset. Controllers required by the limits are enabled in the root.
+        @param limits: dictionary: interface file (e.g.: memory.max) -> value, None restores the default value
+        @raise CgroupError: if cgroup cannot be created or limits cannot be applied
+        """
+        controllers = sorted(set(INTERFACE_FILES[name][0] for name, value in limits.iteritems() if value is not None))
+        subtree_control = os.path.join(self.root, "cgroup.subtree_control")
+        try:
+            with open(subtree_control, "r") as f:
+                enabled = f.read().split()
+        except (IOError, OSError), e:
+            raise CgroupError("Cannot access cgroup root {0}: {1}".format(self.root, e.strerror or e))
+        missing = [controller for controller in controllers if not controller in enabled]
+        if missing:
+            self._write(subtree_control, " ".join("+" + controller for controller in missing))
+
+        try:
+            if os.path.isdir(self.path):
+                os.rmdir(self.path)  # fails if processes are still attached
+        except OSError:
+            pass
+        try:
+            os.mkdir(self.path)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise CgroupError("Cannot create cgroup {0}: {1}".format(self.path, e.strerror))
+
+        for name, value in sorted(limits.iteritems()):
+            path = os.path.join(self.path, name)
+            if value is not None:
+                self._write(path, value)
+            elif os.path.exists(path):
+                self._write(path, INTERFACE_FILES[name][1])
+
+    def attach(self, pid):
+        """
+        Moves process to the cgroup.
+        @raise CgroupError: if process cannot be moved
+        """
+        self._write(os.path.join(self.path, "cgroup.procs"), str(pid))
+
+    def wrap(self, cmd):
+        """
+        Returns command which moves the process to the cgroup and replaces itself with the given command,
+        the PID of the process is retained.
+        @param cmd: command as a list of arguments
+        """
+        return ["/bin/sh", "-c", 'echo $$ > "$0" && exec "$@"', os.path.join(self.path, "cgroup.procs")] + list(cmd)
+
+    @property
+    def memory_current(self):
+        """Returns memory used by processes in the cgroup in bytes, None if not available"""
+        try:
+            return int(self._read("memory.current"))
+        except (IOError, OSError, ValueError):
+            return None
+
+    @property
+    def cpu_usage(self):
+        """Returns cpu time used by processes in the cgroup in seconds, None if not available"""
+        try:
+            for line in self._read("cpu.stat").splitlines():
+                key, value = line.split()
+                if key == "usage_usec":
+                    return int(value) / 1e6
+        except (IOError, OSError, ValueError):
+            pass
+        return None
@@ -13,10 +13,13 @@
 #  limitations under the License.
 #
 
+import hashlib
 import os
 import re
 import shlex
+import signal
 import subprocess
+import time
 
 try:
     from collections import OrderedDict
@@ -24,6 +27,7 @@ except ImportError:  # python < 2.7 -> try to import ordereddict
     from ordereddict import OrderedDict
 
 from configobj import ConfigObj
+from copy import copy, deepcopy
 from datetime import datetime as dt
 from string import Template
 
@@ -31,12 +35,52 @@ import osutil
 
 from components import ComponentManagerError
 from components import version
+from components.cgroup import CPU_PERIOD, Cgroup, CgroupError
+from components.probe import PROBE_INTERVAL, ProbeError, create_probe
 from components.utils import to_underscore
 
 
 DT_FORMAT = "%Y.%m.%dT%H.%M.%S"
 VALID_UID_RE = re.compile("^\w+\.\w+$|^\w+\.\w+_\d+$")
 MISSING_ENV_VARS_RE = re.compile("\$\w+|\$\{\w+\}|%\w+%")
+INSTANCE_VARS_RE = re.compile("\$\{?(EC_COMPONENT_ID|EC_COMPONENT_INSTANCE)(?!\w)")
+BOOT_TIME_TOLERANCE = 5  # seconds
+SIZE_RE = re.compile("^(\d+)\s*([kmgt]?)b?$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+def _same_boot(saved, current):
+    """
+    Compares boot identifiers. Numeric identifiers are boot times (psutil fallback), which are derived
+    from the uptime on some systems and drift by a second or so between calls: they are equal within BOOT_TIME_TOLERANCE.
+    """
+    if saved == current:
+        return True
+    try:
+        return abs(float(saved) - float(current)) <= BOOT_TIME_TOLERANCE
+    except (TypeError, ValueError):
+        return False
+
+
+def identify_process(component):
+    """
+    Verifies whether the PID of the component still belongs to the component process. Process is identified
+    by its start time, PID recorded before the last reboot is never alive. Command line is compared only for
+    status saved by older versions, without boot id.
+    @return: True if process is alive, False if PID is stale, None if a process with a different command line
+        runs with PID saved by older version
+    """
+    boot_id = osutil.get_boot_id()
+    same_boot = _same_boot(component.boot_id, boot_id)
+    if component.boot_id and boot_id and not same_boot:
+        return False
+    elif component.proc_started is not None and same_boot:
+        return component._process_info("start_time", osutil.get_start_time) == component.proc_started
+    elif component.boot_id is None and component._process_info("alive", osutil.is_alive):
+        cmd = shlex.split(str(component.executed_cmd), posix = False)
+        proc_cmd = component.proc_cmd
+        return (not proc_cmd or not cmd or proc_cmd == cmd) or None
+    return False
 
 
 def initialize_plugins(cls):
@@ -91,8 +135,10 @@ class Status(object):
     TERMINATED = "TERMINATED"
     WSFULL = "WSFULL"
     DETACHED = "DETACHED"
+    RESPONSIVE = "RESPONSIVE"
+    UNRESPONSIVE = "UNRESPONSIVE"
 
-running_statuses = (Status.RUNNING, Status.DISTURBED, Status.DETACHED)
+running_statuses = (Status.RUNNING, Status.DISTURBED, Status.DETACHED, Status.RESPONSIVE, Status.UNRESPONSIVE)
 
 
 class Component(object):
@@ -107,8 +153,13 @@ class Component(object):
         self.uid = str(uid)
         self.configuration = kwargs.get("configuration")
         self._process = None
+        self._executed = None
+        self._snapshot = None
 
         self._status_persistance = kwargs.get("status_persistance")
+        self.proc_started = kwargs.get("proc_started")
+        self.boot_id = kwargs.get("boot_id")
+        self.fingerprint = kwargs.get("fingerprint")
 
         self.stdenv = None
         for a in self.attrs[2:]:  # skip uid and read-only properties
@@ -150,11 +201,16 @@ class Component(object):
                 self.stderr = os.devnull
                 self.stdenv = os.devnull
 
-    def _bootstrap_environment(self):
+    def _environment(self):
+        """Returns environment of the component process"""
         env = os.environ.copy()
         env["ECM_VERSION"] = version.__version__
         env.update(self.configuration.vars)
         env.update(self.configuration.env)
+        return env
+
+    def _bootstrap_environment(self):
+        env = self._environment()
 
         if self.stdenv and not self.configuration.silent:
             with open(self.stdenv, "w") as f:
@@ -163,20 +219,98 @@ class Component(object):
 
         return env
 
+    def _command(self, env):
+        """
+        Returns command as a list of arguments. Executable is resolved against PATH from the component
+        environment, so that process environment of yak is never altered.
+        """
+        cmd = shlex.split(self.configuration.full_cmd, posix = False)
+        if cmd:
+            cmd[0] = osutil.find_executable(cmd[0], env.get("PATH", os.defpath), self.configuration.bin_path) or cmd[0]
+        return cmd
+
+    def _placement(self):
+        """
+        Returns cpu affinity (cpuAffinity or cores assigned by the planner) and memory binding of the component
+        process, validated against NUMA topology. Memory is bound to numaNode or, if not set, to the nodes local
+        to the affinity.
+        @raise ComponentError: if placement is invalid
+        """
+        cfg = self.configuration
+        cpus = cfg.cpu_affinity or cfg.planned_affinity or []
+        if not cfg.mem_policy or cfg.mem_policy == "default":
+            return cpus, None, None
+
+        topology = osutil.get_numa_nodes()
+        if not topology:
+            raise ComponentError("Cannot apply memPolicy of component {0}, NUMA topology is not available".format(self.uid))
+
+        nodes = cfg.numa_node or sorted(node for node, node_cpus in topology.iteritems() if set(node_cpus).intersection(cpus))
+        unknown = [node for node in nodes if not node in topology]
+        if unknown:
+            raise ComponentError("Component {0} refers unknown NUMA node(s): {1}".format(self.uid, ", ".join(map(str, unknown))))
+        if not nodes and cfg.mem_policy != "local":
+            raise ComponentError("Component {0}: memPolicy {1} requires numaNode or cpuAffinity".format(self.uid, cfg.mem_policy))
+
+        local = set(cpu for node in nodes for cpu in topology[node])
+        remote = [cpu for cpu in cpus if not cpu in local]
+        if nodes and remote:
+            raise ComponentError("Component {0}: cpuAffinity {1} is not local to NUMA node(s) {2}".format(self.uid, ", ".join(map(str, remote)), ", ".join(map(str, nodes))))
+        return cpus, nodes, cfg.mem_policy
+
+    @property
+    def cgroup(self):
+        """Returns cgroup of the component, None if cgroupRoot is not configured"""
+        return Cgroup(self.configuration.cgroup_root, self.uid) if self.configuration.cgroup_root else None
+
+    def _create_cgroup(self):
+        cgroup = self.cgroup
+        if cgroup:
+            try:
+                cgroup.create(self.configuration.cgroup_limits)
+            except CgroupError, e:
+                raise ComponentError("Cannot isolate component {0}: {1}".format(self.uid, e))
+        return cgroup
+
+    def _attach(self, cgroup, process):
+        """
+        Moves freshly started process to the cgroup of the component. Process started by the command from
+        Cgroup.wrap is already moved before it executes the component, attaching it again reports the failure:
+        process is killed if it cannot be moved, so that component never runs without its resource limits.
+        """
+        if cgroup:
+            try:
+                cgroup.attach(process.pid)
+            except CgroupError, e:
+                os.kill(process.pid, signal.SIGKILL)
+                process.wait()
+                raise ComponentError("Cannot isolate component {0}: {1}".format(self.uid, e))
+
     def execute(self):
-        if self.configuration.cpu_affinity:
-            osutil.set_affinity(os.getpid(), self.configuration.cpu_affinity)
+        cpus, nodes, policy = self._placement()
+        cgroup = self._create_cgroup()
 
         self.executed_cmd = str(self.configuration.full_cmd)
+        self.fingerprint = self.configuration.fingerprint
+        env = self._bootstrap_environment()
+        cmd = cgroup.wrap(self._command(env)) if cgroup else self._command(env)
         with open(self.stdout, "w") as stdout:
             with open(self.stderr, "w") as stderr:
-                self._process = osutil.execute(cmd = shlex.split(self.configuration.full_cmd, posix = False),
-                                              stdout = stdout,
-                                              stderr = stderr,
-                                              bin_path = self.configuration.bin_path,
-                                              env = self._bootstrap_environment()
-                                              )
+                with osutil.placement(cpus, nodes, policy):
+                    self._process = osutil.execute(cmd = cmd,
+                                                  stdout = stdout,
+                                                  stderr = stderr,
+                                                  bin_path = self.configuration.bin_path,
+                                                  env = env
+                                                  )
+                self._attach(cgroup, self._process)
                 self.pid = self._process.pid
+                self._executed = time.time()
+                self._identify_process()
+
+    def _identify_process(self):
+        self.proc_started = osutil.get_start_time(self.pid)
+        self.boot_id = osutil.get_boot_id()
 
     def check_process(self):
         if self._process:
@@ -189,16 +323,42 @@ class Component(object):
                 self.pid = None
                 self.stopped = self.timestamp()
 
+    def wait_ready(self):
+        """
+        Waits until component is ready to serve its dependents. Readiness probe is polled up to startWait
+        period, if no probe is configured, method waits for startWait period.
+        @raise ComponentError: if component is not ready within startWait period.
+        """
+        deadline = (self._executed or time.time()) + (self.configuration.start_wait or 0)
+
+        if not self.configuration.ready_check:
+            time.sleep(max(0, deadline - time.time()))
+            return
+
+        probe = create_probe(self.configuration.ready_check)
+        while not probe.is_ready(self):
+            if self._process and self._process.poll() is not None:
+                return  # process finished, verified by check_process
+            if time.time() >= deadline:
+                raise ComponentError("Component {0} not ready after {1}s: {2}".format(self.uid, self.configuration.start_wait, self.configuration.ready_check))
+            time.sleep(PROBE_INTERVAL)
+
     def interactive(self):
-        if self.configuration.cpu_affinity:
-            osutil.set_affinity(os.getpid(), self.configuration.cpu_affinity)
+        cpus, nodes, policy = self._placement()
+        cgroup = self._create_cgroup()
 
         self.executed_cmd = str(self.configuration.full_cmd)
-        p = subprocess.Popen(shlex.split(self.configuration.full_cmd, posix = False),
-                             cwd = self.configuration.bin_path,
-                             env = self._bootstrap_environment()
-                             )
+        self.fingerprint = self.configuration.fingerprint
+        env = self._bootstrap_environment()
+        cmd = cgroup.wrap(self._command(env)) if cgroup else self._command(env)
+        with osutil.placement(cpus, nodes, policy):
+            p = subprocess.Popen(cmd,
+                                 cwd = self.configuration.bin_path,
+                                 env = env
+                                 )
+        self._attach(cgroup, p)
         self.pid = p.pid
+        self._identify_process()
         self.save_status()
 
         p.communicate()
@@ -208,6 +368,11 @@ class Component(object):
         if p.returncode:
             raise ComponentError("Component {0} finished prematurely with code {1}".format(self.uid, p.returncode))
 
+    @property
+    def drains(self):
+        """Returns True if terminate blocks until the process drains its work"""
+        return False
+
     def terminate(self, force = False):
         osutil.terminate(self.pid, force)
         self.stopped = self.timestamp()
@@ -222,18 +387,35 @@ class Component(object):
         if self._status_persistance:
             self._status_persistance.save_status(self)
 
+    def refresh(self, **status):
+        """Updates component in place with status data reloaded from the status file, drops cached process information"""
+        for attr, value in status.iteritems():
+            setattr(self, attr, value)
+        self._process = None
+        self._snapshot = None
+
+    @property
+    def snapshot(self):
+        """Returns process snapshot taken for the component PID or None if not available"""
+        return self._snapshot if self._snapshot and self.pid and self._snapshot.pid == int(self.pid) else None
+
+    @snapshot.setter
+    def snapshot(self, process):
+        self._snapshot = process
+
+    def _process_info(self, attr, getter):
+        snapshot = self.snapshot
+        return getattr(snapshot, attr) if snapshot else getter(int(self.pid))
+
     @property
     def is_alive(self):
         """Returns true if component is alive, false otherwise"""
         if self.pid:
-            if osutil.is_alive(int(self.pid)):
-                cmd = shlex.split(str(self.executed_cmd), posix = False)
-                proc_cmd = self.proc_cmd
-                return not proc_cmd or not cmd or proc_cmd == cmd
-            else:
+            alive = identify_process(self)
+            if alive is False:
                 self.pid = None
                 self.save_status()
-                return False
+            return bool(alive)
         else:
             return False
 
@@ -250,34 +432,47 @@ class Component(object):
     @property
     def proc_cmd(self):
         """Returns command reported by OS associated with the component PID"""
-        return osutil.get_command_line(self.pid) if self.pid else None
+        return self._process_info("cmdline", osutil.get_command_line) if self.pid else None
 
     @property
     def cpu_user(self):
         """Returns cpu time in user mode for a component"""
-        return osutil.get_cpu_user(self.pid) if self.status in running_statuses else 0.0
+        return self._process_info("cpu_user", osutil.get_cpu_user) if self.status in running_statuses else 0.0
 
     @property
     def cpu_sys(self):
         """Returns cpu time in system mode for a component"""
-        return osutil.get_cpu_sys(self.pid) if self.status in running_statuses else 0.0
+        return self._process_info("cpu_sys", osutil.get_cpu_sys) if self.status in running_statuses else 0.0
 
     @property
     def mem_usage(self):
         """Returns memory usage for a component"""
-        return osutil.get_memory_percent(self.pid) if self.status in running_statuses else 0.0
+        return self._process_info("mem_percent", osutil.get_memory_percent) if self.status in running_statuses else 0.0
 
     @property
     def mem_rss(self):
         """Returns rss memory used by a component"""
-        memrss = osutil.get_memory_rss(self.pid)
-        return memrss / 1024 if self.status in running_statuses and isinstance(memrss, (int, long)) else 0
+        memrss = self._process_info("mem_rss", osutil.get_memory_rss) if self.status in running_statuses else None
+        return memrss / 1024 if isinstance(memrss, (int, long)) else 0
 
     @property
     def mem_vms(self):
         """Returns vms memory used by a component"""
-        memvms = osutil.get_memory_vms(self.pid)
-        return memvms / 1024 if self.status in running_statuses and isinstance(memvms, (int, long)) else 0
+        memvms = self._process_info("mem_vms", osutil.get_memory_vms) if self.status in running_statuses else None
+        return memvms / 1024 if isinstance(memvms, (int, long)) else 0
+
+    @property
+    def cgroup_mem(self):
+        """Returns memory used by the cgroup of the component in kilobytes"""
+        cgroup = self.cgroup if self.status in running_statuses else None
+        memory = cgroup.memory_current if cgroup else None
+        return memory / 1024 if memory is not None else None
+
+    @property
+    def cgroup_cpu(self):
+        """Returns cpu time used by the cgroup of the component in seconds"""
+        cgroup = self.cgroup if self.status in running_statuses else None
+        return cgroup.cpu_usage if cgroup else None
 
     @staticmethod
     def create_instance(typeid, uid, configuration = None, **kwargs):
@@ -293,13 +488,84 @@ class Component(object):
         return Component.plugins[typeid](uid = uid, configuration = configuration, **kwargs)
 
 
+class VariableResolver(object):
+    """
+    Substitutes variables in configuration values. Each value is compiled into a list of tokens once,
+    expansion results are memoized by the value and the values of variables it refers to.
+    Substitution is performed in a single pass: variables are not expanded recursively, unresolved
+    references are reported as ConfigurationError.
+    """
+
+    def __init__(self):
+        self._compiled = dict()
+        self._expanded = dict()
+
+    def compile(self, value):
+        """
+        Splits value into tokens: literal strings and (variable name, reference) tuples.
+        Syntax follows string.Template: $name, ${name}, $$ as escaped delimiter.
+        """
+        tokens = self._compiled.get(value)
+        if tokens is None:
+            tokens, last = [], 0
+            for match in Template.pattern.finditer(value):
+                tokens.append(value[last:match.start()])
+                name = match.group("named") or match.group("braced")
+                tokens.append((name, match.group()) if name is not None else Template.delimiter)
+                last = match.end()
+            tokens.append(value[last:])
+            tokens = self._compiled[value] = tuple(token for token in tokens if token)
+        return tokens
+
+    def expand(self, value, variables, uid):
+        """
+        Substitutes variables and environment variables in the value.
+        @param value: configuration value
+        @param variables: dictionaries with variables ordered by priority
+        @param uid: identifier of the component, used in error message
+        @raise ConfigurationError: if value contains unresolved variables
+        """
+        tokens = self.compile(value)
+        refs = tuple(self._lookup(token[0], variables) for token in tokens if token.__class__ is tuple)
+        key = (value, refs)
+        expanded = self._expanded.get(key)
+        if expanded is None:
+            parts, refs = [], iter(refs)
+            for token in tokens:
+                if token.__class__ is tuple:
+                    ref = next(refs)
+                    token = token[1] if ref is None else ref
+                parts.append(token)
+            expanded = "".join(parts)
+            if "$" in expanded or "%" in expanded:
+                expanded = os.path.expandvars(expanded)
+                if MISSING_ENV_VARS_RE.search(expanded):
+                    raise ConfigurationError("Unresolved variable {0} found in component {1}".format(expanded, uid))
+            self._expanded[key] = expanded
+        return expanded
+
+    @staticmethod
+    def _lookup(name, variables):
+        for v in variables:
+            if name in v:
+                return "%s" % (v[name],)
+        return None
+
+
 class ComponentConfiguration(object):
     """
     Base class for representing component configurations.
     """
 
     typeid = "cmd"
-    attrs = ["uid", "full_cmd", "requires", "command", "command_args", "bin_path", "data_path", "log_path", "cpu_affinity", "start_wait", "stop_wait", "sys_user", "timestamp_mode", "silent"]
+    _resolver = None
+    attrs = ["uid", "full_cmd", "requires", "command", "command_args", "bin_path", "data_path", "log_path", "cpu_affinity", "cpu_cores", "planned_affinity", "numa_node", "mem_policy", "cgroup_root", "memory_max", "cpu_max", "cpu_weight", "io_weight", "start_wait", "stop_wait", "sys_user", "timestamp_mode", "silent", "ready_check"]
+    # attributes defining how the process is launched, covered by the fingerprint
+    launch_attrs = ["full_cmd", "vars", "env", "bin_path", "cpu_affinity"]
+    # part of the launch specification only when set, fingerprints of components not using them are retained
+    placement_attrs = ["planned_affinity", "numa_node", "mem_policy", "cgroup_root", "memory_max", "cpu_max", "cpu_weight", "io_weight"]
+    # settings which can refer to per-instance variables in a cloned template, see resolve_instance
+    instance_keys = ["command", "commandArgs", "binPath", "dataPath", "logPath"]
 
     def __init__(self, uid, **kwargs):
         self.uid = "{0}.{1}".format(*uid) if len(uid) <= 2 else "{0}.{1}_{2}".format(*uid)
@@ -322,15 +588,9 @@ class ComponentConfiguration(object):
         return self.__dict__ == other.__dict__
 
     def _expand_variables(self, value, variables = None):
-        bootstrap = dict(self.vars)
-        if variables:
-            bootstrap.update(variables)
-
         if isinstance(value, basestring):
-            value = os.path.expandvars(Template(value).safe_substitute(bootstrap))
-            if MISSING_ENV_VARS_RE.search(value):
-                raise ConfigurationError("Unresolved variable {0} found in component {1}".format(value, self.uid))
-            return value
+            resolver = self._resolver or VariableResolver()
+            return resolver.expand(value, (variables, self.vars) if variables else (self.vars,), self.uid)
         else:
             return value
 
@@ -360,6 +620,12 @@ class ComponentConfiguration(object):
         except:
             return None
 
+    @staticmethod
+    def _size_(value):
+        """Returns size in bytes, value is a number with optional K, M, G or T suffix"""
+        match = SIZE_RE.match(str(value).strip())
+        return int(match.group(1)) * SIZE_UNITS[match.group(2).lower()] if match else None
+
     @staticmethod
     def _bool_(value):
         if value is True or value is False:
@@ -394,9 +660,20 @@ class ComponentConfiguration(object):
         env = dict(zip(["EC_" + to_underscore(key) for key in env_keys], map(self._expand_variables, env_values)))
         return env
 
-    def parse(self, cfg):
+    def _get_limit(self, attr, cfg, parser, maximum = None):
+        value = self._get_value(attr, cfg)
+        if not value:
+            return None
+        if str(value).strip().lower() == "max" and maximum is None:
+            return "max"
+        limit = parser(value)
+        if limit is None or limit <= 0 or (maximum and limit > maximum):
+            raise ConfigurationError("Component {0}: invalid {1} {2}".format(self.uid, attr, value))
+        return limit
+
+    def parse_header(self, cfg):
         """
-        Parses configuration for particular component.
+        Parses identifiers and dependencies of particular component.
         """
         self.vars = dict()
         self.vars["EC_COMPONENT_ID"] = self.uid
@@ -417,21 +694,131 @@ class ComponentConfiguration(object):
                 self.vars["EC_COMPONENT_PKG"] = ctype2[0]
                 self.vars["EC_COMPONENT_TYPE"] = ctype2[1]
 
-        self.command = self._get_value("command", cfg, required = True)
         self.requires = set([s if VALID_UID_RE.match(s) else "{0}.{1}".format(self.gid, s) for s in self._get_list("requires", cfg)])
+
+    def parse(self, cfg):
+        """
+        Parses configuration for particular component.
+        """
+        self.parse_header(cfg)
+        self.command = self._get_value("command", cfg, required = True)
         self.bin_path = self._get_path("binPath", cfg)
         self.data_path = self._get_path("dataPath", cfg)
         self.log_path = self._get_path("logPath", cfg)
         self.cpu_affinity = [self._int_(v) for v in self._get_list("cpuAffinity", cfg)]
+        self.cpu_cores = self._get_value("cpuCores", cfg)
+        if self.cpu_cores:
+            self.cpu_cores = str(self.cpu_cores).strip().lower()
+            if self.cpu_cores != "auto":
+                self.cpu_cores = self._int_(self.cpu_cores)
+                if not self.cpu_cores or self.cpu_cores < 0:
+                    raise ConfigurationError("Component {0}: invalid cpuCores, expected number of cores or auto".format(self.uid))
+        self.numa_node = [self._int_(v) for v in self._get_list("numaNode", cfg)]
+        self.mem_policy = self._get_value("memPolicy", cfg, "bind" if self.numa_node else None)
+        if self.mem_policy:
+            self.mem_policy = str(self.mem_policy).strip().lower()
+            if not self.mem_policy in osutil.MEMORY_POLICIES:
+                raise ConfigurationError("Component {0}: invalid memPolicy {1}, expected one of: {2}".format(self.uid, self.mem_policy, ", ".join(sorted(osutil.MEMORY_POLICIES))))
+        self.cgroup_root = self._get_file("cgroupRoot", cfg)
+        self.memory_max = self._get_limit("memoryMax", cfg, self._size_)
+        self.cpu_max = self._get_limit("cpuMax", cfg, self._float_)
+        self.cpu_weight = self._get_limit("cpuWeight", cfg, self._int_, 10000)
+        self.io_weight = self._get_limit("ioWeight", cfg, self._int_, 10000)
+        if not self.cgroup_root and any([self.memory_max, self.cpu_max, self.cpu_weight, self.io_weight]):
+            raise ConfigurationError("Component {0}: resource limits require cgroupRoot".format(self.uid))
         self.start_wait = self._float_(self._get_value("startWait", cfg, 1))
         self.stop_wait = self._float_(self._get_value("stopWait", cfg, 1))
         self.sys_user = self._get_list("sysUser", cfg)
         self.command_args = self._get_value("commandArgs", cfg)
         self.timestamp_mode = TimestampMode.from_string(self._get_value("timestampMode", cfg, "utc"))
         self.silent = self._bool_(self._get_value("silent", cfg, False))
+        self.ready_check = self._get_value("readyCheck", cfg)
+        if isinstance(self.ready_check, list):  # pattern containing commas
+            self.ready_check = ",".join(self.ready_check)
+        if self.ready_check:
+            try:
+                create_probe(self.ready_check)
+            except ProbeError, e:
+                raise ConfigurationError("Component {0}: {1}".format(self.uid, e))
+            if not self.start_wait > 0:  # startWait = 0 waits for the process to finish
+                raise ConfigurationError("Component {0}: readyCheck requires positive startWait".format(self.uid))
+
+        self.env = self._get_env_vars_list(cfg)
 
+    def parse_shared(self, cfg, resolver):
+        """
+        Parses configuration using variable resolver shared by all components loaded from the same file.
+        @param resolver: VariableResolver instance
+        """
+        self._resolver = resolver
+        try:
+            self.parse(cfg)
+        finally:
+            del self._resolver
+
+    def clone(self, instance, cfg = None, keys = (), resolver = None):
+        """
+        Returns configuration of another instance of multi-instance component. Settings referring to
+        per-instance variables are resolved again, valid only if all of them are clonable (see clonable).
+        @param instance: instance identifier
+        @param cfg: tuple containing dictionaries with configuration ordered by priority
+        @param keys: names of the settings referring to per-instance variables (see instance_dependent)
+        @param resolver: VariableResolver instance
+        """
+        c = copy(self)
+        for name, value in self.__dict__.iteritems():  # instances must not share mutable settings
+            if isinstance(value, (list, dict, set)):
+                setattr(c, name, deepcopy(value))
+        c.uid = "{0}.{1}_{2}".format(self.gid, self.cid, instance)
+        c.instance = instance
+        c.vars.update(EC_COMPONENT_ID = c.uid, EC_COMPONENT_INSTANCE = instance)
+        if keys:
+            c._resolver = resolver
+            try:
+                c.resolve_instance(cfg, keys)
+            finally:
+                del c._resolver
+        return c
+
+    def resolve_instance(self, cfg, keys):
+        """
+        Resolves settings of a cloned configuration which refer to per-instance variables.
+        @param cfg: tuple containing dictionaries with configuration ordered by priority
+        @param keys: names of the settings referring to per-instance variables
+        """
+        if "command" in keys:
+            self.command = self._get_value("command", cfg, required = True)
+        if "commandArgs" in keys:
+            self.command_args = self._get_value("commandArgs", cfg)
+        for key, attr in (("binPath", "bin_path"), ("dataPath", "data_path"), ("logPath", "log_path")):
+            if key in keys:
+                setattr(self, attr, self._get_path(key, cfg))
         self.env = self._get_env_vars_list(cfg)
 
+    @classmethod
+    def clonable(cls, keys):
+        """
+        Returns True if instances can be cloned from a parsed template: settings referring to per-instance
+        variables are either listed in instance_keys or are not component settings (e.g. exported variables).
+        @param keys: names of the settings referring to per-instance variables
+        """
+        return all(key in cls.instance_keys or not (key in ("type", "export") or to_underscore(key).lower() in cls.attrs) for key in keys)
+
+    @staticmethod
+    def instance_dependent(cfg):
+        """
+        Returns names of the settings which refer to per-instance variables.
+        @param cfg: tuple containing dictionaries with configuration ordered by priority
+        @return: set of setting names, empty if configuration is the same for all instances
+        """
+        keys = set()
+        for cfg_group in cfg:
+            for key, value in cfg_group.iteritems():
+                for v in (value if isinstance(value, list) else [value]):
+                    if isinstance(v, basestring) and INSTANCE_VARS_RE.search(v):
+                        keys.add(key)
+        return keys
+
     @property
     def full_cmd(self):
         """Returns full command required to start component."""
@@ -442,11 +829,40 @@ class ComponentConfiguration(object):
 
         return cmd
 
+    @property
+    def cgroup_limits(self):
+        """Returns values of cgroup interface files, None for limits which are not configured"""
+        cpu_max = self.cpu_max
+        if cpu_max and cpu_max != "max":
+            cpu_max = "{0} {1}".format(max(1000, int(cpu_max * CPU_PERIOD)), CPU_PERIOD)
+        return {"memory.max": str(self.memory_max) if self.memory_max else None,
+                "cpu.max": cpu_max,
+                "cpu.weight": str(self.cpu_weight) if self.cpu_weight else None,
+                "io.weight": "default {0}".format(self.io_weight) if self.io_weight else None,
+                }
+
+    @property
+    def fingerprint(self):
+        """Returns digest of the launch specification, changes whenever component has to be restarted to apply the configuration."""
+        spec = []
+        for attr in self.launch_attrs + [a for a in self.placement_attrs if getattr(self, a)]:
+            value = getattr(self, attr)
+            if isinstance(value, dict):
+                value = sorted(value.iteritems())
+            elif isinstance(value, (set, frozenset)):
+                value = sorted(value)
+            spec.append((attr, value))
+        return hashlib.sha1(repr(spec)).hexdigest()
+
     @staticmethod
-    def load_configuration(filename):
+    def load_configuration(filename, lazy = False, sections = None):
         """
         Loads configuration from a file.
         @param filename: name of the file to be loaded
+        @param lazy: if set, only identifiers and dependencies are parsed up front, remaining settings of
+                     a component are parsed and validated on first access (see LazyConfiguration)
+        @param sections: dictionary of previously parsed component sections, configurations of sections
+                     which have not changed are reused; updated in place with sections of the loaded file
         """
         if not os.path.exists(filename) or not os.path.isfile(filename):
             raise ConfigurationError("Cannot locate configuration file: {0}".format(filename))
@@ -456,6 +872,8 @@ class ComponentConfiguration(object):
         groups = dict()
         namespaces = set()
 
+        resolver = VariableResolver()
+        parsed = dict()
         global_params = dict()
         for param in confobj.scalars:
             global_params[param] = confobj[param]
@@ -465,38 +883,62 @@ class ComponentConfiguration(object):
             if not groups.has_key(group) :
                 groups[group] = []
 
+            # group and global parameters are merged once per group, lookups see a single dictionary
+            group_params = dict(global_params)
+            for param in confobj[g_header].scalars:
+                group_params[param] = confobj[g_header][param]
+
             for c_header in confobj[g_header].sections:
+                c_params_section = confobj[g_header][c_header]
+                cfg = tuple((dict((param, c_params_section[param]) for param in c_params_section.scalars), group_params, global_params))
                 c_params = c_header.split(":")
                 c_namespace, c_id = c_params[0].split(".")
                 c_type = confobj[g_header][c_header]["type"].split(":")[0]
                 namespaces.add(c_namespace)
 
                 if (not c_type == "c"):
+                    key = hashlib.sha1(repr((g_header, c_header, lazy, sorted(cfg[0].iteritems()), sorted(group_params.iteritems())))).hexdigest()
+                    if sections and key in sections:
+                        parsed[key] = sections[key]
+                        for s in parsed[key]:
+                            config[s.uid] = s
+                            groups[group].append(s.uid)
+                        continue
+
+                    parsed[key] = []
                     if len(c_params) == 1:
-                        s = ComponentConfiguration.create_instance(c_type,
-                                                                 tuple((c_namespace, c_id)),
-                                                                 tuple((confobj[g_header][c_header], confobj[g_header], global_params)))
+                        s = ComponentConfiguration.create_instance(c_type, tuple((c_namespace, c_id)), cfg, lazy, resolver)
                         config[s.uid] = s
                         groups[group].append(s.uid)
+                        parsed[key].append(s)
                     else:  # multiple instances
                         c = c_params[1]
                         clones = map(int, c[1:-1].split(",")) if c.startswith("(") and c.endswith(")") else range(int(c))
+                        # instances share the template: values independent of the instance are expanded once
+                        template = None
+                        keys = ComponentConfiguration.instance_dependent(cfg)
                         for i in clones:
-                            s = ComponentConfiguration.create_instance(c_type,
-                                                                     tuple((c_namespace, c_id, str(i))),
-                                                                     tuple((confobj[g_header][c_header], confobj[g_header], global_params)))
+                            if template and template.clonable(keys):
+                                s = template.clone(str(i), cfg, keys, resolver)
+                            else:
+                                s = ComponentConfiguration.create_instance(c_type, tuple((c_namespace, c_id, str(i))), cfg, lazy, resolver)
+                                template = None if lazy else s
                             config[s.uid] = s
                             groups[group].append(s.uid)
+                            parsed[key].append(s)
 
         for group, uids in groups.iteritems():
             for uid in uids:
                 if not uid in config:
                     raise ConfigurationError("Alias {0} references unmanaged component {1}".format(group, uid))
 
+        if sections is not None:
+            sections.clear()
+            sections.update(parsed)
         return (config, groups, sorted(namespaces))
 
     @staticmethod
-    def create_instance(typeid, uid, cfg):
+    def create_instance(typeid, uid, cfg, lazy = False, resolver = None):
         """
         Factory method: creates new instance of component configuration for requested type.
         @param typeid:
@@ -505,11 +947,64 @@ class ComponentConfiguration(object):
             tuple with unique identifier of new component
         @param cfg:
             tuple containing dictionaries with configuration ordered by priority
+        @param lazy:
+            if set, LazyConfiguration parsed on first access is returned
+        @param resolver:
+            VariableResolver shared by components loaded from the same file
         """
         if not hasattr(ComponentConfiguration, "plugins"):
             initialize_plugins(ComponentConfiguration)
         sc = ComponentConfiguration.plugins[typeid](uid = uid)
-        sc.parse(cfg)
+        if lazy:
+            sc.parse_header(cfg)
+            return LazyConfiguration(sc, cfg, resolver)
+        sc.parse_shared(cfg, resolver)
         return sc
 
 
+class LazyConfiguration(object):
+    """
+    Proxy for component configuration parsed on first access. Identifiers and dependencies
+    of the component are available without parsing.
+    """
+
+    __HEADER__ = ("uid", "gid", "cid", "instance", "typeid", "requires")
+
+    def __init__(self, configuration, cfg, resolver = None):
+        self.__dict__["_configuration"] = configuration
+        self.__dict__["_cfg"] = cfg
+        self.__dict__["_resolver"] = resolver
+
+    def __getattr__(self, name):
+        if name.startswith("__") or not "_configuration" in self.__dict__:
+            raise AttributeError(name)
+        if name in self.__HEADER__:
+            return getattr(self._configuration, name)
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __str__(self):
+        return str(self.resolve())
+
+    def __eq__(self, other):
+        return self.resolve() == (other.resolve() if isinstance(other, LazyConfiguration) else other)
+
+    @property
+    def parsed(self):
+        """Returns True if configuration has been already parsed"""
+        return self._cfg is None
+
+    def resolve(self):
+        """
+        Parses configuration on first call.
+        @return: parsed configuration
+        @raise ConfigurationError: if configuration is invalid
+        """
+        if self._cfg is not None:
+            self._configuration.parse_shared(self._cfg, self._resolver)
+            self.__dict__["_cfg"] = None
+        return self._configuration
+
+
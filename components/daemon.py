@@ -0,0 +1,245 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Resident yak daemon serving shell commands over a local Unix socket.
+
+Protocol: each message is a frame consisting of a type byte, payload length (4 bytes, big endian)
+and the payload. Daemon greets each accepted connection with a READY frame, then client sends a single
+COMMAND frame with the command line. Daemon responds with any number of OUTPUT frames followed by an
+EXIT frame carrying the exit status of the command, or with a REFUSED frame if the command has to be
+executed by the client. Client which is not greeted in time (daemon busy or socket held by a process
+other than the daemon) does not send the command and executes it by itself.
+"""
+
+import errno
+import os
+import socket
+import struct
+import sys
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+from components import ComponentManagerError
+
+
+FRAME = struct.Struct(">cI")
+READY, COMMAND, OUTPUT, EXIT, REFUSED = "g", "c", "o", "x", "r"
+# seconds client waits for the daemon to accept the connection
+CONNECT_TIMEOUT = 1.0
+SO_PEERCRED = getattr(socket, "SO_PEERCRED", 17)
+
+
+class DaemonError(ComponentManagerError):
+    pass
+
+
+def socket_path(status_file):
+    """Returns path of the daemon socket for the given status file"""
+    return status_file + ".sock"
+
+
+def _cloexec(sock):
+    """Prevents the socket from being inherited by processes started by the daemon"""
+    if fcntl:
+        flags = fcntl.fcntl(sock.fileno(), fcntl.F_GETFD)
+        fcntl.fcntl(sock.fileno(), fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+    return sock
+
+
+def _send(conn, kind, payload):
+    conn.sendall(FRAME.pack(kind, len(payload)) + payload)
+
+
+def _recv_exactly(conn, size):
+    chunks = []
+    while size:
+        chunk = conn.recv(size)
+        if not chunk:
+            raise DaemonError("Connection closed by peer")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+
+def _recv(conn):
+    kind, size = FRAME.unpack(_recv_exactly(conn, FRAME.size))
+    return kind, _recv_exactly(conn, size) if size else ""
+
+
+class _OutputWriter(object):
+    """File-like object forwarding written text to the client as OUTPUT frames"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def write(self, data):
+        if data:
+            _send(self._conn, OUTPUT, data if isinstance(data, str) else data.encode("utf-8"))
+
+    def flush(self):
+        pass
+
+
+class DaemonServer(object):
+    """
+    Serves commands received over a Unix socket. Commands are executed one at a time, output
+    printed by the handler is forwarded to the client. Only connections from processes of
+    the same user are accepted.
+    """
+
+    def __init__(self, path, handler):
+        """
+        @param path: path of the Unix socket
+        @param handler: function executing the command line, returns exit status or None to decline the command
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            raise DaemonError("Daemon mode is not supported on this platform")
+        self.path = path
+        self._handler = handler
+        self._running = False
+        self._socket = None
+
+    def bind(self):
+        """Binds the socket, stale socket left by a terminated daemon is removed"""
+        if os.path.exists(self.path):
+            if execute(self.path, None) is not None:
+                raise DaemonError("Daemon is already running: {0}".format(self.path))
+            os.remove(self.path)
+
+        self._socket = _cloexec(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
+        umask = os.umask(0177)  # socket accessible only by the owner
+        try:
+            self._socket.bind(self.path)
+        finally:
+            os.umask(umask)
+        self._socket.listen(16)
+
+    def serve_forever(self):
+        """Serves commands until shutdown is requested"""
+        if not self._socket:
+            self.bind()
+        self._running = True
+        try:
+            while self._running:
+                try:
+                    conn, _ = self._socket.accept()
+                except socket.error, e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+                _cloexec(conn)
+                try:
+                    self._serve(conn)
+                except (socket.error, DaemonError):
+                    pass  # client disconnected
+                finally:
+                    conn.close()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Requests the daemon to stop after the current command"""
+        self._running = False
+
+    def close(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _serve(self, conn):
+        _send(conn, READY, "")
+        kind, line = _recv(conn)
+        if kind != COMMAND:
+            raise DaemonError("Unexpected frame: {0}".format(kind))
+        if not line:  # ping
+            _send(conn, EXIT, "0")
+            return
+        if not self._authorized(conn):
+            _send(conn, OUTPUT, "Permission denied\n")
+            _send(conn, EXIT, "1")
+            return
+
+        stdout = sys.stdout
+        sys.stdout = _OutputWriter(conn)
+        try:
+            status = self._handler(line)
+        finally:
+            sys.stdout = stdout
+        if status is None:
+            _send(conn, REFUSED, "")
+        else:
+            _send(conn, EXIT, str(status))
+
+    @staticmethod
+    def _authorized(conn):
+        if not sys.platform.startswith("linux"):
+            return True  # socket permissions restrict access to the owner
+        pid, uid, gid = struct.unpack("3i", conn.getsockopt(socket.SOL_SOCKET, SO_PEERCRED, struct.calcsize("3i")))
+        return uid == os.getuid()
+
+
+def execute(path, line, output = None, timeout = CONNECT_TIMEOUT):
+    """
+    Executes command in the daemon.
+    @param path: path of the daemon socket
+    @param line: command line, None to verify whether daemon is running
+    @param output: file-like object receiving output of the command, sys.stdout by default
+    @param timeout: seconds to wait for the daemon to accept the connection
+    @return: exit status of the command, None if daemon is not running, does not accept the connection
+        in time or declined the command
+    @raise DaemonError: if connection is lost while the command is executed
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+
+    conn = _cloexec(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
+    try:
+        try:
+            conn.settimeout(timeout)
+            conn.connect(path)
+            if _recv(conn)[0] != READY:
+                return None
+            conn.settimeout(None)  # command is not limited in time
+            _send(conn, COMMAND, line or "")
+            frame = _recv(conn)
+        except (socket.error, DaemonError):
+            # stale socket, daemon busy or exiting: command has not been accepted
+            return None
+
+        output = output or sys.stdout
+        while True:
+            kind, payload = frame
+            if kind == OUTPUT:
+                output.write(payload)
+                output.flush()
+            elif kind == EXIT:
+                return int(payload)
+            elif kind == REFUSED:
+                return None
+            else:
+                raise DaemonError("Unexpected frame: {0}".format(kind))
+            try:
+                frame = _recv(conn)
+            except socket.error, e:
+                raise DaemonError("Connection to daemon lost: {0}".format(e))
+    finally:
+        conn.close()
@@ -17,7 +17,7 @@ import shlex
 import osutil
 
 from datetime import datetime as dt
-from component import running_statuses, Status, ComponentError
+from component import identify_process, running_statuses, Status, ComponentError
 
 
 class DetachedComponent(object):
@@ -32,6 +32,10 @@ class DetachedComponent(object):
         self.uid = str(uid)
         self.configuration = DetachedConfiguration()
         self._status_persistance = kwargs.get("status_persistance")
+        self._snapshot = None
+        self.proc_started = kwargs.get("proc_started")
+        self.boot_id = kwargs.get("boot_id")
+        self.fingerprint = kwargs.get("fingerprint")
 
         for a in self.attrs[2:]:  # skip uid and read-only properties
             setattr(self, a, kwargs.get(a))
@@ -64,22 +68,38 @@ class DetachedComponent(object):
         """Saves component status in the status file"""
         if self._status_persistance:
             self._status_persistance.save_status(self)
-            
+
+    def refresh(self, **status):
+        """Updates component in place with status data reloaded from the status file, drops cached process information"""
+        for attr, value in status.iteritems():
+            setattr(self, attr, value)
+        self._snapshot = None
+
     def check_process(self):
         pass
 
+    @property
+    def snapshot(self):
+        """Returns process snapshot taken for the component PID or None if not available"""
+        return self._snapshot if self._snapshot and self.pid and self._snapshot.pid == int(self.pid) else None
+
+    @snapshot.setter
+    def snapshot(self, process):
+        self._snapshot = process
+
+    def _process_info(self, attr, getter):
+        snapshot = self.snapshot
+        return getattr(snapshot, attr) if snapshot else getter(int(self.pid))
+
     @property
     def is_alive(self):
         """Returns true if component is alive, false otherwise"""
         if self.pid:
-            if osutil.is_alive(int(self.pid)):
-                cmd = shlex.split(str(self.executed_cmd), posix = False)
-                proc_cmd = self.proc_cmd
-                return not proc_cmd or not cmd or proc_cmd == cmd
-            else:
+            alive = identify_process(self)
+            if alive is False:
                 self.pid = None
                 self.save_status()
-                return False
+            return bool(alive)
         else:
             return False
 
@@ -96,34 +116,34 @@ class DetachedComponent(object):
     @property
     def proc_cmd(self):
         """Returns command reported by OS associated with the component PID"""
-        return osutil.get_command_line(self.pid) if self.pid else None
+        return self._process_info("cmdline", osutil.get_command_line) if self.pid else None
 
     @property
     def cpu_user(self):
         """Returns cpu time in user mode for a component"""
-        return osutil.get_cpu_user(self.pid) if self.status in running_statuses else 0.0
+        return self._process_info("cpu_user", osutil.get_cpu_user) if self.status in running_statuses else 0.0
 
     @property
     def cpu_sys(self):
         """Returns cpu time in system mode for a component"""
-        return osutil.get_cpu_sys(self.pid) if self.status in running_statuses else 0.0
+        return self._process_info("cpu_sys", osutil.get_cpu_sys) if self.status in running_statuses else 0.0
 
     @property
     def mem_usage(self):
         """Returns memory usage for a component"""
-        return osutil.get_memory_percent(self.pid) if self.status in running_statuses else 0.0
+        return self._process_info("mem_percent", osutil.get_memory_percent) if self.status in running_statuses else 0.0
 
     @property
     def mem_rss(self):
         """Returns rss memory used by a component"""
-        memrss = osutil.get_memory_rss(self.pid)
-        return memrss / 1024 if self.status in running_statuses and isinstance(memrss, (int, long)) else 0
+        memrss = self._process_info("mem_rss", osutil.get_memory_rss) if self.status in running_statuses else None
+        return memrss / 1024 if isinstance(memrss, (int, long)) else 0
 
     @property
     def mem_vms(self):
         """Returns vms memory used by a component"""
-        memvms = osutil.get_memory_vms(self.pid)
-        return memvms / 1024 if self.status in running_statuses and isinstance(memvms, (int, long)) else 0
+        memvms = self._process_info("mem_vms", osutil.get_memory_vms) if self.status in running_statuses else None
+        return memvms / 1024 if isinstance(memvms, (int, long)) else 0
 
 
 class DetachedConfiguration(object):
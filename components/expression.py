@@ -0,0 +1,157 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import operator
+import re
+
+TOKEN_RE = re.compile(r"\s*(?:(\d+)|\$(\w+)|\$\{(\w+)\}|(//|[-+*/%()]))")
+
+OPERATORS = {"+": operator.add,
+             "-": operator.sub,
+             "*": operator.mul,
+             "/": operator.floordiv,
+             "//": operator.floordiv,
+             "%": operator.mod,
+             }
+
+_compiled = dict()
+
+
+class ExpressionError(ValueError):
+    """Raised when expression cannot be parsed or evaluated"""
+    pass
+
+
+class Expression(object):
+    """
+    Integer arithmetic expression compiled to a tree of closures. Supports integer literals, variable
+    references ($name, ${name}), unary + and -, binary + - * // % and parentheses. Division is integer
+    division, / is accepted as an alias of //.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.variables = []
+        self._tokens = self._tokenize(text)
+        self._position = 0
+        self._evaluate = self._parse_sum()
+        if self._position != len(self._tokens):
+            raise ExpressionError("Unexpected {0} in expression: {1}".format(self._tokens[self._position][1], text))
+        del self._tokens, self._position
+
+    def evaluate(self, lookup = None):
+        """
+        Evaluates expression.
+        @param lookup: function returning integer value of the variable with given name
+        @raise ExpressionError: if variable cannot be resolved or division by zero occurs
+        """
+        try:
+            return self._evaluate(lookup)
+        except ZeroDivisionError:
+            raise ExpressionError("Division by zero in expression: {0}".format(self.text))
+
+    @staticmethod
+    def _tokenize(text):
+        tokens, position, text = [], 0, text.rstrip()
+        while position < len(text):
+            match = TOKEN_RE.match(text, position)
+            if not match:
+                raise ExpressionError("Invalid character {0!r} in expression: {1}".format(text[position:].lstrip()[:1], text))
+            number, named, braced, op = match.groups()
+            if number is not None:
+                tokens.append(("number", int(number)))
+            elif op is not None:
+                tokens.append(("op", op))
+            else:
+                tokens.append(("variable", named or braced))
+            position = match.end()
+        return tokens
+
+    def _peek(self):
+        return self._tokens[self._position] if self._position < len(self._tokens) else (None, None)
+
+    def _parse_sum(self):
+        left = self._parse_product()
+        while self._peek() in (("op", "+"), ("op", "-")):
+            op = self._next()[1]
+            left = self._binary(left, op, self._parse_product())
+        return left
+
+    def _parse_product(self):
+        left = self._parse_unary()
+        while self._peek() in (("op", "*"), ("op", "/"), ("op", "//"), ("op", "%")):
+            op = self._next()[1]
+            left = self._binary(left, op, self._parse_unary())
+        return left
+
+    def _parse_unary(self):
+        if self._peek() in (("op", "+"), ("op", "-")):
+            sign = self._next()[1]
+            operand = self._parse_unary()
+            return operand if sign == "+" else (lambda lookup: -operand(lookup))
+        return self._parse_atom()
+
+    def _parse_atom(self):
+        kind, value = self._next()
+        if kind == "number":
+            return lambda lookup: value
+        elif kind == "variable":
+            self.variables.append(value)
+            return lambda lookup: self._lookup(lookup, value)
+        elif kind == "op" and value == "(":
+            inner = self._parse_sum()
+            if self._next() != ("op", ")"):
+                raise ExpressionError("Missing closing parenthesis in expression: {0}".format(self.text))
+            return inner
+        raise ExpressionError("Unexpected {0} in expression: {1}".format(value if kind else "end", self.text))
+
+    def _next(self):
+        token = self._peek()
+        self._position += 1
+        return token
+
+    @staticmethod
+    def _binary(left, op, right):
+        function = OPERATORS[op]
+        return lambda lookup: function(left(lookup), right(lookup))
+
+    def _lookup(self, lookup, name):
+        value = lookup(name) if lookup else None
+        if value is None:
+            raise ExpressionError("Unresolved variable {0} in expression: {1}".format(name, self.text))
+        return value
+
+
+def compile_expression(text):
+    """
+    Returns compiled expression, each distinct expression is parsed once.
+    @param text: expression
+    @raise ExpressionError: if expression is invalid
+    """
+    expression = _compiled.get(text)
+    if expression is None:
+        expression = _compiled[text] = Expression(text)
+    return expression
+
+
+def evaluate(text, lookup = None):
+    """
+    Compiles (if needed) and evaluates expression.
+    @param text: expression
+    @param lookup: function returning integer value of the variable with given name
+    @raise ExpressionError: if expression is invalid or cannot be evaluated
+    """
+    return compile_expression(text).evaluate(lookup)
@@ -14,17 +14,30 @@
 #  limitations under the License.
 #
 
+import os
 import sys
+import threading
 import time
 
+import osutil
+
 from osutil import get_username
-from components.component import ComponentConfiguration, Component, ComponentError, ConfigurationError, Status
+from components.component import ComponentConfiguration, Component, ComponentError, ConfigurationError, LazyConfiguration, Status
 from components.q import QComponent
 from components.detached import DetachedComponent, DetachedConfiguration
 from components.status import StatusPersistance
+from components.cache import ConfigurationCache
+from components.scheduler import DependencyScheduler
+from components.planner import CpuPlanner, CpuTopology
 
 from copy import copy
 from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+
+POLL_INTERVAL = 0.1
+CONCURRENT_JOBS = 32
+TOPOLOGY_ENV = "YAK_TOPOLOGY"
 
 
 class DependencyError(ComponentError):
@@ -39,26 +52,91 @@ class ComponentManager(object):
     operations like: start, stop, interrupt. 
     """
 
-    def __init__(self, config_file, status_file):
-        self._configuration, self._groups, self._namespaces = ComponentConfiguration.load_configuration(config_file)
+    def __init__(self, config_file, status_file, lazy = False):
+        self._config_file = config_file
+        self._config_cache = ConfigurationCache(status_file + ".cfgcache")
+        self._lazy = lazy
+        self._load_configuration()
         self._persistance = StatusPersistance(status_file)
-        self._dependency_order = self._compute_dependencies()
+        # spawning is serialized, so that log files opened for one component are not inherited by another
+        self._spawn_lock = threading.RLock()
+        self._components = dict()
+        self._loaded_version = (None, None)
+        self._cpu_plan = None
+        self._cpu_plan_key = None
         self.reload()
 
-    def _compute_dependencies(self):
+    def _read_configuration(self):
+        if not os.path.isfile(self._config_file):
+            raise ConfigurationError("Cannot locate configuration file: {0}".format(self._config_file))
+        stat = os.stat(self._config_file)
+        with open(self._config_file, "rb") as f:
+            return (stat.st_mtime, stat.st_size), f.read()
+
+    def _load_configuration(self):
+        """
+        Loads configuration and computes dependency order. Compiled configuration is served from
+        the cache if neither configuration file nor referenced environment variables have changed.
+        In lazy mode components are parsed on first access, cache is not updated.
+        """
+        self._config_stat, content = self._read_configuration()
+        key = self._config_cache.key(content)
+        compiled = self._config_cache.load(key)
+        if compiled:
+            self._configuration, self._groups, self._namespaces, self._dependency_order, self._sections = compiled
+        else:
+            self._sections = dict()
+            self._configuration, self._groups, self._namespaces = ComponentConfiguration.load_configuration(self._config_file, self._lazy, self._sections)
+            self._dependency_order = self._compute_dependencies(self._configuration)
+            if not self._lazy:
+                self._config_cache.store(key, (self._configuration, self._groups, self._namespaces, self._dependency_order, self._sections))
+        self._config_fingerprint = self._config_cache.digest(content)
+
+    def reload_configuration(self):
+        """
+        Reloads configuration if the configuration file has been modified. Only modified component sections
+        are parsed, dependency order is recomputed only if components or their dependencies have changed.
+        Status of components is updated with the new configuration by the subsequent reload.
+        @return: tuple (added, removed, modified) with lists of identifiers of components, None if configuration has not changed
+        @raise ConfigurationError, DependencyError: if the modified configuration is invalid, current configuration is kept
+        """
+        stat = os.stat(self._config_file) if os.path.isfile(self._config_file) else None
+        if stat and (stat.st_mtime, stat.st_size) == self._config_stat:
+            return None
+        self._config_stat, content = self._read_configuration()
+        if self._config_cache.digest(content) == self._config_fingerprint:
+            return None
+
+        sections = dict(self._sections)
+        configuration, groups, namespaces = ComponentConfiguration.load_configuration(self._config_file, self._lazy, sections)
+        previous = self._configuration
+        if configuration.keys() == previous.keys() and all(configuration[uid].requires == previous[uid].requires for uid in configuration):
+            dependency_order = self._dependency_order
+        else:
+            dependency_order = self._compute_dependencies(configuration)
+
+        # cache is not updated, the next invocation of yak rebuilds it
+        self._configuration, self._groups, self._namespaces, self._dependency_order, self._sections = configuration, groups, namespaces, dependency_order, sections
+        self._config_fingerprint = self._config_cache.digest(content)
+
+        return ([uid for uid in dependency_order if not uid in previous],
+                [uid for uid in previous if not uid in configuration],
+                [uid for uid in dependency_order if uid in previous and configuration[uid] is not previous[uid] and not configuration[uid] == previous[uid]])
+
+    def _compute_dependencies(self, configuration):
         deps = dict()
         reqs = dict()
         no_deps = list()
         ordered = list()
 
-        for component in self._configuration.values():
+        for component in configuration.values():
             reqs[component.uid] = copy(component.requires)
             deps[component.uid] = list()
 
             if component.uid in component.requires:
                 raise DependencyError("Self dependency found for component {0} -> {1}".format(component.uid, ", ".join(component.requires)))
 
-        for component in self._configuration.values():
+        for component in configuration.values():
             if not component.requires:
                 no_deps.append(component.uid)
             else:
@@ -103,6 +181,11 @@ class ComponentManager(object):
         """Returns identifiers lists of managed and detached components."""
         return self._dependency_order + self._detached
 
+    @property
+    def config_digest(self):
+        """Returns digest of the loaded configuration file contents."""
+        return self._config_fingerprint
+
     @property
     def configuration(self):
         """Returns configuration of managed components."""
@@ -123,48 +206,236 @@ class ComponentManager(object):
         """Returns managed namespaces."""
         return self._namespaces
 
+    def cpu_plan(self):
+        """
+        Computes allocation of cpu cores for components with cpuAffinity or cpuCores (see CpuPlanner). Topology of
+        all online cpus is read from sysfs, or from the file given by YAK_TOPOLOGY environment variable. Plan is computed once per
+        loaded configuration, cpus assigned by the planner are stored as planned_affinity of component configurations.
+        @return: tuple (CpuTopology, OrderedDict: uid -> Allocation in dependency order), topology is None if
+            no component has cpu affinity configured
+        @raise PlanError: if topology cannot be read or there are not enough free cores
+        """
+        if self._cpu_plan_key != self._config_fingerprint:
+            configurations = [self._configuration[uid] for uid in self._dependency_order]
+            placed = [c for c in configurations if c.cpu_affinity or c.cpu_cores]
+            topology = self._read_topology() if placed else None
+            allocations = CpuPlanner(topology).plan(placed) if placed else OrderedDict()
+            for configuration in configurations:
+                allocation = allocations.get(configuration.uid)
+                configuration.planned_affinity = allocation.cpus if allocation and allocation.planned else None
+            self._cpu_plan = (topology, allocations)
+            self._cpu_plan_key = self._config_fingerprint
+        return self._cpu_plan
+
+    def _read_topology(self):
+        # all online cpus: plan must not depend on the affinity yak itself is started with (taskset, cron, daemon)
+        if os.environ.get(TOPOLOGY_ENV):
+            return CpuTopology.from_file(os.environ[TOPOLOGY_ENV])
+        return CpuTopology.from_sysfs()
+
+    def assign_cores(self, components):
+        """Assigns cores to the components configured with cpuCores, see cpu_plan"""
+        configurations = [self._configuration[uid] for uid in components if uid in self._configuration]
+        if any(c.cpu_cores and not c.cpu_affinity for c in configurations):
+            self.cpu_plan()
+        else:  # configuration of other components is not parsed in lazy mode
+            for configuration in configurations:
+                configuration.planned_affinity = None
+
     def reload(self):
         """
-        Reloads components status snapshot from disk.
+        Reloads components status snapshot from disk. Reload is skipped if neither the status file
+        nor the configuration has changed since the previous reload, otherwise only components with
+        modified status are updated, existing component instances are kept.
         """
-        self._components = self._persistance.load()
-        for configuration in self._configuration.itervalues():
-            if not configuration.uid in self._components:
-                self._components[configuration.uid] = Component.create_instance(typeid = configuration.typeid,
-                                                                                uid = configuration.uid,
-                                                                                configuration = configuration)
+        version = (self._persistance.data_version, self._config_fingerprint)
+        if version != self._loaded_version:
+            self._merge_status(self._persistance.load_status(), version[1] != self._loaded_version[1])
+            self._loaded_version = version
+        else:
+            for component in self._components.itervalues():
+                component.refresh()
+
+        with self._persistance.transaction():
+            for uid in self._components.keys():
+                if not uid in self._configuration:
+                    if not self._components[uid].is_alive:
+                        self._persistance.delete_status(uid)
+                        del self._components[uid]
+                    elif not isinstance(self._components[uid], DetachedComponent):
+                        self._components[uid] = DetachedComponent(**self._components[uid].__dict__)
+
+        self._detached = [uid for uid in self._components if not uid in self._configuration]
+
+    def _merge_status(self, rows, reconfigured):
+        components = dict()
+        for uid in set(rows.keys()).union(self._configuration.keys()):
+            configuration = self._configuration.get(uid)
+            component = self._components.get(uid)
+            status = rows.get(uid) or dict(uid = uid, typeid = configuration.typeid)  # status not saved yet
+
+            if component is None or component.typeid != status["typeid"]:
+                component = Component.create_instance(configuration = configuration, status_persistance = self._persistance, **status)
             else:
-                self._components[configuration.uid].configuration = configuration
+                saved = self._persistance.status_data(component)
+                component.refresh(**dict((attr, status.get(attr)) for attr in saved
+                                         if saved[attr] != status.get(attr) and not attr in ("uid", "typeid")))
+
+            if reconfigured and configuration:
+                component.configuration = configuration
+            components[uid] = component
+
+        self._components = components
+
+    def _requires(self, uid):
+        configuration = self._components[uid].configuration
+        return configuration.requires if configuration and configuration.requires else set()
+
+    def changed(self, components):
+        """
+        Finds running components which have to be restarted to apply the current configuration: components
+        launched with a different specification (see ComponentConfiguration.fingerprint) and running
+        components depending on them.
+        @param components: list of identifier of the component
+        @return: tuple (list of identifiers of components with modified configuration, list of identifiers
+            of components to be restarted in dependencies order)
+        """
+        self.assign_cores(components)
+        modified = [uid for uid in components if uid in self._configuration and self._modified(uid)]
+
+        affected = set(modified)
+        for uid in self._dependency_order:  # required components precede dependent ones
+            if affected.intersection(self._requires(uid)):
+                affected.add(uid)
+        return modified, [uid for uid in self._dependency_order if uid in affected and self._components[uid].is_alive]
+
+    def _modified(self, uid):
+        component = self._components[uid]
+        if not component.is_alive:
+            return False
+        configuration = self._configuration[uid]
+        if component.fingerprint:
+            return component.fingerprint != configuration.fingerprint
+        else:  # started before fingerprints were recorded
+            return component.executed_cmd != str(configuration.full_cmd)
 
-        self._detached = list()
-        for uid in self._components:
-            if not uid in self._configuration:
-                if not self._components[uid].is_alive:
-                    self._persistance.delete_status(uid)
-                else:
-                    self._components[uid] = DetachedComponent(**self._components[uid].__dict__)
-                    self._detached.append(uid)
+    def snapshot(self, components):
+        """
+        Collects process information for multiple components in a single pass. Process related
+        properties of the components are served from the snapshot while the PID is unchanged.
+        @param components: list of identifier of the component
+        """
+        pids = [int(self._components[uid].pid) for uid in components if self._components[uid].pid]
+        processes = osutil.snapshot(pids)
+        for uid in components:
+            component = self._components[uid]
+            component.snapshot = processes.get(int(component.pid)) if component.pid else None
 
-    def start(self, components, callback = None, pause_callback = None, **kwargs):
+    def check_health(self, components):
+        """
+        Verifies responsiveness of multiple components concurrently. Only components supporting
+        health checks (q components with ipcCheck enabled) are verified.
+        @param components: list of identifier of the component
+        """
+        def check(uid):
+            try:
+                self._components[uid].check_health()
+            except Exception:
+                pass  # component is reported without health information
+
+        checked = [uid for uid in components if getattr(self._components[uid].configuration, "ipc_check", False)]
+        if checked:
+            pool = ThreadPool(min(CONCURRENT_JOBS, len(checked)))
+            try:
+                pool.map(check, checked)
+            finally:
+                pool.close()
+                pool.join()
+
+    def _verify_alive(self, components):
+        """
+        Verifies processes of multiple components. Status of components found dead is written in a single
+        transaction. Start/stop operations write status of each phase (components started before a pause,
+        components signalled before waiting for their exit) in a transaction committed when the phase ends,
+        so that processes are recorded before yak waits and even if it is killed while waiting.
+        @param components: list of identifier of the component
+        @return: list of identifiers of running components
+        """
+        with self._persistance.transaction():
+            return [uid for uid in components if self._components[uid].is_alive]
+
+    def check(self, components, callback = None, **kwargs):
+        """
+        Parses and validates configuration of multiple components.
+        @param components: list of identifier of the component
+        @param callback: function to be executed after configuration of a component has been verified
+        @return: List of: tuples (uid, True if configuration is valid, False if component is detached or ConfigurationError if configuration is invalid).
+        """
+        status = []
+        for uid in components:
+            configuration = self._configuration.get(uid)
+            try:
+                if isinstance(configuration, LazyConfiguration):
+                    configuration.resolve()
+                result = configuration is not None
+            except ConfigurationError, e:
+                result = e
+
+            if callback:
+                callback(uid, result)
+            status.append((uid, result))
+        return status
+
+    def start(self, components, callback = None, pause_callback = None, jobs = None, **kwargs):
         """
         Starts multiple components. If component(s) is already running, nothing happens.
         @param components: list of identifier of the component
         @param callback: function to be executed after status of a component has been verified 
         @param pause_callback: function to be executed after while operation is paused
+        @param jobs: number of components started in parallel, components are started one by one if not set
         @return: List of: tuples (uid, True if component has been started, False if the component is already running or ComponentError if component cannot be started). 
         """
+        self.assign_cores(components)
+        self._verify_alive(components)
+        if jobs and jobs > 1:
+            return self._start_parallel(components, callback, jobs, **kwargs)
+        else:
+            return self._start_sequential(components, callback, pause_callback, **kwargs)
+
+    def _start_sequential(self, components, callback, pause_callback, **kwargs):
+        """
+        Starts multiple components one by one. Components are verified in batches, batch is closed
+        when a component requiring one of the batch members is encountered. Status of the batch is
+        written in a single transaction before the batch is verified.
+        """
         status = OrderedDict()
-        start_wait = 0
-        check_list = []
-
-        def validate_started():
-            if start_wait > 0 and any(s == True for s in status.values()):
+        batches = [[]]
+        for component in components:
+            requires = self._components[component].configuration.requires
+            if requires and requires.intersection(batches[-1]) and requires.intersection(components):
+                batches.append([])
+            batches[-1].append(component)
+
+        for batch in batches:
+            start_wait = 0
+            with self._persistance.transaction():
+                for component in batch:
+                    try:
+                        if not self._components[component].configuration.ready_check:
+                            start_wait = max(start_wait, self._components[component].configuration.start_wait)
+                        status[component] = self._start(component, **kwargs)
+                    except Exception, e:
+                        status[component] = e
+
+            if start_wait > 0 and any(status[component] is True for component in batch):
                 if pause_callback:
                     pause_callback(start_wait)
                 time.sleep(start_wait)
 
-            for component in check_list:
+            for component in batch:
                 try:
+                    if status[component] is True:
+                        self._components[component].wait_ready()
                     self._components[component].check_process()
                 except Exception, e:
                     status[component] = e
@@ -172,23 +443,30 @@ class ComponentManager(object):
                 if callback:
                     callback(component, status[component])
 
-        for component in components:
-            requires = self._components[component].configuration.requires
+        return status.items()
 
-            if requires and requires.intersection(check_list) and requires.intersection(components):
-                validate_started()
-                check_list = []
-                start_wait = 0
+    def _start_parallel(self, components, callback, jobs, **kwargs):
+        """
+        Starts multiple components using the dependency graph. Component is started as soon as
+        all of its required components have been started and verified.
+        """
+        callback_lock = threading.Lock()
 
+        def start_component(uid):
             try:
-                check_list.append(component)
-                start_wait = max(start_wait, self._components[component].configuration.start_wait)
-                status[component] = self._start(component, **kwargs)
+                status = self._start(uid, **kwargs)
+                if status:
+                    self._components[uid].wait_ready()
+                self._components[uid].check_process()
             except Exception, e:
-                status[component] = e
+                status = e
 
-        validate_started()
-        return status.items()
+            if callback:
+                with callback_lock:
+                    callback(uid, status)
+            return status
+
+        return DependencyScheduler(jobs).run(components, self._requires, start_component).items()
 
     def _start(self, uid, **kwargs):
         """
@@ -211,8 +489,9 @@ class ComponentManager(object):
             component_cfg.command_args = kwargs['arguments']
 
         try:
-            component.initialize()
-            component.execute()
+            with self._spawn_lock:
+                component.initialize()
+                component.execute()
             self._components[uid] = component
             return True
         except:
@@ -222,39 +501,144 @@ class ComponentManager(object):
             if overrides_arguments:
                 component_cfg.command_args = arguments_copy
 
-    def stop(self, components, callback = None, pause_callback = None, **kwargs):
+    def stop(self, components, callback = None, pause_callback = None, jobs = None, **kwargs):
         """
         Stops multiple components. If component(s) is not running, nothing happens.
         @param components: list of identifier of the component
         @param callback: function to be executed after status of a component has been stopped/killed
         @param pause_callback: function to be executed after while operation is paused
+        @param jobs: number of components stopped in parallel, all components are signalled at once if not set
         @return: List of: tuples (uid, True if component has been stopped, False if the component is not running or OSError if component cannot be stopped). 
         """
-        status = OrderedDict()
-        stop_wait = 0
+        self._verify_alive(components)
+        if jobs and jobs > 1:
+            return self._stop_parallel(components, callback, jobs, **kwargs)
+        else:
+            return self._stop_sequential(components, callback, pause_callback, **kwargs)
 
-        for component in components:
-            stop_wait = max(stop_wait, self._components[component].configuration.stop_wait) if self._components[component].configuration else stop_wait
+    def _stop_sequential(self, components, callback, pause_callback, **kwargs):
+        """
+        Stops multiple components. Components are signalled one by one in the given (reverse dependency) order,
+        then processes are polled until exit. Components shut down via IPC drain on a bounded pool of threads;
+        component is signalled only after its draining dependents have exited. Status of signalled components
+        is written in a single transaction before processes are polled, kills in another one.
+        """
+        pids = dict((uid, self._components[uid].pid) for uid in components)
+        status = OrderedDict((uid, None) for uid in components)
+        draining = OrderedDict()
+        pool = None
+
+        def collect(uid):
             try:
-                status[component] = self._stop(component, **kwargs)
+                status[uid] = draining.pop(uid).get()
             except Exception, e:
-                status[component] = e
+                status[uid] = e
 
-        if pause_callback:
-            pause_callback(stop_wait)
-        time.sleep(stop_wait)
+        try:
+            with self._persistance.transaction():
+                for uid in components:
+                    for dependent in [d for d in draining if uid in self._requires(d)]:
+                        collect(dependent)
+
+                    if self._components[uid].drains:
+                        pool = pool or ThreadPool(min(CONCURRENT_JOBS, len(components)))
+                        draining[uid] = pool.apply_async(self._stop, (uid,), kwargs)
+                    else:
+                        try:
+                            status[uid] = self._stop(uid, **kwargs)
+                        except Exception, e:
+                            status[uid] = e
+
+                for uid in draining.keys():
+                    collect(uid)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        stopped = dict((uid, pid) for uid, pid in pids.iteritems() if status[uid] is True)
+        if pause_callback and stopped:
+            pause_callback(max(self._stop_wait(uid) for uid in stopped))
+        with self._persistance.transaction():
+            status.update(self._await_exit(stopped))
+
+        if callback:
+            for component in components:
+                callback(component, status[component])
 
-        for component in components:
-            if self._components[component].is_alive:
-                try:
-                    status[component] = self._stop(component, True, **kwargs)
-                except Exception, e:
-                    status[component] = e
+        return status.items()
+
+    def _stop_parallel(self, components, callback, jobs, **kwargs):
+        """
+        Stops multiple components in reverse dependency order. Component is stopped as soon as
+        all of its dependent components have exited.
+        """
+        callback_lock = threading.Lock()
+        dependents = dict((uid, set()) for uid in components)
+        for uid in components:
+            for required in self._requires(uid):
+                if required in dependents:
+                    dependents[required].add(uid)
+
+        def stop_component(uid):
+            pid = self._components[uid].pid
+            try:
+                status = self._stop(uid, **kwargs)
+                if status:
+                    status = self._await_exit({uid: pid}).get(uid, status)
+            except Exception, e:
+                status = e
 
             if callback:
-                callback(component, status[component])
+                with callback_lock:
+                    callback(uid, status)
+            return status
 
-        return status.items()
+        return DependencyScheduler(jobs).run(components, dependents.get, stop_component).items()
+
+    def _stop_wait(self, uid):
+        stop_wait = self._components[uid].configuration.stop_wait
+        return stop_wait if stop_wait is not None else 1.0  # detached components have no configuration
+
+    def _await_exit(self, pids):
+        """
+        Polls processes of stopped components until they exit. Processes still alive after
+        stopWait of their component are killed.
+        @param pids: dictionary: uid -> pid of the stopped component
+        @return: dictionary: uid -> exception for processes which could not be killed
+        """
+        deadline = time.time()
+        deadlines = dict((uid, deadline + self._stop_wait(uid)) for uid in pids)
+        pending = dict(pids)
+        status = dict()
+
+        while pending:
+            now = time.time()
+            for uid, pid in pending.items():
+                if not osutil.is_alive(pid):
+                    del pending[uid]
+                elif now >= deadlines[uid]:
+                    del pending[uid]
+                    try:
+                        self._kill(uid, pid)
+                    except Exception, e:
+                        status[uid] = e
+            if pending:
+                time.sleep(POLL_INTERVAL)
+
+        return status
+
+    def _kill(self, uid, pid):
+        """
+        Kills process of the component with given uid.
+        @raise OSError: if process cannot be killed.
+        """
+        component = self._components[uid]
+        component.pid = pid
+        try:
+            component.terminate(force = True)
+        finally:
+            self._persistance.save_status(component)
 
     def _stop(self, uid, force = False, **kwargs):
         """
@@ -288,6 +672,8 @@ class ComponentManager(object):
         if component.is_alive:
             return False
 
+        self.assign_cores([uid])
+
         self._validate_preconditions(component_cfg)
 
         overrides_arguments = kwargs and 'arguments' in kwargs and kwargs['arguments'] is not None
@@ -314,14 +700,15 @@ class ComponentManager(object):
         """
         status = OrderedDict()
 
-        for component in components:
-            try:
-                status[component] = self._interrupt(component, **kwargs)
-            except Exception, e:
-                status[component] = e
+        with self._persistance.transaction():
+            for component in components:
+                try:
+                    status[component] = self._interrupt(component, **kwargs)
+                except Exception, e:
+                    status[component] = e
 
-            if callback:
-                callback(component, status[component])
+                if callback:
+                    callback(component, status[component])
 
         return status.items()
 
@@ -0,0 +1,222 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+
+from collections import namedtuple, OrderedDict
+
+from components.component import ConfigurationError
+from osutil._common import parse_cpu_list
+
+
+SYSFS_ROOT = "/sys/devices/system"
+
+
+class PlanError(ConfigurationError):
+    pass
+
+
+Cpu = namedtuple("Cpu", ["cpu", "socket", "core", "node"])
+
+# cpus: logical cpus of assigned cores, cores: list of (socket, core) pairs, nodes: numa nodes of the cores,
+# planned: False for explicit cpuAffinity, shared: identifiers of other components using the same cores
+Allocation = namedtuple("Allocation", ["cpus", "cores", "nodes", "planned", "shared"])
+
+
+def _read(path):
+    with open(path, "r") as f:
+        return f.read().strip()
+
+
+class CpuTopology(object):
+    """
+    Logical cpus of the host grouped into physical cores (SMT siblings), sockets and NUMA nodes.
+    """
+
+    def __init__(self, cpus):
+        """
+        @param cpus: list of Cpu tuples
+        """
+        self.cpus = sorted(cpus)
+        self.cores = OrderedDict()
+        self.nodes = dict()
+        for cpu in sorted(self.cpus, key = lambda c: (c.node, c.socket, c.core, c.cpu)):
+            self.cores.setdefault((cpu.socket, cpu.core), []).append(cpu.cpu)
+            self.nodes[(cpu.socket, cpu.core)] = cpu.node
+        self._cores = dict((cpu.cpu, (cpu.socket, cpu.core)) for cpu in self.cpus)
+
+    def __str__(self):
+        return "{0} socket(s), {1} core(s), {2} cpu(s), {3} NUMA node(s)".format(len(set(c.socket for c in self.cpus)), len(self.cores),
+                                                                                  len(self.cpus), len(set(self.nodes.values())))
+
+    def core_of(self, cpu):
+        """Returns (socket, core) pair of the logical cpu, None if cpu is not available"""
+        return self._cores.get(cpu)
+
+    @staticmethod
+    def from_file(path):
+        """
+        Reads topology from a file in format of 'lscpu -p=CPU,SOCKET,CORE,NODE': one cpu per line,
+        comma separated, lines starting with # are ignored. Empty node is read as node 0.
+        @raise PlanError: if file is malformed
+        """
+        cpus = []
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        fields = (line.split(",") + [""] * 4)[:4]
+                        cpus.append(Cpu(*[int(v) if v else 0 for v in fields]))
+        except (IOError, ValueError), e:
+            raise PlanError("Cannot read cpu topology from {0}: {1}".format(path, e))
+        return CpuTopology(cpus)
+
+    @staticmethod
+    def from_sysfs(root = SYSFS_ROOT):
+        """
+        Reads topology of online cpus from sysfs.
+        @raise PlanError: if topology is not available
+        """
+        nodes = dict()
+        node_root = os.path.join(root, "node")
+        if os.path.isdir(node_root):
+            for entry in os.listdir(node_root):
+                if entry.startswith("node") and entry[4:].isdigit():
+                    for cpu in parse_cpu_list(_read(os.path.join(node_root, entry, "cpulist"))):
+                        nodes[cpu] = int(entry[4:])
+
+        cpus = []
+        try:
+            for cpu in parse_cpu_list(_read(os.path.join(root, "cpu", "online"))):
+                topology = os.path.join(root, "cpu", "cpu{0}".format(cpu), "topology")
+                cpus.append(Cpu(cpu, int(_read(os.path.join(topology, "physical_package_id"))),
+                                int(_read(os.path.join(topology, "core_id"))), nodes.get(cpu, 0)))
+        except (IOError, OSError, ValueError), e:
+            raise PlanError("Cannot read cpu topology from {0}: {1}".format(root, e))
+        return CpuTopology(cpus)
+
+
+class CpuPlanner(object):
+    """
+    Assigns physical cores to components configured with cpuCores. Cores used by explicit cpuAffinity lists are
+    excluded, each core is assigned to at most one component. Components connected with requires are placed on
+    the same NUMA node if it has enough free cores. Cores left after components with a fixed number of cores have
+    been served are divided between components with cpuCores = auto, so that none is left unused.
+    """
+
+    def __init__(self, topology):
+        self.topology = topology
+
+    def plan(self, configurations):
+        """
+        Computes allocation of cores.
+        @param configurations: list of component configurations in dependency order
+        @return: OrderedDict: uid -> Allocation for components with cpuAffinity or cpuCores, in dependency order
+        @raise PlanError: if there are not enough free cores
+        """
+        configurations = [c for c in configurations if c.cpu_affinity or c.cpu_cores]
+        assigned = dict()
+
+        for configuration in configurations:
+            if configuration.cpu_affinity:
+                assigned[configuration.uid] = [core for core in self._cores(configuration.cpu_affinity)]
+
+        taken = set(core for cores in assigned.values() for core in cores)
+        free = [core for core in self.topology.cores if not core in taken]
+        demand = self._demand([c for c in configurations if not c.cpu_affinity], len(free))
+
+        for cluster in self._clusters(configurations, demand):
+            self._assign(cluster, demand, assigned, free)
+
+        allocations = OrderedDict()
+        for configuration in configurations:
+            uid = configuration.uid
+            cores = assigned[uid]
+            shared = [other for other in assigned if other != uid and set(cores).intersection(assigned[other])]
+            cpus = configuration.cpu_affinity or sorted(cpu for core in cores for cpu in self.topology.cores[core])
+            allocations[uid] = Allocation(cpus, cores, sorted(set(self.topology.nodes[core] for core in cores)),
+                                          not configuration.cpu_affinity, sorted(shared))
+        return allocations
+
+    def _cores(self, cpus):
+        cores = []
+        for cpu in cpus:
+            core = self.topology.core_of(cpu)
+            if core and not core in cores:
+                cores.append(core)
+        return cores
+
+    @staticmethod
+    def _demand(configurations, available):
+        demand = OrderedDict((c.uid, c.cpu_cores) for c in configurations)
+        fixed = sum(n for n in demand.values() if n != "auto")
+        auto = [uid for uid, n in demand.iteritems() if n == "auto"]
+        if fixed + len(auto) > available:
+            raise PlanError("Cannot allocate {0} cpu core(s), {1} available".format(fixed + len(auto), available))
+        # remaining cores are divided between auto components, the first ones get one more if not divisible
+        share, extra = divmod(available - fixed, len(auto)) if auto else (0, 0)
+        for i, uid in enumerate(auto):
+            demand[uid] = share + (1 if i < extra else 0)
+        return demand
+
+    @staticmethod
+    def _clusters(configurations, demand):
+        # components connected with requires, clusters with the largest demand are placed first
+        cluster_of = dict((c.uid, set([c.uid])) for c in configurations)
+        for configuration in configurations:
+            for required in configuration.requires:
+                if required in cluster_of and not cluster_of[required] is cluster_of[configuration.uid]:
+                    merged = cluster_of[required] | cluster_of[configuration.uid]
+                    for uid in merged:
+                        cluster_of[uid] = merged
+
+        order = [c.uid for c in configurations]
+        clusters = []
+        for uid in order:
+            if not any(cluster_of[uid] is cluster for cluster in clusters):
+                clusters.append(cluster_of[uid])
+        clusters = [[uid for uid in order if uid in cluster] for cluster in clusters]
+        return sorted(clusters, key = lambda cluster: -sum(demand.get(uid, 0) for uid in cluster))
+
+    def _assign(self, cluster, demand, assigned, free):
+        placed = [core for uid in cluster if uid in assigned for core in assigned[uid]]
+        preferred = [self.topology.nodes[core] for core in placed]
+        requested = [uid for uid in cluster if uid in demand]
+
+        node = self._node(sum(demand[uid] for uid in requested), free, preferred)
+        for uid in requested:
+            # components of a cluster not fitting a single node are placed one by one
+            local = node if node is not None else self._node(demand[uid], free, preferred)
+            if local is not None:
+                cores = [core for core in free if self.topology.nodes[core] == local]
+            else:  # component spans multiple nodes, nodes with the most free cores are used
+                cores = sorted(free, key = lambda core: -self._free_on(self.topology.nodes[core], free))
+            assigned[uid] = cores[:demand[uid]]
+            for core in assigned[uid]:
+                free.remove(core)
+                preferred.append(self.topology.nodes[core])
+
+    def _free_on(self, node, free):
+        return sum(1 for core in free if self.topology.nodes[core] == node)
+
+    def _node(self, count, free, preferred):
+        """Returns node preferred by the cluster if it has enough free cores, node with the fewest sufficient free cores otherwise"""
+        for node in sorted(set(preferred), key = preferred.count, reverse = True):
+            if self._free_on(node, free) >= count:
+                return node
+        fitting = [node for node in sorted(set(self.topology.nodes.values())) if self._free_on(node, free) >= count]
+        return min(fitting, key = lambda node: self._free_on(node, free)) if fitting else None
@@ -0,0 +1,124 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import re
+import socket
+
+from components import ComponentManagerError
+
+
+PROBE_INTERVAL = 0.1
+CONNECT_TIMEOUT = 0.5
+
+
+class ProbeError(ComponentManagerError):
+    pass
+
+
+class ReadinessProbe(object):
+    """
+    Base class for readiness probes. Probe is polled after the component has been started
+    until it reports the component as ready or the startWait period expires.
+    """
+
+    def is_ready(self, component):
+        """
+        Verifies whether component is ready to serve its dependents.
+        @param component: Component instance
+        @return: True if component is ready
+        @raise ProbeError: if component cannot be probed
+        """
+
+
+class PortProbe(ReadinessProbe):
+    """Component is ready when its TCP port accepts connections."""
+
+    def __init__(self, port = None, host = "localhost"):
+        self.port = int(port) if port else None
+        self.host = host
+
+    def is_ready(self, component):
+        port = self.port or abs(getattr(component.configuration, "port", None) or 0)
+        if not port:
+            raise ProbeError("Component {0} has no port to probe".format(component.uid))
+
+        try:
+            s = socket.create_connection((self.host, port), CONNECT_TIMEOUT)
+            s.close()
+            return True
+        except socket.error:
+            return False
+
+
+class OutputProbe(ReadinessProbe):
+    """Component is ready when a line matching the pattern appears in the stdout or log file."""
+
+    def __init__(self, source, pattern):
+        self.source = source
+        self.pattern = re.compile(pattern)
+        self._path = None
+        self._offset = 0
+        self._partial = ""
+
+    def is_ready(self, component):
+        path = getattr(component, self.source)
+        if not path or not os.path.isfile(path):
+            return False
+
+        if path != self._path:
+            self._path, self._offset, self._partial = path, 0, ""
+
+        with open(path, "r") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+            self._offset = f.tell()
+
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        return any(self.pattern.search(line) for line in lines + [self._partial])
+
+
+class FileProbe(ReadinessProbe):
+    """Component is ready when the file exists."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def is_ready(self, component):
+        return os.path.exists(self.path)
+
+
+def create_probe(spec):
+    """
+    Factory method: creates readiness probe from its definition.
+    @param spec: probe definition in format kind[:argument], e.g.: port, port:5010, stdout:^ready, file:/tmp/ready
+    @raise ProbeError: if definition is invalid
+    """
+    kind, _, arg = spec.partition(":")
+    kind = kind.strip().lower()
+
+    try:
+        if kind == "port":
+            return PortProbe(arg.strip() or None)
+        elif kind in ("stdout", "log") and arg:
+            return OutputProbe(kind, arg)
+        elif kind == "file" and arg.strip():
+            return FileProbe(arg.strip())
+    except (ValueError, re.error), e:
+        raise ProbeError("Invalid readiness probe: {0}\n{1}".format(spec, e))
+
+    raise ProbeError("Invalid readiness probe: {0}".format(spec))
@@ -17,12 +17,116 @@
 
 import os
 import re
-import shlex
+import socket
+import struct
 import subprocess
+import time
 
 import osutil
 
-from components.component import Component, ComponentError, ComponentConfiguration, Status
+from components.component import Component, ComponentError, ComponentConfiguration, ConfigurationError, Status
+from components.expression import ExpressionError, evaluate
+
+
+SHUTDOWN_POLL_INTERVAL = 0.1
+
+
+class QConnectionError(ComponentError):
+    pass
+
+
+class _TextVariable(Exception):
+    """Raised by port variable lookup if value of the variable is not an integer"""
+    pass
+
+
+class QConnection(object):
+    """
+    Minimal kdb+ IPC client. Supports handshake and sending char vector expressions,
+    responses are not deserialized.
+    """
+
+    CAPABILITY = 3
+    SYNC = 1
+    ASYNC = 0
+
+    def __init__(self, host, port, username = None, password = None, timeout = None):
+        self.host = host
+        self.port = abs(int(port))
+        self.username = username or ""
+        self.password = password or ""
+        self.timeout = timeout
+        self._socket = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        """
+        Connects to the q process and performs IPC handshake. The socket is closed if the handshake fails.
+        @raise QConnectionError: if connection fails or handshake is rejected
+        """
+        try:
+            self._socket = socket.create_connection((self.host, self.port), self.timeout)
+            self._socket.sendall("{0}:{1}{2}\0".format(self.username, self.password, chr(self.CAPABILITY)))
+            if not self._socket.recv(1):
+                raise QConnectionError("Handshake rejected by {0}:{1}".format(self.host, self.port))
+        except socket.error, e:
+            self.close()
+            raise QConnectionError("Cannot connect to {0}:{1}: {2}".format(self.host, self.port, e))
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def _send(self, expression, msg_type):
+        expression = str(expression)
+        header_size = 8 + 6
+        message = struct.pack("<bbhibbi", 1, msg_type, 0, header_size + len(expression), 10, 0, len(expression)) + expression
+        self._socket.sendall(message)
+
+    def _receive(self, size):
+        data = ""
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise QConnectionError("Connection closed by {0}:{1}".format(self.host, self.port))
+            data += chunk
+        return data
+
+    def query(self, expression):
+        """
+        Evaluates expression in the q process and waits for the response.
+        @return: raw response message (without IPC header)
+        @raise QConnectionError: if connection fails or q signals an error
+        """
+        try:
+            self._send(expression, self.SYNC)
+            header = self._receive(8)
+            endianness, _, compressed = struct.unpack("bbb", header[:3])
+            size = struct.unpack("<i" if endianness == 1 else ">i", header[4:8])[0]
+            response = self._receive(size - 8)
+        except socket.error, e:
+            raise QConnectionError("Query to {0}:{1} failed: {2}".format(self.host, self.port, e))
+
+        if not compressed and response and struct.unpack("b", response[0])[0] == -128:
+            raise QConnectionError("Query to {0}:{1} failed: '{2}".format(self.host, self.port, response[1:].split("\0")[0]))
+        return response
+
+    def send(self, expression):
+        """Sends expression to the q process without waiting for the response."""
+        try:
+            self._send(expression, self.ASYNC)
+        except socket.error, e:
+            raise QConnectionError("Message to {0}:{1} failed: {2}".format(self.host, self.port, e))
 
 
 class QComponent(Component):
@@ -34,6 +138,7 @@ class QComponent(Component):
 
     def __init__(self, uid, **kwargs):
         self._logfile = None
+        self._health = None
         super(QComponent, self).__init__(uid, **kwargs)
 
     def _locate_log_file(self):
@@ -60,56 +165,53 @@ class QComponent(Component):
                     return path
         return path
 
-    def execute(self):
+    def _environment(self):
+        env = super(QComponent, self)._environment()
         if self.configuration.q_path:
-            path = os.environ.get("PATH", "")
-            os.environ["PATH"] = self.configuration.q_path + os.pathsep + path
+            env["PATH"] = self.configuration.q_path + os.pathsep + env.get("PATH", "")
+        return env
 
+    def execute(self):
         try:
             if self.configuration.u_file and not os.path.isfile(self.configuration.u_file):
                 raise ComponentError("Cannot locate uFile: {0}".format(self.configuration.u_file))
 
             super(QComponent, self).execute()
         finally:
-            if self.configuration.q_path:
-                os.environ["PATH"] = path
             self.log = None
 
     def interactive(self):
-        if self.configuration.q_path:
-            path = os.environ.get("PATH", "")
-            os.environ["PATH"] = self.configuration.q_path + os.pathsep + path
-            
-        try:
-            if self.configuration.cpu_affinity:
-                osutil.set_affinity(os.getpid(), self.configuration.cpu_affinity)
-    
-            if self.configuration.u_file and not os.path.isfile(self.configuration.u_file):
-                raise ComponentError("Cannot locate uFile: {0}".format(self.configuration.u_file))
-    
-            env = self._bootstrap_environment()
-    
-            # overwrite logging configuration for interactive mode
-            env["EC_LOG_DEST"] = "FILE,STDERR,CONSOLE"
-            env["EC_LOG_LEVEL"] = "DEBUG"
-    
-            self.executed_cmd = str(self.configuration.full_cmd)
-            p = subprocess.Popen(shlex.split(self.configuration.full_cmd, posix = False),
+        cpus, nodes, policy = self._placement()
+
+        if self.configuration.u_file and not os.path.isfile(self.configuration.u_file):
+            raise ComponentError("Cannot locate uFile: {0}".format(self.configuration.u_file))
+
+        env = self._bootstrap_environment()
+
+        # overwrite logging configuration for interactive mode
+        env["EC_LOG_DEST"] = "FILE,STDERR,CONSOLE"
+        env["EC_LOG_LEVEL"] = "DEBUG"
+
+        self.executed_cmd = str(self.configuration.full_cmd)
+        self.fingerprint = self.configuration.fingerprint
+        cgroup = self._create_cgroup()
+        cmd = cgroup.wrap(self._command(env)) if cgroup else self._command(env)
+        with osutil.placement(cpus, nodes, policy):
+            p = subprocess.Popen(cmd,
                                  cwd = self.configuration.bin_path,
                                  env = env
                                  )
-            self.pid = p.pid
-            super(QComponent, self).save_status()
-    
-            p.communicate()
-    
-            self.stopped = super(QComponent, self).timestamp()
-    
-            if p.returncode:
-                raise ComponentError("Component {0} finished prematurely with code {1}".format(self.uid, p.returncode))
-        finally:
-            if self.configuration.q_path:
-                os.environ["PATH"] = path
+        self._attach(cgroup, p)
+        self.pid = p.pid
+        self._identify_process()
+        super(QComponent, self).save_status()
+
+        p.communicate()
+
+        self.stopped = super(QComponent, self).timestamp()
+
+        if p.returncode:
+            raise ComponentError("Component {0} finished prematurely with code {1}".format(self.uid, p.returncode))
 
     @property
     def log(self):
@@ -132,10 +234,77 @@ class QComponent(Component):
         """Returns mem_cap"""
         return self.configuration.mem_cap
 
+    @property
+    def drains(self):
+        """Returns True if process is shut down via IPC, see terminate"""
+        return bool(self.configuration.ipc_shutdown and self.port)
+
+    def terminate(self, force = False):
+        """
+        Stops q process. If ipcShutdown is enabled, shutdownExpr is sent asynchronously to the process
+        and signal is sent only if the process does not exit within drainTimeout.
+        """
+        if not force and self.configuration.ipc_shutdown and self.port and self.pid:
+            if self._shutdown(int(self.pid)):
+                self.stopped = self.timestamp()
+                self.stopped_by = osutil.get_username()
+                self.pid = None
+                return
+        super(QComponent, self).terminate(force)
+
+    def _shutdown(self, pid):
+        try:
+            with QConnection("localhost", self.port, self.configuration.kdb_user, self.configuration.kdb_password, self.configuration.ipc_timeout) as q:
+                q.send(self.configuration.shutdown_expr)
+        except QConnectionError:
+            return False
+
+        deadline = time.time() + (self.configuration.drain_timeout or 0)
+        while osutil.is_alive(pid):
+            if time.time() >= deadline:
+                return False
+            time.sleep(SHUTDOWN_POLL_INTERVAL)
+        return True
+
+    def refresh(self, **status):
+        """Updates component in place with status data reloaded from the status file, drops cached process information"""
+        if status.get("stdout", self.stdout) != self.stdout:
+            self._logfile = None
+        self._health = None
+        super(QComponent, self).refresh(**status)
+
+    def check_health(self):
+        """
+        Verifies whether q process answers on its port via IPC handshake and optional ipcQuery.
+        Result is reported by status and ipc_latency properties.
+        """
+        self._health = None
+        if not self.configuration.ipc_check or not self.port or not self.is_alive:
+            return
+
+        started = time.time()
+        try:
+            with QConnection("localhost", self.port, self.configuration.kdb_user, self.configuration.kdb_password, self.configuration.ipc_timeout) as q:
+                if self.configuration.ipc_query:
+                    q.query(self.configuration.ipc_query)
+            self._health = (True, (time.time() - started) * 1000.0)
+        except QConnectionError:
+            self._health = (False, None)
+
+    @property
+    def ipc_latency(self):
+        """Returns IPC round-trip time in milliseconds measured by the last health check"""
+        return self._health[1] if self._health else None
+
     @property
     def status(self):
         """Returns status of a component"""
         st = super(QComponent, self).status
+        if self._health and st in (Status.RUNNING, Status.DISTURBED):
+            if not self._health[0]:
+                return Status.UNRESPONSIVE
+            elif st == Status.RUNNING:
+                return Status.RESPONSIVE
         try:
             if (st == Status.TERMINATED or st == Status.DISTURBED) and not osutil.is_empty(self.stderr):
                 stderr_size = osutil.file_size(self.stderr)
@@ -156,17 +325,38 @@ class QComponentConfiguration(ComponentConfiguration):
     """
 
     typeid = "q"
-    attrs = ComponentConfiguration.attrs + ["port", "multithreaded", "libs", "common_libs", "mem_cap", "u_opt", "u_file", "q_path", "q_home" ]
+    attrs = ComponentConfiguration.attrs + ["port", "multithreaded", "libs", "common_libs", "mem_cap", "u_opt", "u_file", "q_path", "q_home", "kdb_user", "kdb_password", "ipc_check", "ipc_query", "ipc_timeout",
+                                            "ipc_shutdown", "shutdown_expr", "drain_timeout"]
+    launch_attrs = ComponentConfiguration.launch_attrs + ["q_path", "q_home", "u_file"]
+    instance_keys = ComponentConfiguration.instance_keys + ["port", "basePort", "libs", "commonLibs", "uFile", "qPath"]
 
     def _get_port(self, cfg, default = 0):
         port_attr = "basePort"
         base_port = self._int_(self._expand_variables(cfg[1][port_attr]) if cfg[1].has_key(port_attr) else self._expand_variables(cfg[2].get(port_attr, default)))
 
-        component_val = self._expand_variables(cfg[0].get("port", default), variables = {"basePort": base_port})
+        component_val = cfg[0].get("port", default)
         if not component_val:
             return base_port
-        else:
-            return eval(component_val, {"__builtins__":None}, {})
+
+        component_val = str(component_val)
+        variables = {"basePort": base_port}
+
+        def lookup(name):
+            if name in variables:
+                return variables[name]
+            value = self._expand_variables("${%s}" % name, variables)
+            try:
+                return int(value)
+            except ValueError:
+                raise _TextVariable(name)
+
+        try:
+            try:
+                return evaluate(component_val, lookup)
+            except _TextVariable:  # variable is not an integer, substitute it as text
+                return evaluate(self._expand_variables(component_val, variables))
+        except ExpressionError, e:
+            raise ConfigurationError("Invalid port in component {0}: {1}".format(self.uid, e))
 
     def parse(self, cfg):
         ComponentConfiguration.parse(self, cfg)
@@ -183,6 +373,28 @@ class QComponentConfiguration(ComponentConfiguration):
         self.q_home = self._get_value("qHome", cfg, None)
         if self.q_home:
             self.vars["QHOME"] = self.q_home
+        self.kdb_user = self._get_raw_value("kdbUser", cfg)
+        self.kdb_password = self._get_raw_value("kdbPassword", cfg)
+        self.ipc_check = self._bool_(self._get_value("ipcCheck", cfg, False))
+        self.ipc_query = self._get_value("ipcQuery", cfg)
+        self.ipc_timeout = self._float_(self._get_value("ipcTimeout", cfg, 1))
+        self.ipc_shutdown = self._bool_(self._get_value("ipcShutdown", cfg, False))
+        self.shutdown_expr = self._get_value("shutdownExpr", cfg, "exit 0")
+        self.drain_timeout = self._float_(self._get_value("drainTimeout", cfg, 5))
+
+    def resolve_instance(self, cfg, keys):
+        ComponentConfiguration.resolve_instance(self, cfg, keys)
+        if "port" in keys or "basePort" in keys:
+            self.port = self._get_port(cfg)
+            self.port = self.port * (-1 if self.multithreaded else 1) if self.port else self.port
+        if "libs" in keys:
+            self.libs = self._get_list("libs", cfg, [])
+        if "commonLibs" in keys:
+            self.common_libs = self._get_list("commonLibs", cfg, [])
+        if "uFile" in keys:
+            self.u_file = self._get_file("uFile", cfg)
+        if "qPath" in keys:
+            self.q_path = self._get_value("qPath", cfg, None)
 
     @property
     def full_cmd(self):
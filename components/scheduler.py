@@ -0,0 +1,99 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import Queue
+import threading
+
+try:
+    from collections import OrderedDict
+except ImportError:  # python < 2.7 -> try to import ordereddict
+    from ordereddict import OrderedDict
+
+
+class DependencyScheduler(object):
+    """
+    Executes a task for each node of a dependency graph on a bounded pool of worker threads.
+    Node is dispatched as soon as all of its prerequisites have been processed, there is no
+    barrier between independent branches of the graph.
+    """
+
+    def __init__(self, workers):
+        self.workers = max(1, int(workers))
+
+    def run(self, nodes, prerequisites, task):
+        """
+        Executes task for every node.
+        @param nodes: list of node identifiers in dependency order
+        @param prerequisites: function returning identifiers of nodes required by given node,
+                              nodes outside of the scheduled list are ignored
+        @param task: function executed for each node
+        @return: OrderedDict with results returned by task (or exception raised by task) for each node
+        """
+        nodes = list(nodes)
+        position = dict((node, i) for i, node in enumerate(nodes))
+
+        pending = dict()
+        dependents = dict((node, []) for node in nodes)
+        for node in nodes:
+            pending[node] = set(uid for uid in (prerequisites(node) or ()) if uid in position and uid != node)
+            for uid in pending[node]:
+                dependents[uid].append(node)
+
+        results = OrderedDict((node, None) for node in nodes)
+        ready = [node for node in nodes if not pending[node]]
+        tasks = Queue.Queue()
+        finished = Queue.Queue()
+
+        def worker():
+            while True:
+                node = tasks.get()
+                if node is None:
+                    return
+                try:
+                    result = task(node)
+                except Exception, e:
+                    result = e
+                finished.put((node, result))
+
+        threads = [threading.Thread(target = worker) for _ in xrange(min(self.workers, len(nodes)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        running = 0
+        try:
+            while ready or running:
+                for node in ready:
+                    tasks.put(node)
+                    running += 1
+                ready = []
+
+                node, result = finished.get()
+                running -= 1
+                results[node] = result
+
+                for dependent in dependents[node]:
+                    pending[dependent].discard(node)
+                    if not pending[dependent]:
+                        ready.append(dependent)
+                ready.sort(key = position.get)
+        finally:
+            for thread in threads:
+                tasks.put(None)
+            for thread in threads:
+                thread.join()
+
+        return results
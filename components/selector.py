@@ -0,0 +1,118 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import fnmatch
+import re
+
+from components import ComponentManagerError
+
+
+GLOB_CHARS_RE = re.compile(r"[*?\[]")
+
+
+class SelectorError(ComponentManagerError):
+    pass
+
+
+class ComponentSelector(object):
+    """
+    Resolves component selectors to lists of component identifiers in dependency order.
+
+    Supported selectors:
+     - *                  all components
+     - group              components of the group
+     - prefix             identifiers starting with the prefix, e.g.: core selects core.* and core2.* components
+     - namespace.id       single component
+     - glob               identifiers matching shell-style pattern, e.g.: cep.feed_*
+     - /regex/            identifiers matching regular expression
+     - status=S1[,S2]     components with given status, e.g.: status=TERMINATED
+    Selector prefixed with ! excludes matching components.
+    """
+
+    def __init__(self, order, groups):
+        """
+        @param order: identifiers of components in dependency order
+        @param groups: dictionary: group name -> list of identifiers
+        """
+        self.order = list(order)
+        self._position = dict((uid, i) for i, uid in enumerate(self.order))
+        self.groups = groups
+        self._compiled = dict()
+
+    def select(self, selectors, status = None):
+        """
+        Returns identifiers of components matching the selectors.
+        @param selectors: list of selectors
+        @param status: function returning status of the component with given identifier, used by status selectors
+        @return: list of identifiers in dependency order
+        @raise SelectorError: if selector refers unmanaged group or component, pattern does not match any component
+            or selector is malformed
+        """
+        selected = set()
+        ignored = set()
+        for selector in selectors:
+            if selector.startswith("!"):
+                ignored.update(self._match(selector[1:], status, negated = True))
+            else:
+                selected.update(self._match(selector, status))
+        return sorted(selected.difference(ignored), key = self._position.__getitem__)
+
+    def _match(self, selector, status, negated = False):
+        if selector == "*":
+            return self.order
+        elif selector.startswith("status="):
+            if status is None:
+                raise SelectorError("Status selector is not supported: {0}".format(selector))
+            statuses = set(s.strip().upper() for s in selector[len("status="):].split(","))
+            return [uid for uid in self.order if status(uid) in statuses]
+        elif len(selector) > 1 and selector.startswith("/") and selector.endswith("/"):
+            pattern = self._compile(selector, selector[1:-1])
+            return self._matching(selector, [uid for uid in self.order if pattern.search(uid)], negated)
+        elif GLOB_CHARS_RE.search(selector):
+            pattern = self._compile(selector, fnmatch.translate(selector))
+            return self._matching(selector, [uid for uid in self.order if pattern.match(uid)], negated)
+
+        ids = selector.split(".")
+        if len(ids) == 1:  # namespace or group
+            if selector in self.groups:
+                group = self.groups[selector]
+            else:
+                group = [uid for uid in self.order if uid.startswith(selector)]
+            if not group:
+                raise SelectorError("Trying to refer unmanaged group: {0}".format(selector))
+            return group
+        elif len(ids) == 2:  # component
+            if not selector in self._position:
+                raise SelectorError("Trying to refer unmanaged component: {0}".format(selector))
+            return [selector]
+        else:
+            raise SelectorError("Malformed group/component identifier: {0}".format(selector))
+
+    @staticmethod
+    def _matching(selector, matched, negated):
+        # pattern matching nothing is most likely a typo, excluding nothing is harmless
+        if not matched and not negated:
+            raise SelectorError("Pattern does not match any managed component: {0}".format(selector))
+        return matched
+
+    def _compile(self, selector, pattern):
+        compiled = self._compiled.get(selector)
+        if compiled is None:
+            try:
+                compiled = self._compiled[selector] = re.compile(pattern)
+            except re.error, e:
+                raise SelectorError("Malformed pattern {0}: {1}".format(selector, e))
+        return compiled
@@ -16,6 +16,14 @@
 
 import os
 import sqlite3
+import threading
+
+try:
+    from collections import OrderedDict
+except ImportError:  # python < 2.7 -> try to import ordereddict
+    from ordereddict import OrderedDict
+
+from contextlib import contextmanager
 
 from components.component import Component
 
@@ -37,14 +45,24 @@ class StatusPersistance(object):
         started TIMESTAMP,
         started_by VARCHAR,
         stopped TIMESTAMP,
-        stopped_by VARCHAR
+        stopped_by VARCHAR,
+        proc_started REAL,
+        boot_id VARCHAR,
+        fingerprint VARCHAR
     );
     PRAGMA journal_mode=WAL;
     """
 
+    # columns added to the status file after the initial version: (column, definition)
+    __MIGRATIONS__ = [("proc_started", "REAL"),
+                      ("boot_id", "VARCHAR"),
+                      ("fingerprint", "VARCHAR"),
+                      ]
+
     __ATTRS_COMPONENT__ = ["uid", "typeid", "pid", "executed_cmd",
                          "log", "stdout", "stderr", "stdenv",
-                         "started", "started_by", "stopped", "stopped_by"]
+                         "started", "started_by", "stopped", "stopped_by",
+                         "proc_started", "boot_id", "fingerprint"]
 
     __UPSERT_STATUS__ = \
     "INSERT OR REPLACE INTO components(%s) VALUES(%s)" % \
@@ -56,6 +74,9 @@ class StatusPersistance(object):
     __DELETE_STATUS__ = \
     "DELETE FROM components WHERE uid = ?"
 
+    __DATA_VERSION__ = \
+    "PRAGMA data_version"
+
     def __init__(self, statusfile):
         statuspath = os.path.split(statusfile)[0]
         if not os.path.exists(statuspath):
@@ -66,22 +87,82 @@ class StatusPersistance(object):
                                       check_same_thread = False,
                                       timeout = 30.0)
         self.__conn.row_factory = sqlite3.Row
+        self.__lock = threading.RLock()
+        self.__pending = None
+        self.__depth = 0
+        self.commits = 0
         self._init_db_()
 
     def _init_db_(self):
         self.__conn.executescript(self.__DB_SCRIPT__)
+        columns = [row["name"] for row in self.__conn.execute("PRAGMA table_info(components)")]
+        for column, definition in self.__MIGRATIONS__:
+            if not column in columns:
+                self.__conn.execute("ALTER TABLE components ADD COLUMN {0} {1}".format(column, definition))
         self.__conn.commit()
 
+    def _commit_(self):
+        self.__conn.commit()
+        self.commits += 1
+
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: status changes saved within the block are buffered and written to
+        the status file in a single transaction when the outermost block exits (also on error).
+        """
+        with self.__lock:
+            if not self.__depth:
+                self.__pending = OrderedDict()
+            self.__depth += 1
+        try:
+            yield self
+        finally:
+            with self.__lock:
+                self.__depth -= 1
+                if not self.__depth:
+                    pending, self.__pending = self.__pending, None
+                    self._flush_(pending)
+
+    def _flush_(self, pending):
+        if not pending:
+            return
+        try:
+            for uid, data in pending.iteritems():
+                if data is None:
+                    self.__conn.execute(self.__DELETE_STATUS__, [uid])
+                else:
+                    self.__conn.execute(self.__UPSERT_STATUS__, data)
+            self._commit_()
+        except:
+            self.__conn.rollback()
+            raise
+
+    @property
+    def data_version(self):
+        """Returns counter changed whenever the status file is modified by another connection"""
+        with self.__lock:
+            return self.__conn.execute(self.__DATA_VERSION__).fetchone()[0]
+
+    def load_status(self):
+        """Loads raw components status data from the status file"""
+        with self.__lock:
+            c = self.__conn.cursor()
+            c.execute(self.__SELECT_STATUS__)
+            rows = c.fetchall()
+
+        return dict((row["uid"], dict(**row)) for row in rows)
+
+    def status_data(self, component):
+        """Returns status data of a component in the format returned by load_status"""
+        return dict((attr, getattr(component, attr)) for attr in self.__ATTRS_COMPONENT__)
+
     def load(self):
         """Loads components status data from the status file"""
         components = dict()
 
-        c = self.__conn.cursor()
-        c.execute(self.__SELECT_STATUS__)
-        for row in c.fetchall():
-            args = dict(**row)
-            args["status_persistance"] = self
-            component = Component.create_instance(**args)
+        for args in self.load_status().itervalues():
+            component = Component.create_instance(status_persistance = self, **args)
             components[component.uid] = component
 
         return components
@@ -89,10 +170,18 @@ class StatusPersistance(object):
     def save_status(self, component):
         """Saves component status in the status file"""
         data = [getattr(component, attr) for attr in self.__ATTRS_COMPONENT__]
-        self.__conn.execute(self.__UPSERT_STATUS__, data)
-        self.__conn.commit()
+        with self.__lock:
+            if self.__pending is not None:
+                self.__pending[component.uid] = data
+            else:
+                self.__conn.execute(self.__UPSERT_STATUS__, data)
+                self._commit_()
 
     def delete_status(self, uid):
         """Deletes satus od a single component from the status file"""
-        self.__conn.execute(self.__DELETE_STATUS__, [uid])
-        self.__conn.commit()
+        with self.__lock:
+            if self.__pending is not None:
+                self.__pending[uid] = None
+            else:
+                self.__conn.execute(self.__DELETE_STATUS__, [uid])
+                self._commit_()
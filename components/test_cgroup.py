@@ -0,0 +1,132 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from components.cgroup import Cgroup, CgroupError
+from components.component import ComponentError, ConfigurationError
+from components.testutils import create_component
+
+
+
+class TestCgroup(unittest.TestCase):
+    """Cgroup v2 isolation tested against a directory imitating cgroupfs"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "yak.slice")
+        os.mkdir(self.root)
+        self.write("cgroup.subtree_control", "")
+        self.components = []
+
+    def tearDown(self):
+        for component in self.components:
+            if component.pid:
+                component.terminate(force = True)
+        shutil.rmtree(self.tmp)
+
+    def read(self, *path):
+        with open(os.path.join(self.root, *path)) as f:
+            return f.read()
+
+    def write(self, name, value):
+        with open(os.path.join(self.root, name), "w") as f:
+            f.write(value)
+
+    def component(self, **settings):
+        settings = dict(dict(command = "sleep 30", startWait = "0.01", cgroupRoot = self.root), **settings)
+        component = create_component("core.isolated", self.tmp, **settings)
+        self.components.append(component)
+        return component
+
+    def testConfiguration(self):
+        configuration = self.component(memoryMax = "1G", cpuMax = "1.5", cpuWeight = "200", ioWeight = "50").configuration
+        self.assertEqual(configuration.memory_max, 1 << 30)
+        self.assertEqual(configuration.cgroup_limits, {"memory.max": "1073741824", "cpu.max": "150000 100000",
+                                                       "cpu.weight": "200", "io.weight": "default 50"})
+        self.assertEqual(self.component(memoryMax = "512m", cpuMax = "max").configuration.cgroup_limits,
+                         {"memory.max": "536870912", "cpu.max": "max", "cpu.weight": None, "io.weight": None})
+
+        for settings in (dict(memoryMax = "1X"), dict(cpuMax = "-1"), dict(cpuWeight = "0"), dict(ioWeight = "10001"),
+                         dict(cpuWeight = "max"), dict(cgroupRoot = "", memoryMax = "1G")):
+            self.assertRaises(ConfigurationError, self.component, **settings)
+
+        # fingerprints of components without cgroup are not affected
+        plain = self.component(cgroupRoot = "").configuration
+        self.assertNotEqual(plain.fingerprint, configuration.fingerprint)
+        self.assertEqual(plain.fingerprint, self.component(cgroupRoot = "", cpuWeight = "").configuration.fingerprint)
+
+    def testIsolation(self):
+        component = self.component(memoryMax = "1G", cpuMax = "1.5", cpuWeight = "200")
+        os.makedirs(os.path.join(self.root, "core.isolated"))  # cgroup left by the previous run
+        self.write(os.path.join("core.isolated", "io.weight"), "default 20")
+        component.initialize()
+        component.execute()
+        component.check_process()
+
+        self.assertEqual(self.read("cgroup.subtree_control"), "+cpu +memory")
+        self.assertEqual(self.read("core.isolated", "memory.max"), "1073741824")
+        self.assertEqual(self.read("core.isolated", "cpu.max"), "150000 100000")
+        self.assertEqual(self.read("core.isolated", "cpu.weight"), "200")
+        self.assertEqual(self.read("core.isolated", "io.weight"), "default 100")
+        self.assertEqual(self.read("core.isolated", "cgroup.procs"), str(component.pid))
+
+        self.write(os.path.join("core.isolated", "memory.current"), "4096\n")
+        self.write(os.path.join("core.isolated", "cpu.stat"), "usage_usec 2500000\nuser_usec 2000000\nsystem_usec 500000\n")
+        self.assertEqual(component.cgroup_mem, 4)
+        self.assertEqual(component.cgroup_cpu, 2.5)
+
+        component.terminate(force = True)
+        self.assertEqual(component.cgroup_mem, None)
+
+    def testAttachedBeforeExec(self):
+        with open(os.path.join(self.tmp, "fork.sh"), "w") as f:
+            f.write("cat yak.slice/core.isolated/cgroup.procs > procs\nsleep 30\n")
+        component = self.component(cpuWeight = "10", command = "sh fork.sh", startWait = "0.3")
+        component.initialize()
+        attach = Cgroup.attach
+        Cgroup.attach = lambda cgroup, pid: None  # process is moved only by the wrapper
+        try:
+            component.execute()
+        finally:
+            Cgroup.attach = attach
+        component.wait_ready()
+        component.check_process()
+        # process was in the cgroup before it executed the command, before the command forked its children
+        with open(os.path.join(self.tmp, "procs")) as f:
+            self.assertEqual(f.read().strip(), str(component.pid))
+
+    def testAttachFailure(self):
+        component = self.component(cpuWeight = "10")
+        os.makedirs(os.path.join(self.root, "core.isolated", "cgroup.procs"))
+        component.initialize()
+        self.assertRaises(ComponentError, component.execute)
+        self.assertEqual(component.pid, None)
+        self.assertTrue(component._process.poll() is not None)
+
+    def testMissingRoot(self):
+        cgroup = Cgroup(os.path.join(self.tmp, "missing"), "core.isolated")
+        self.assertRaises(CgroupError, cgroup.create, {"cpu.weight": "100"})
+        self.assertEqual(cgroup.memory_current, None)
+        self.assertEqual(cgroup.cpu_usage, None)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
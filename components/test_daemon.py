@@ -0,0 +1,150 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from StringIO import StringIO
+
+from components.daemon import DaemonError, DaemonServer, execute
+
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "yak.status.sock")
+        self.commands = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _handler(self, line):
+        self.commands.append(line)
+        if line == "spawn":
+            self.process = subprocess.Popen(["sleep", "30"])
+        print "executed: {0}".format(line)
+        return {"fail": 1, "other": None}.get(line, 0)
+
+    @staticmethod
+    def _sockets(pid):
+        fd_dir = "/proc/{0}/fd".format(pid)
+        links = []
+        for fd in os.listdir(fd_dir):
+            try:
+                links.append(os.readlink(os.path.join(fd_dir, fd)))
+            except OSError:
+                pass
+        return set(link for link in links if link.startswith("socket:"))
+
+    def _start(self):
+        server = DaemonServer(self.path, self._handler)
+        server.bind()
+        thread = threading.Thread(target = server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server, thread
+
+    def _stop(self, server, thread):
+        server.shutdown()
+        deadline = time.time() + 5
+        while thread.is_alive() and time.time() < deadline:
+            execute(self.path, None)  # wake up accept
+            thread.join(0.1)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(self.path))
+
+    def testExecute(self):
+        server, thread = self._start()
+        try:
+            output = StringIO()
+            self.assertEqual(execute(self.path, "info core", output), 0)
+            self.assertEqual(output.getvalue(), "executed: info core\n")
+            self.assertEqual(execute(self.path, "fail", StringIO()), 1)
+            self.assertIsNone(execute(self.path, "other", StringIO()))  # declined, executed by the client
+            self.assertEqual(self.commands, ["info core", "fail", "other"])
+            self.assertEqual(oct(os.stat(self.path).st_mode & 0777), "0600")
+        finally:
+            self._stop(server, thread)
+
+    def testConnectionReset(self):
+        # daemon closing the socket with the connection still in the backlog
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(1)
+        thread = threading.Thread(target = lambda: listener.accept()[0].close())
+        thread.start()
+        try:
+            self.assertIsNone(execute(self.path, "info"))
+        finally:
+            thread.join(5)
+            listener.close()
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "open descriptors are listed in /proc")
+    def testCloseOnExec(self):
+        inherited = self._sockets(os.getpid())
+        server, thread = self._start()
+        try:
+            self.assertEqual(execute(self.path, "spawn", StringIO()), 0)
+            self.assertTrue(self._sockets(self.process.pid).issubset(inherited))
+        finally:
+            self.process.kill()
+            self.process.wait()
+            self._stop(server, thread)
+
+    def testNotAccepted(self):
+        # socket held by a process which never accepts, e.g. child of a killed daemon
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(1)
+        try:
+            started = time.time()
+            self.assertIsNone(execute(self.path, "info", timeout = 0.2))
+            self.assertLess(time.time() - started, 2)
+            conn = listener.accept()[0]
+            self.assertEqual(conn.recv(1024), "")  # command is not sent
+            conn.close()
+        finally:
+            listener.close()
+
+    def testNotRunning(self):
+        self.assertIsNone(execute(self.path, "info"))
+
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+        self.assertIsNone(execute(self.path, "info"))
+
+        server, thread = self._start()  # stale socket is replaced
+        try:
+            with self.assertRaises(DaemonError):
+                DaemonServer(self.path, self._handler).bind()
+        finally:
+            self._stop(server, thread)
+        self.assertEqual(self.commands, [])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
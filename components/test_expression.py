@@ -0,0 +1,58 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import unittest
+
+from components.component import ConfigurationError
+from components.expression import ExpressionError, compile_expression, evaluate
+from components.q import QComponentConfiguration
+
+
+
+class TestExpression(unittest.TestCase):
+
+    def testEvaluate(self):
+        self.assertEqual(evaluate("16000"), 16000)
+        self.assertEqual(evaluate("$basePort + 100 + ${EC_COMPONENT_INSTANCE}", {"basePort": 15000, "EC_COMPONENT_INSTANCE": 2}.get), 15102)
+        self.assertEqual(evaluate("2 + 3 * 4 - (1 + 1) * -2"), 18)
+        self.assertEqual(evaluate("7 // 2 + 7 / 2 + 7 % 4"), 9)
+        self.assertIs(compile_expression("$a + 1"), compile_expression("$a + 1"))
+        self.assertEqual(compile_expression("$a + 1 * $b").variables, ["a", "b"])
+
+    def testInvalid(self):
+        for expression in ("__import__('os')", "1 +", "(1 + 2", "1 2", "1 ** 2", "$a"):
+            with self.assertRaises(ExpressionError):
+                evaluate(expression)
+        with self.assertRaises(ExpressionError):
+            evaluate("1 // 0")
+
+    def testPort(self):
+        cfg = ({"port": "$basePort + $offset * ${EC_COMPONENT_INSTANCE}"}, {"basePort": "15000", "offset": "2 + 3"}, {})
+        configuration = QComponentConfiguration(("core", "feed", "3"))
+        configuration.vars.update(EC_COMPONENT_INSTANCE = "3", offset = "2 + 3")
+        self.assertEqual(configuration._get_port(cfg), 15011)  # variables are substituted as text
+        self.assertEqual(configuration._get_port(({}, {"basePort": "15000"}, {})), 15000)
+        with self.assertRaises(ConfigurationError):
+            configuration._get_port(({"port": "open('/etc/passwd')"}, {"basePort": "15000"}, {}))
+        # evaluation errors are reported for the original expression, not retried with variables substituted as text
+        with self.assertRaises(ConfigurationError) as error:
+            configuration._get_port(({"port": "$basePort // (${EC_COMPONENT_INSTANCE} - 3)"}, {"basePort": "15000"}, {}))
+        self.assertIn("$basePort // (${EC_COMPONENT_INSTANCE} - 3)", str(error.exception))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
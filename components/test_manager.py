@@ -15,6 +15,12 @@
 #
 
 import os
+import shutil
+import signal
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
 
 try:
@@ -22,9 +28,18 @@ try:
 except ImportError:  # python < 2.7 -> try to import ordereddict
     from ordereddict import OrderedDict
 
-from components.component import ComponentConfiguration, ConfigurationError, TimestampMode
+import osutil
+
+from configobj import ConfigObj
+
+from components.component import Component, ComponentConfiguration, ComponentError, ConfigurationError, LazyConfiguration, TimestampMode, VariableResolver
 from components.q import QComponentConfiguration
+from components.cache import CompletionCache
 from components.manager import ComponentManager, DependencyError
+from components import manager as manager_module
+from components.scheduler import DependencyScheduler
+from components.status import StatusPersistance
+from components.testutils import create_component
 
 
 
@@ -46,6 +61,8 @@ class TestConfiguration(unittest.TestCase):
                                                               stop_wait = 1,
                                                               sys_user = ["tcore", "root"],
                                                               cpu_affinity = [0, 1],
+                                                              numa_node = [],
+                                                              mem_policy = None,
                                                               port = 15005,
                                                               libs = [],
                                                               common_libs = ["clA"],
@@ -56,6 +73,11 @@ class TestConfiguration(unittest.TestCase):
                                                               silent = False,
                                                               q_path = None,
                                                               q_home = None,
+                                                              ipc_check = False,
+                                                              ipc_timeout = 1,
+                                                              ipc_shutdown = False,
+                                                              shutdown_expr = "exit 0",
+                                                              drain_timeout = 5,
                                                               ),),
                            ("core.rdb", QComponentConfiguration(tuple(("core", "rdb")),
                                                               command = "q rdb.q",
@@ -67,6 +89,8 @@ class TestConfiguration(unittest.TestCase):
                                                               stop_wait = 1,
                                                               sys_user = ["tcore", "root"],
                                                               cpu_affinity = [0, 1],
+                                                              numa_node = [],
+                                                              mem_policy = None,
                                                               port = -16000,
                                                               libs = ["libA", "libB"],
                                                               common_libs = ["clA"],
@@ -77,6 +101,11 @@ class TestConfiguration(unittest.TestCase):
                                                               silent = False,
                                                               q_path = None,
                                                               q_home = None,
+                                                              ipc_check = False,
+                                                              ipc_timeout = 1,
+                                                              ipc_shutdown = False,
+                                                              shutdown_expr = "exit 0",
+                                                              drain_timeout = 5,
                                                               ),),
                            ("core.monitor", ComponentConfiguration(tuple(("core", "monitor")),
                                                                  command = "python monitor.py",
@@ -88,6 +117,8 @@ class TestConfiguration(unittest.TestCase):
                                                                  stop_wait = 1,
                                                                  sys_user = ["tcore", "root"],
                                                                  cpu_affinity = [0, 1],
+                                                                 numa_node = [],
+                                                                 mem_policy = None,
                                                                  timestamp_mode = TimestampMode.UTC,
                                                                  silent = False,
                                                                  ),),
@@ -101,6 +132,8 @@ class TestConfiguration(unittest.TestCase):
                                                                stop_wait = 1,
                                                                sys_user = [],
                                                                cpu_affinity = [],
+                                                               numa_node = [],
+                                                               mem_policy = None,
                                                                port = 16107,
                                                                libs = [],
                                                                common_libs = [],
@@ -111,6 +144,11 @@ class TestConfiguration(unittest.TestCase):
                                                                u_file = "optfile",
                                                                timestamp_mode = TimestampMode.UTC,
                                                                silent = False,
+                                                               ipc_check = False,
+                                                               ipc_timeout = 1,
+                                                               ipc_shutdown = False,
+                                                               shutdown_expr = "exit 0",
+                                                               drain_timeout = 5,
                                                                ),),
                            ("cep.python", ComponentConfiguration(tuple(("cep", "python")),
                                                                 command = "python",
@@ -123,9 +161,18 @@ class TestConfiguration(unittest.TestCase):
                                                                 sys_user = [],
                                                                 timestamp_mode = TimestampMode.UTC,
                                                                 silent = True,
-                                                                cpu_affinity = [],))]
+                                                                cpu_affinity = [],
+                                                                numa_node = [],
+                                                                mem_policy = None,))]
                           )
 
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.status_file = os.path.join(self.tmp, "test.status")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
     def testSample(self):
         c = ComponentConfiguration.load_configuration("components/test/sample.cfg")[0]
         for component_id in c:
@@ -135,8 +182,88 @@ class TestConfiguration(unittest.TestCase):
                 expected = getattr(TestConfiguration.REF_CFG[component.uid], a)
                 self.assertEqual(actual, expected, "%s.%s\nexpected: %s\nactual: %s" % (component_id, a, expected, actual))
 
+    def testMultipleInstances(self):
+        cfg_file = os.path.join(tempfile.mkdtemp(), "system.cfg")
+        try:
+            with open(cfg_file, "w") as f:
+                f.write("basePort = 17000\n[group:feed]\nlogPath = $LOG_ROOT/$EC_COMPONENT\nexport = instance\n")
+                f.write("   [[feed.shared:4]]\n   type = q:feed\n   command = q feed.q\n   port = $basePort + 1\n   instance = shared\n")
+                f.write("   [[feed.fh:(1,5,9)]]\n   type = q:feed\n   command = q fh.q -i $EC_COMPONENT_INSTANCE\n   port = $basePort + $EC_COMPONENT_INSTANCE\n"
+                        "   instance = ${EC_COMPONENT_ID}\n   qHome = /q/$EC_COMPONENT_INSTANCE\n")
+
+            config = ComponentConfiguration.load_configuration(cfg_file)[0]
+            self.assertEqual(config.keys(), ["feed.shared_0", "feed.shared_1", "feed.shared_2", "feed.shared_3", "feed.fh_1", "feed.fh_5", "feed.fh_9"])
+            for uid, configuration in config.iteritems():
+                cfg = ConfigObj(cfg_file)
+                gid, cid = uid.split("_")[0].split(".")
+                header = [h for h in cfg["group:feed"].sections if h.startswith(uid.split("_")[0])][0]
+                expected = ComponentConfiguration.create_instance("q", (gid, cid, configuration.instance),
+                                                                  (cfg["group:feed"][header], cfg["group:feed"], dict(basePort = "17000")))
+                self.assertEqual(configuration, expected, uid)
+
+            self.assertEqual(config["feed.fh_5"].port, 17005)
+            self.assertEqual(config["feed.fh_5"].env["EC_INSTANCE"], "feed.fh_5")
+            self.assertEqual(config["feed.fh_5"].vars["QHOME"], "/q/5")
+            self.assertEqual(config["feed.shared_3"].vars["EC_COMPONENT_ID"], "feed.shared_3")
+
+            # cloned instances do not share mutable settings
+            config["feed.shared_0"].cpu_affinity.append(3)
+            config["feed.shared_0"].sys_user.append("other")
+            config["feed.shared_0"].env["EXTRA"] = "1"
+            self.assertEqual([config["feed.shared_1"].cpu_affinity, config["feed.shared_1"].sys_user], [[], []])
+            self.assertNotIn("EXTRA", config["feed.shared_2"].env)
+        finally:
+            shutil.rmtree(os.path.dirname(cfg_file))
+
+    def testInstanceTemplate(self):
+        cfg_file = os.path.join(tempfile.mkdtemp(), "system.cfg")
+        parse = QComponentConfiguration.parse
+        parsed = []
+        def counting_parse(configuration, cfg):
+            parsed.append(configuration.uid)
+            parse(configuration, cfg)
+        try:
+            with open(cfg_file, "w") as f:
+                f.write("basePort = 17000\n[group:feed]\nlogPath = $LOG_ROOT/$EC_COMPONENT_ID\nexport = instance\n")
+                f.write("   [[feed.fh:(1,5,9)]]\n   type = q:feed\n   command = q fh.q -i $EC_COMPONENT_INSTANCE\n   port = $basePort + $EC_COMPONENT_INSTANCE\n"
+                        "   instance = ${EC_COMPONENT_ID}\n")
+                f.write("   [[feed.pinned:2]]\n   type = q:feed\n   command = q pinned.q\n   cpuAffinity = $EC_COMPONENT_INSTANCE\n")
+
+            QComponentConfiguration.parse = counting_parse
+            try:
+                config = ComponentConfiguration.load_configuration(cfg_file)[0]
+            finally:
+                QComponentConfiguration.parse = parse
+            # instance dependent template is parsed once, settings without instance_keys are parsed per instance
+            self.assertEqual(parsed, ["feed.fh_1", "feed.pinned_0", "feed.pinned_1"])
+
+            cfg = ConfigObj(cfg_file)
+            for uid, configuration in config.iteritems():
+                header = [h for h in cfg["group:feed"].sections if h.startswith(uid.split("_")[0])][0]
+                expected = ComponentConfiguration.create_instance("q", tuple(uid.replace("_", ".").split(".")),
+                                                                  (cfg["group:feed"][header], cfg["group:feed"], dict(basePort = "17000")))
+                self.assertEqual(configuration, expected, uid)
+            self.assertEqual([config[uid].port for uid in ("feed.fh_1", "feed.fh_5", "feed.fh_9")], [17001, 17005, 17009])
+            self.assertEqual(config["feed.fh_9"].full_cmd, "q fh.q -i 9 -p 17009")
+            self.assertEqual(config["feed.fh_9"].log_path, "_log_/feed.fh_9")
+            self.assertEqual(config["feed.fh_9"].env["EC_INSTANCE"], "feed.fh_9")
+            self.assertEqual(config["feed.pinned_1"].cpu_affinity, [1])
+        finally:
+            shutil.rmtree(os.path.dirname(cfg_file))
+
+    def testVariableResolver(self):
+        resolver = VariableResolver()
+        os.environ["YAK_TEST_VAR"] = "env"
+        self.assertEqual(resolver.expand("${a}/$b/$$-/$YAK_TEST_VAR", ({"a": 1}, {"a": 2, "b": ""}), "core.a"), "1//$-/env")
+        self.assertIs(resolver.compile("${a}/$b"), resolver.compile("${a}/$b"))
+        self.assertEqual(resolver.expand("$a", ({"a": "x"},), "core.a"), "x")
+        self.assertEqual(resolver.expand("$a", ({"a": "y"},), "core.a"), "y")
+        with self.assertRaises(ConfigurationError) as error:
+            resolver.expand("$missing", ({},), "core.a")
+        self.assertEqual(str(error.exception), "Unresolved variable $missing found in component core.a")
+
     def testEnvBootstrap(self):
-        c = ComponentManager("components/test/sample.cfg", "components/test/test.status")
+        c = ComponentManager("components/test/sample.cfg", self.status_file)
         env = c.components["core.hdb"]._bootstrap_environment()
 
         self.assertEqual("core.hdb", env["EC_COMPONENT_ID"])
@@ -150,22 +277,723 @@ class TestConfiguration(unittest.TestCase):
         
 
     def testDependencyOrder(self):
-        c = ComponentManager("components/test/sample.cfg", "components/test/test.status")
+        c = ComponentManager("components/test/sample.cfg", self.status_file)
         self.assertEqual(c.dependencies_order, ["core.hdb", "cep.python", "core.rdb", "core.monitor", "cep.cep_7"])
  
     def testDependencyOrderFailSelfDependency(self):
         with self.assertRaises(DependencyError):
-            ComponentManager("components/test/self_dep.cfg", "components/test/test.status")
+            ComponentManager("components/test/self_dep.cfg", self.status_file)
  
     def testDependencyOrderFailCircularDependency(self):
         with self.assertRaises(DependencyError):
-            ComponentManager("components/test/circular_dep.cfg", "components/test/test.status")
+            ComponentManager("components/test/circular_dep.cfg", self.status_file)
  
     def testDependencyOrderFailExternalDependency(self):
         with self.assertRaises(DependencyError):
-            ComponentManager("components/test/ext_dep.cfg", "components/test/test.status")
+            ComponentManager("components/test/ext_dep.cfg", self.status_file)
  
 
 
+class TestScheduler(unittest.TestCase):
+
+    GRAPH = OrderedDict([("core.hdb", []),
+                         ("cep.python", []),
+                         ("core.rdb", ["core.hdb"]),
+                         ("core.monitor", ["core.rdb", "core.hdb"]),
+                         ("cep.cep_7", ["core.rdb"])])
+
+    def testDependencyOrder(self):
+        finished = []
+        lock = threading.Lock()
+
+        def task(uid):
+            for required in TestScheduler.GRAPH[uid]:
+                self.assertIn(required, finished)
+            time.sleep(0.01)
+            with lock:
+                finished.append(uid)
+            return uid
+
+        results = DependencyScheduler(4).run(TestScheduler.GRAPH.keys(), TestScheduler.GRAPH.get, task)
+        self.assertEqual(results.keys(), TestScheduler.GRAPH.keys())
+        self.assertEqual(results.values(), TestScheduler.GRAPH.keys())
+
+    def testConcurrency(self):
+        barrier = threading.Event()
+        active = []
+
+        def task(uid):
+            active.append(uid)
+            if len(active) == 2:
+                barrier.set()
+            return barrier.wait(1.0)
+
+        results = DependencyScheduler(2).run(["core.hdb", "cep.python"], TestScheduler.GRAPH.get, task)
+        self.assertTrue(all(results.values()))
+
+    def testFailureReported(self):
+        def task(uid):
+            if uid == "core.rdb":
+                raise ValueError(uid)
+            return True
+
+        results = DependencyScheduler(2).run(TestScheduler.GRAPH.keys(), TestScheduler.GRAPH.get, task)
+        self.assertIsInstance(results["core.rdb"], ValueError)
+        self.assertTrue(results["cep.cep_7"])
+
+
+class TestProcessSnapshot(unittest.TestCase):
+
+    def testSnapshot(self):
+        processes = osutil.snapshot([os.getpid(), 2 ** 22 + 1])
+        self.assertTrue(processes[os.getpid()].alive)
+        self.assertGreater(processes[os.getpid()].mem_rss, 0)
+        self.assertFalse(processes[2 ** 22 + 1].alive)
+
+    def testComponentReadsSnapshot(self):
+        component = Component("core.hdb", configuration = ComponentConfiguration(("core", "hdb"), silent = True), pid = os.getpid(), executed_cmd = "")
+        component.snapshot = osutil.ProcessInfo(os.getpid(), True, [], 0, None, 1.5, 0.5, 2048, 4096, 1.0, None)
+        self.assertTrue(component.is_alive)
+        self.assertEqual((component.cpu_user, component.cpu_sys, component.mem_rss, component.mem_vms), (1.5, 0.5, 2, 4))
+
+        component.pid = 2 ** 22 + 1  # snapshot is not used for different PID
+        self.assertIsNone(component.snapshot)
+
+
+@unittest.skipUnless(hasattr(osutil, "_linux"), "process information is read from /proc")
+class TestProcReader(unittest.TestCase):
+    """/proc parsing tested against fixture files"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.proc_root, osutil._linux.PROC_ROOT = osutil._linux.PROC_ROOT, self.root
+        self.write("stat", "cpu  1 2 3 4\nbtime 1000\nprocesses 10\n")
+        self.write("meminfo", "MemTotal:       4096 kB\nMemFree:        1024 kB\n")
+
+    def tearDown(self):
+        osutil._linux.PROC_ROOT = self.proc_root
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(content)
+
+    def process(self, pid, comm, state, utime, stime, starttime, cmdline = "", cpus = "0-3"):
+        fields = [state, "1", pid, pid, "0", "-1", "4194304", "0", "0", "0", "0", utime, stime, "0", "0", "20", "0", "1", "0", starttime, "8192"]
+        self.write(os.path.join(pid, "stat"), "{0} ({1}) {2}\n".format(pid, comm, " ".join(fields)))
+        self.write(os.path.join(pid, "statm"), "25 5 2 1 0 3 0\n")
+        self.write(os.path.join(pid, "cmdline"), cmdline)
+        self.write(os.path.join(pid, "status"), "Name:\t{0}\nState:\t{1}\nCpus_allowed:\tf\nCpus_allowed_list:\t{2}\n".format(comm, state, cpus))
+
+    def testReadProcesses(self):
+        ticks, page = osutil._linux.CLOCK_TICKS, osutil._linux.PAGE_SIZE
+        self.process("100", "q) hdb (1", "S", str(3 * ticks), str(ticks), str(50 * ticks), "q\x00hdb.q\x00-p\x005000\x00", "0,2-3")
+        self.process("101", "defunct", "Z", "0", "0", "60")
+
+        processes = osutil._linux.read_processes([100, 101, 102], affinity = True)
+        hdb = processes[100]
+        self.assertEqual((hdb.pid, hdb.alive, hdb.cmdline), (100, True, ["q", "hdb.q", "-p", "5000"]))
+        self.assertEqual((hdb.create_time, hdb.start_time), (1050.0, 50 * ticks))
+        self.assertEqual((hdb.cpu_user, hdb.cpu_sys), (3.0, 1.0))
+        self.assertEqual((hdb.mem_rss, hdb.mem_vms, hdb.mem_percent), (5 * page, 25 * page, 5 * page * 100.0 / (4096 * 1024)))
+        self.assertEqual(hdb.cpu_affinity, [0, 2, 3])
+
+        self.assertEqual((processes[101].alive, processes[101].start_time, processes[101].cmdline), (False, None, []))
+        self.assertEqual(processes[102], osutil.ProcessInfo(102, False, None, None, None, None, None, None, None, None, None))
+        self.assertIsNone(osutil._linux.read_processes([100])[100].cpu_affinity)
+
+    def testStartTime(self):
+        self.process("100", "q) hdb (1", "R", "0", "0", "12345")
+        self.process("101", "defunct", "Z", "0", "0", "60")
+        self.assertEqual(osutil._linux.get_start_time(100), 12345)
+        self.assertIsNone(osutil._linux.get_start_time(101))
+        self.assertIsNone(osutil._linux.get_start_time(102))
+
+
+class TestStatusPersistance(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.status_file = os.path.join(self.tmp, "yak.status")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testMigration(self):
+        conn = sqlite3.connect(self.status_file)
+        conn.execute("CREATE TABLE components(uid VARCHAR PRIMARY KEY, typeid VARCHAR, pid INT, executed_cmd VARCHAR, log VARCHAR, "
+                     "stdout VARCHAR, stderr VARCHAR, stdenv VARCHAR, started TIMESTAMP, started_by VARCHAR, stopped TIMESTAMP, stopped_by VARCHAR)")
+        conn.execute("INSERT INTO components(uid, typeid, pid, executed_cmd) VALUES('core.hdb', 'q', 1, 'q hdb.q')")
+        conn.commit()
+        conn.close()
+
+        component = StatusPersistance(self.status_file).load()["core.hdb"]
+        self.assertIsNone(component.proc_started)
+
+        component.proc_started = 12345
+        component.boot_id = osutil.get_boot_id()
+        component.save_status()
+        self.assertEqual(StatusPersistance(self.status_file).load()["core.hdb"].proc_started, 12345)
+
+    def testProcessIdentity(self):
+        persistance = StatusPersistance(self.status_file)
+        component = Component("core.hdb", pid = os.getpid(), executed_cmd = "q hdb.q", status_persistance = persistance,
+                              proc_started = osutil.get_start_time(os.getpid()), boot_id = osutil.get_boot_id())
+        self.assertTrue(component.is_alive)  # command line differs, start time matches
+
+        component.proc_started -= 1  # pid reused by another process
+        self.assertFalse(component.is_alive)
+        self.assertIsNone(persistance.load()["core.hdb"].pid)
+
+    def testBootTimeDrift(self):
+        persistance = StatusPersistance(self.status_file)
+        get_boot_id = osutil.get_boot_id
+        osutil.get_boot_id = lambda: "1700000001"
+        try:
+            # boot time reported by psutil drifts between calls
+            component = Component("core.hdb", pid = os.getpid(), executed_cmd = "", status_persistance = persistance,
+                                  proc_started = osutil.get_start_time(os.getpid()), boot_id = "1700000000.4")
+            self.assertTrue(component.is_alive)
+
+            component = Component("core.hdb", pid = os.getpid(), executed_cmd = "", status_persistance = persistance,
+                                  proc_started = osutil.get_start_time(os.getpid()), boot_id = "1699990000")
+            self.assertFalse(component.is_alive)
+        finally:
+            osutil.get_boot_id = get_boot_id
+
+    def testPreviousBoot(self):
+        persistance = StatusPersistance(self.status_file)
+        # start time and command line match, but the PID was recorded before reboot
+        component = Component("core.hdb", pid = os.getpid(), executed_cmd = "", status_persistance = persistance,
+                              proc_started = osutil.get_start_time(os.getpid()), boot_id = "previous-boot")
+        self.assertFalse(component.is_alive)
+        self.assertIsNone(persistance.load()["core.hdb"].pid)
+
+        # status saved by older version is verified by command line
+        component = Component("core.hdb", pid = os.getpid(), executed_cmd = "", status_persistance = persistance)
+        self.assertTrue(component.is_alive)
+        component.executed_cmd = "q hdb.q"
+        self.assertFalse(component.is_alive)
+        self.assertEqual(component.pid, os.getpid())
+
+    def testTransaction(self):
+        persistance = StatusPersistance(self.status_file)
+        reader = StatusPersistance(self.status_file)
+        commits = persistance.commits
+
+        with persistance.transaction():
+            for i in xrange(10):
+                persistance.save_status(Component("core.c{0}".format(i), pid = i + 1))
+            persistance.delete_status("core.c0")
+            with persistance.transaction():
+                persistance.save_status(Component("core.c10", pid = 11))
+            self.assertEqual(reader.load(), dict())
+
+        self.assertEqual(sorted(reader.load().keys()), sorted("core.c{0}".format(i) for i in xrange(1, 11)))
+        self.assertEqual(persistance.commits - commits, 1)
+
+    def testTransactionFlushedOnError(self):
+        persistance = StatusPersistance(self.status_file)
+        with self.assertRaises(ValueError):
+            with persistance.transaction():
+                persistance.save_status(Component("core.hdb", pid = 1))
+                raise ValueError()
+        self.assertIn("core.hdb", StatusPersistance(self.status_file).load())
+
+
+
+class TestReload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.status_file = os.path.join(self.tmp, "yak.status")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testIncrementalReload(self):
+        manager = ComponentManager("components/test/sample.cfg", self.status_file)
+        components = dict(manager.components)
+        loads = []
+        load_status = manager._persistance.load_status
+        manager._persistance.load_status = lambda: loads.append(1) or load_status()
+
+        manager.reload()
+        self.assertEqual(loads, [])
+        self.assertTrue(all(manager.components[uid] is components[uid] for uid in components))
+
+        hdb = Component.create_instance("q", "core.hdb", executed_cmd = "q hdb.q", stdout = "hdb.out")
+        StatusPersistance(self.status_file).save_status(hdb)  # status changed by another process
+        manager.reload()
+        self.assertEqual(loads, [1])
+        self.assertTrue(all(manager.components[uid] is components[uid] for uid in components))
+        self.assertEqual(manager.components["core.hdb"].stdout, "hdb.out")
+        self.assertIsNone(manager.components["core.rdb"].stdout)
+
+    def testDetachedRemoved(self):
+        StatusPersistance(self.status_file).save_status(Component("core.old", pid = os.getpid(), executed_cmd = ""))
+        manager = ComponentManager("components/test/sample.cfg", self.status_file)
+        self.assertEqual(manager.dependencies_order[-1], "core.old")
+
+        StatusPersistance(self.status_file).delete_status("core.old")
+        manager.reload()
+        self.assertNotIn("core.old", manager.dependencies_order)
+
+
+
+class TestConfigurationReload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.tmp, "system.cfg")
+        shutil.copy("components/test/sample.cfg", self.config_file)
+        self.manager = ComponentManager(self.config_file, os.path.join(self.tmp, "yak.status"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _modify(self, old, new):
+        with open(self.config_file) as f:
+            content = f.read()
+        with open(self.config_file, "w") as f:
+            f.write(content.replace(old, new))
+
+    def testUnchanged(self):
+        self.assertIsNone(self.manager.reload_configuration())
+        os.utime(self.config_file, (0, 0))
+        self.assertIsNone(self.manager.reload_configuration())
+
+    def testModifiedSections(self):
+        previous = dict(self.manager.configuration)
+        order = self.manager._dependency_order
+        self._modify('command = "q rdb.q"', 'command = "q rdb.q -debug"')
+        self.assertEqual(self.manager.reload_configuration(), ([], [], ["core.rdb"]))
+        self.assertEqual(self.manager.configuration["core.rdb"].command, "q rdb.q -debug")
+        self.assertTrue(all(self.manager.configuration[uid] is previous[uid] for uid in previous if uid != "core.rdb"))
+        self.assertIs(self.manager._dependency_order, order)
+
+        self.manager.reload()
+        self.assertIs(self.manager.components["core.rdb"].configuration, self.manager.configuration["core.rdb"])
+
+    def testAddedRemoved(self):
+        self._modify("[[core.monitor]]", "[[core.monitor2]]")
+        self.assertEqual(self.manager.reload_configuration(), (["core.monitor2"], ["core.monitor"], []))
+        self.assertIn("core.monitor2", self.manager.dependencies_order)
+        self.manager.reload()
+        self.assertNotIn("core.monitor", self.manager.components)
+
+    def testInvalid(self):
+        previous = self.manager.configuration
+        self._modify("requires = core.hdb\n", "requires = core.missing\n")
+        with self.assertRaises(DependencyError):
+            self.manager.reload_configuration()
+        self.assertIs(self.manager.configuration, previous)
+        self.assertIsNone(self.manager.reload_configuration())  # reported once
+
+
+
+class TestChangedComponents(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.manager = ComponentManager("components/test/sample.cfg", os.path.join(self.tmp, "yak.status"))
+        for uid in self.manager.dependencies_order:  # all components running with the current configuration
+            component = self.manager.components[uid]
+            component.pid = os.getpid()
+            component.proc_started = osutil.get_start_time(os.getpid())
+            component.boot_id = osutil.get_boot_id()
+            component.fingerprint = self.manager.configuration[uid].fingerprint
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testUpToDate(self):
+        self.assertEqual(self.manager.changed(self.manager.dependencies_order), ([], []))
+
+    def testDependentsRestarted(self):
+        self.manager.configuration["core.rdb"].command_args = "-debug"
+        modified, restarted = self.manager.changed(self.manager.dependencies_order)
+        self.assertEqual(modified, ["core.rdb"])
+        self.assertEqual(restarted[0], "core.rdb")
+        self.assertEqual(restarted, [uid for uid in self.manager.dependencies_order if uid in restarted])
+        self.assertTrue(set(uid for uid in self.manager.dependencies_order if "core.rdb" in self.manager.configuration[uid].requires) <= set(restarted))
+        self.assertNotIn("core.hdb", restarted)
+
+        self.manager.components[restarted[-1]].pid = None  # stopped dependents are not started
+        self.assertNotIn(restarted[-1], self.manager.changed(self.manager.dependencies_order)[1])
+
+    def testFingerprint(self):
+        configuration = self.manager.configuration["core.hdb"]
+        fingerprint = configuration.fingerprint
+        configuration.start_wait = 10
+        self.assertEqual(configuration.fingerprint, fingerprint)
+        configuration.env["EC_NEW"] = "1"
+        self.assertNotEqual(configuration.fingerprint, fingerprint)
+
+    def testMissingFingerprint(self):
+        hdb = self.manager.components["core.hdb"]
+        hdb.fingerprint = None
+        hdb.executed_cmd = self.manager.configuration["core.hdb"].full_cmd
+        self.assertEqual(self.manager.changed(["core.hdb"])[0], [])
+        hdb.executed_cmd = "q hdb.q"
+        self.assertEqual(self.manager.changed(["core.hdb"])[0], ["core.hdb"])
+
+
+
+class TestLifecycle(unittest.TestCase):
+    """Start and stop of real processes"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.status_file = os.path.join(self.tmp, "yak.status")
+        self.manager = None
+
+    def tearDown(self):
+        for component in self.manager.components.itervalues() if self.manager else []:
+            if component.is_alive:
+                component.terminate(force = True)
+        shutil.rmtree(self.tmp)
+
+    def create_manager(self, components, **settings):
+        """Creates manager of cmd components: list of (component id, command, requires[, component settings])"""
+        with open(os.path.join(self.tmp, "stubborn.sh"), "w") as f:
+            f.write("trap '' TERM\nwhile true; do sleep 0.05; done\n")
+        with open(os.path.join(self.tmp, "system.cfg"), "w") as f:
+            f.write("[group:core]\n")
+            for key, value in dict(dict(binPath = self.tmp, dataPath = self.tmp, logPath = self.tmp, startWait = 0.1, stopWait = 0.5),
+                                   **settings).iteritems():
+                f.write("{0} = {1}\n".format(key, value))
+            for component in components:
+                uid, command, requires = component[:3]
+                f.write("  [[{0}]]\n  type = cmd\n  command = {1}\n".format(uid, command))
+                if requires:
+                    f.write("  requires = {0}\n".format(requires))
+                for key, value in (component[3] if len(component) > 3 else {}).iteritems():
+                    f.write("  {0} = {1}\n".format(key, value))
+        self.manager = ComponentManager(os.path.join(self.tmp, "system.cfg"), self.status_file)
+        return self.manager
+
+    def record_signals(self, manager):
+        """Records identifiers of signalled components and whether their dependents were still running"""
+        signals = []
+        for uid, component in manager.components.iteritems():
+            dependents = [other for other in manager.components.values() if uid in manager.configuration[other.uid].requires]
+            def terminate(force = False, uid = uid, component = component, dependents = dependents, terminate = component.terminate):
+                if not force:
+                    signals.append((uid, [d.uid for d in dependents if osutil.is_alive(d._process.pid)]))
+                terminate(force)
+            component.terminate = terminate
+        return signals
+
+    def testParallelStart(self):
+        with open(os.path.join(self.tmp, "started.sh"), "w") as f:
+            f.write("ls | grep '^started' > seen.$1\ntouch started.$1\nexec sleep 30\n")
+        graph = [("core.a", None), ("core.b", "core.a"), ("core.c", "core.a"), ("core.d", "core.b, core.c"), ("core.e", None)]
+        # component is ready once it has recorded components started before it
+        manager = self.create_manager([(uid, "sh started.sh " + uid, requires, dict(readyCheck = "file:" + os.path.join(self.tmp, "started." + uid)))
+                                       for uid, requires in graph], startWait = 5)
+        self.assertEqual(sorted(manager.start(manager.dependencies_order, jobs = 3)), [(uid, True) for uid, _ in graph])
+
+        for uid, _ in graph:
+            with open(os.path.join(self.tmp, "seen." + uid)) as f:
+                seen = set(line.strip()[len("started."):] for line in f)
+            self.assertTrue(manager.configuration[uid].requires.issubset(seen), "{0} started before {1}".format(uid, manager.configuration[uid].requires))
+
+    def testStopWaitEscalation(self):
+        manager = self.create_manager([("core.stubborn", "sh stubborn.sh", None, dict(stopWait = 0.3)),
+                                       ("core.slow", "sh stubborn.sh", None, dict(stopWait = 1.5)),
+                                       ("core.plain", "sleep 30", None)])
+        self.assertTrue(all(s is True for _, s in manager.start(manager.dependencies_order)))
+        processes = dict((uid, manager.components[uid]._process) for uid in manager.dependencies_order)
+        killed = dict()
+        def kill(uid, pid, kill = manager._kill):
+            killed[uid] = time.time()
+            kill(uid, pid)
+        manager._kill = kill
+
+        started = time.time()
+        status = manager.stop(manager.dependencies_order)
+        self.assertTrue(all(s is True for _, s in status), status)
+        self.assertEqual(sorted(killed), ["core.slow", "core.stubborn"])
+
+        # every process has its own deadline: stopWait of its component
+        self.assertTrue(0.3 <= killed["core.stubborn"] - started < 1.0, killed["core.stubborn"] - started)
+        self.assertTrue(1.5 <= killed["core.slow"] - started < 2.5, killed["core.slow"] - started)
+        self.assertEqual(processes["core.stubborn"].wait(), -signal.SIGKILL)
+        self.assertEqual(processes["core.slow"].wait(), -signal.SIGKILL)
+        self.assertEqual(processes["core.plain"].wait(), -signal.SIGTERM)
+        self.assertTrue(all(manager.components[uid].pid is None for uid in processes))
+
+    def testStopOrder(self):
+        components = [("core.a", "sleep 30", None), ("core.b", "sleep 30", "core.a"), ("core.c", "sh stubborn.sh", "core.b"),
+                      ("core.d", "sleep 30", "core.a")]
+        for jobs in (None, 4):
+            manager = self.create_manager(components, stopWait = 0.3)
+            self.assertTrue(all(s is True for _, s in manager.start(manager.dependencies_order)))
+            signals = self.record_signals(manager)
+            status = manager.stop(list(reversed(manager.dependencies_order)), jobs = jobs)
+            self.assertTrue(all(s is True for _, s in status), status)
+
+            order = [uid for uid, _ in signals]
+            self.assertEqual(sorted(order), ["core.a", "core.b", "core.c", "core.d"])
+            for dependent, required in (("core.b", "core.a"), ("core.c", "core.b"), ("core.d", "core.a")):
+                self.assertLess(order.index(dependent), order.index(required))
+            if jobs:  # component is signalled after its dependents have exited, stubborn core.c is killed first
+                self.assertEqual(signals[-1], ("core.a", []))
+                self.assertEqual(dict(signals)["core.b"], [])
+
+    def testStatusWrittenBeforeWait(self):
+        manager = self.create_manager([("core.a", "sleep 30", None)], startWait = 0.2)
+        saved = []
+        # process is recorded in the status file while yak is still waiting for startup
+        pause = lambda wait: saved.append(StatusPersistance(self.status_file).load_status()["core.a"]["pid"])
+        self.assertEqual(manager.start(["core.a"], pause_callback = pause), [("core.a", True)])
+        self.assertEqual(saved, [manager.components["core.a"].pid])
+
+    def testPhaseTransactions(self):
+        manager = self.create_manager([("core.a", "sleep 30", None), ("core.b", "sleep 30", None), ("core.c", "sleep 30", "core.a"),
+                                       ("core.d", "sleep 30", None)], startWait = 0.1)
+        persistance = manager._persistance
+        order = manager.dependencies_order
+        saved = []
+        pause = lambda wait: saved.append(sorted(uid for uid, row in StatusPersistance(self.status_file).load_status().iteritems() if row["pid"]))
+
+        commits = persistance.commits
+        self.assertTrue(all(s is True for _, s in manager.start(order, pause_callback = pause)))
+        # one transaction per batch, committed before the batch is verified
+        self.assertEqual(persistance.commits - commits, len(saved))
+        self.assertEqual(saved[-1], ["core.a", "core.b", "core.c", "core.d"])
+        self.assertLess(len(saved), len(order))
+
+        commits = persistance.commits
+        self.assertTrue(all(s is True for _, s in manager.stop(list(reversed(order)))))
+        self.assertEqual(persistance.commits - commits, 1)
+        self.assertEqual([row["pid"] for row in StatusPersistance(self.status_file).load_status().itervalues()], [None] * 4)
+
+    def testHealthCheckSkipped(self):
+        manager = self.create_manager([("core.a", "sleep 30", None)])
+        manager.components["core.q"] = create_component("core.q", self.tmp, type = "q:rdb", command = "q rdb.q", port = "5000")
+        pools = []
+        thread_pool = manager_module.ThreadPool
+        manager_module.ThreadPool = lambda size: pools.append(size)
+        try:
+            # components without ipcCheck (including q components) are not verified, no pool is created for them
+            manager.check_health(["core.a", "core.q"])
+        finally:
+            manager_module.ThreadPool = thread_pool
+        self.assertEqual(pools, [])
+
+    def testDrainingStop(self):
+        manager = self.create_manager([("core.a", "sleep 30", None), ("core.b", "sleep 30", "core.a"), ("core.c", "sleep 30", None)])
+        manager.start(manager.dependencies_order)
+        events = DrainingComponent.events = []
+        for uid in ("core.b", "core.c"):
+            manager.components[uid].__class__ = DrainingComponent
+        terminate = manager.components["core.a"].terminate
+        manager.components["core.a"].terminate = lambda force = False: events.append(("signal", "core.a")) or terminate(force)
+
+        status = manager.stop(list(reversed(manager.dependencies_order)))
+        self.assertTrue(all(s is True for _, s in status), status)
+        # drains overlap
+        self.assertEqual(sorted(events[:2]), [("drain", "core.b"), ("drain", "core.c")])
+        # required component is signalled after its dependent has drained
+        self.assertLess(events.index(("drained", "core.b")), events.index(("signal", "core.a")))
+
+
+
+class DrainingComponent(Component):
+    """Component blocking in terminate as q components shut down via IPC do"""
+
+    events = []
+
+    @property
+    def drains(self):
+        return True
+
+    def terminate(self, force = False):
+        self.events.append(("drain", self.uid))
+        time.sleep(0.3)
+        self.events.append(("drained", self.uid))
+        super(DrainingComponent, self).terminate(force)
+
+
+class TestConfigurationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.tmp, "system.cfg")
+        self.status_file = os.path.join(self.tmp, "yak.status")
+        shutil.copy("components/test/sample.cfg", self.config_file)
+        self.loads = []
+        self.load_configuration = ComponentConfiguration.load_configuration
+        ComponentConfiguration.load_configuration = staticmethod(lambda filename, lazy = False, sections = None: self.loads.append(filename) or self.load_configuration(filename, lazy, sections))
+
+    def tearDown(self):
+        ComponentConfiguration.load_configuration = staticmethod(self.load_configuration)
+        os.environ["LOG_ROOT"] = "_log_"
+        shutil.rmtree(self.tmp)
+
+    def testCachedConfiguration(self):
+        parsed = ComponentManager(self.config_file, self.status_file)
+        cached = ComponentManager(self.config_file, self.status_file)
+        self.assertEqual(len(self.loads), 1)
+        self.assertEqual(cached.configuration, parsed.configuration)
+        self.assertEqual(cached.groups, parsed.groups)
+        self.assertEqual(cached.namespaces, parsed.namespaces)
+        self.assertEqual(cached.dependencies_order, parsed.dependencies_order)
+
+    def testInvalidation(self):
+        ComponentManager(self.config_file, self.status_file)
+
+        os.environ["LOG_ROOT"] = "_logs_"
+        manager = ComponentManager(self.config_file, self.status_file)
+        self.assertEqual(len(self.loads), 2)
+        self.assertEqual(manager.configuration["core.hdb"].log_path, "_logs_/hdb")
+
+        with open(self.config_file, "a") as f:
+            f.write("\n")
+        ComponentManager(self.config_file, self.status_file)
+        self.assertEqual(len(self.loads), 3)
+
+        with open(self.status_file + ".cfgcache", "wb") as f:
+            f.write("corrupted")
+        ComponentManager(self.config_file, self.status_file)
+        self.assertEqual(len(self.loads), 4)
+
+    def testUntrustedCache(self):
+        ComponentManager(self.config_file, self.status_file)
+        cache_file = self.status_file + ".cfgcache"
+        self.assertEqual(os.stat(cache_file).st_mode & 0777, 0600)
+
+        os.chmod(cache_file, 0666)  # writable by other users
+        ComponentManager(self.config_file, self.status_file)
+        self.assertEqual(len(self.loads), 2)
+        self.assertEqual(os.stat(cache_file).st_mode & 0777, 0600)  # replaced by the rebuilt cache
+
+        if os.getuid() == 0:
+            os.chown(cache_file, 65534, -1)  # owned by other user
+            ComponentManager(self.config_file, self.status_file)
+            self.assertEqual(len(self.loads), 3)
+
+    def testLazyConfiguration(self):
+        manager = ComponentManager(self.config_file, self.status_file, lazy = True)
+        ComponentManager(self.config_file, self.status_file, lazy = True)
+        self.assertEqual(len(self.loads), 2)  # lazy configuration is not cached
+
+        configuration = manager.configuration["core.hdb"]
+        self.assertIsInstance(configuration, LazyConfiguration)
+        self.assertEqual(manager.dependencies_order, ["core.hdb", "cep.python", "core.rdb", "core.monitor", "cep.cep_7"])
+        self.assertFalse(any(c.parsed for c in manager.configuration.values()))
+
+        for a in configuration.attrs:
+            self.assertEqual(getattr(configuration, a), getattr(TestConfiguration.REF_CFG["core.hdb"], a))
+        self.assertTrue(configuration.parsed)
+        self.assertEqual([c.parsed for c in manager.configuration.values()], [True, False, False, False, False])
+
+    def testLazyConfigurationCheck(self):
+        with open(self.config_file, "a") as f:
+            f.write("[group:bad]\n   [[bad.cmd]]\n   type = cmd\n   command = run $UNDEFINED_VARIABLE\n")
+
+        with self.assertRaises(ConfigurationError):
+            ComponentManager(self.config_file, self.status_file)
+
+        manager = ComponentManager(self.config_file, self.status_file, lazy = True)
+        status = dict(manager.check(manager.dependencies_order))
+        self.assertIsInstance(status.pop("bad.cmd"), ConfigurationError)
+        self.assertTrue(all(s is True for s in status.values()))
+
+    def testCompletionCache(self):
+        cache = CompletionCache(self.status_file + ".completion")
+        self.assertIsNone(cache.digest())
+        manager = ComponentManager(self.config_file, self.status_file)
+        cache.store(manager.config_digest, ["core"] + manager.dependencies_order)
+        with open(cache.cache_file) as f:
+            self.assertEqual(f.read().splitlines(), ["# " + manager.config_digest, "core"] + manager.dependencies_order)
+
+        mtime = int(os.path.getmtime(cache.cache_file))
+        os.utime(cache.cache_file, (mtime - 10, mtime - 10))
+        cache.store(manager.config_digest, ["core"])  # not rewritten for the same configuration
+        self.assertEqual(int(os.path.getmtime(cache.cache_file)), mtime - 10)
+        cache.store("changed", ["core"])
+        self.assertEqual(cache.digest(), "changed")
+
+        # header identifies the configuration file, verified by the completion script
+        cache = CompletionCache(self.status_file + ".completion", self.config_file)
+        cache.store(manager.config_digest, ["core"])
+        with open(cache.cache_file) as f:
+            self.assertEqual(f.readline(), "# {0} {1}\n".format(manager.config_digest, os.path.abspath(self.config_file)))
+        self.assertEqual(cache.digest(), manager.config_digest)
+
+
+
+class TestPlacement(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.node_root = osutil._linux.NODE_ROOT if hasattr(osutil, "_linux") else None
+
+    def tearDown(self):
+        if self.node_root:
+            osutil._linux.NODE_ROOT = self.node_root
+        shutil.rmtree(self.tmp)
+
+    def component(self, **settings):
+        with open(os.path.join(self.tmp, "placed.sh"), "w") as f:
+            f.write("grep Cpus_allowed_list /proc/self/status\nhead -1 /proc/self/numa_maps\n")
+        settings.setdefault("command", "sh placed.sh")
+        return create_component("core.placed", self.tmp, **settings)
+
+    def topology(self, nodes):
+        osutil._linux.NODE_ROOT = os.path.join(self.tmp, "node")
+        for node, cpus in nodes.iteritems():
+            os.makedirs(os.path.join(self.tmp, "node", "node{0}".format(node)))
+            with open(os.path.join(self.tmp, "node", "node{0}".format(node), "cpulist"), "w") as f:
+                f.write(cpus + "\n")
+
+    def testConfiguration(self):
+        component = self.component(numaNode = "1")
+        self.assertEqual(component.configuration.numa_node, [1])
+        self.assertEqual(component.configuration.mem_policy, "bind")
+        self.assertEqual(self.component(memPolicy = "Interleave").configuration.mem_policy, "interleave")
+        self.assertRaises(ConfigurationError, self.component, memPolicy = "nearest")
+
+        # fingerprints of components without memory binding are not affected
+        unbound = self.component().configuration
+        self.assertEqual(unbound.fingerprint, self.component(memPolicy = "").configuration.fingerprint)
+        self.assertNotEqual(unbound.fingerprint, component.configuration.fingerprint)
+
+    @unittest.skipUnless(hasattr(osutil, "_linux"), "NUMA topology is read from sysfs")
+    def testValidation(self):
+        self.topology({0: "0-3", 1: "4-7"})
+        self.assertEqual(self.component(cpuAffinity = ["4", "5"], memPolicy = "bind")._placement(), ([4, 5], [1], "bind"))
+        self.assertEqual(self.component(cpuAffinity = ["0", "4"], memPolicy = "interleave")._placement(), ([0, 4], [0, 1], "interleave"))
+        self.assertEqual(self.component(numaNode = "0")._placement(), ([], [0], "bind"))
+        self.assertEqual(self.component(cpuAffinity = "1")._placement(), ([1], None, None))
+
+        for settings in (dict(numaNode = "2"), dict(numaNode = "0", cpuAffinity = ["3", "4"]), dict(memPolicy = "bind")):
+            self.assertRaises(ComponentError, self.component(**settings)._placement)
+
+        osutil._linux.NODE_ROOT = os.path.join(self.tmp, "missing")
+        self.assertRaises(ComponentError, self.component(numaNode = "0")._placement)
+
+    @unittest.skipUnless(osutil.get_numa_nodes(), "NUMA topology is not available")
+    def testChildPlacement(self):
+        node, cpus = sorted(osutil.get_numa_nodes().items())[0]
+        affinity = osutil.get_affinity(os.getpid())
+        component = self.component(cpuAffinity = str(cpus[-1]), numaNode = str(node))
+        component.initialize()
+        component.execute()
+        component.check_process()
+        self.assertEqual(osutil.get_affinity(os.getpid()), affinity)
+
+        with open(component.stdout) as f:
+            output = f.read().splitlines()
+        self.assertEqual(output[0].split(), ["Cpus_allowed_list:", str(cpus[-1])])
+        self.assertIn(" bind:{0} ".format(node), output[1])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,156 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import osutil
+
+from components.component import ConfigurationError
+from components.manager import ComponentManager, TOPOLOGY_ENV
+from components.planner import CpuPlanner, CpuTopology, PlanError
+from components.testutils import create_configuration
+from osutil._common import format_cpu_list, parse_cpu_list
+
+
+# 2 sockets/nodes, 4 cores each, SMT siblings: cpu and cpu + 8
+TOPOLOGY = "# CPU,Socket,Core,Node\n" + "".join("{0},{1},{2},{1}\n".format(cpu, cpu % 8 // 4, cpu % 8) for cpu in range(16))
+
+
+
+class TestPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.topology_file = os.path.join(self.tmp, "topology.csv")
+        with open(self.topology_file, "w") as f:
+            f.write(TOPOLOGY)
+        self.planner = CpuPlanner(CpuTopology.from_file(self.topology_file))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testTopology(self):
+        topology = self.planner.topology
+        self.assertEqual(str(topology), "2 socket(s), 8 core(s), 16 cpu(s), 2 NUMA node(s)")
+        self.assertEqual(topology.cores[(1, 5)], [5, 13])
+        self.assertEqual(topology.nodes[(1, 5)], 1)
+        self.assertEqual(topology.core_of(12), (1, 4))
+
+        with open(self.topology_file, "w") as f:
+            f.write("0,0,x,0\n")
+        self.assertRaises(PlanError, CpuTopology.from_file, self.topology_file)
+
+    def testSysfs(self):
+        root = os.path.join(self.tmp, "system")
+        for cpu in range(4):
+            os.makedirs(os.path.join(root, "cpu", "cpu{0}".format(cpu), "topology"))
+            for name, value in (("physical_package_id", 0), ("core_id", cpu % 2)):
+                with open(os.path.join(root, "cpu", "cpu{0}".format(cpu), "topology", name), "w") as f:
+                    f.write("{0}\n".format(value))
+        with open(os.path.join(root, "cpu", "online"), "w") as f:
+            f.write("0-3\n")
+        os.makedirs(os.path.join(root, "node", "node0"))
+        with open(os.path.join(root, "node", "node0", "cpulist"), "w") as f:
+            f.write("0-3\n")
+
+        topology = CpuTopology.from_sysfs(root)
+        self.assertEqual(topology.cores.items(), [((0, 0), [0, 2]), ((0, 1), [1, 3])])
+        self.assertRaises(PlanError, CpuTopology.from_sysfs, os.path.join(self.tmp, "missing"))
+
+    def testPlan(self):
+        plan = self.planner.plan([create_configuration("core.gw", cpuAffinity = ["0", "1"]),
+                                  create_configuration("core.tick", cpuCores = "1"),
+                                  create_configuration("core.rdb", cpuCores = "2", requires = "core.tick"),
+                                  create_configuration("core.hdb", cpuCores = "auto"),
+                                  create_configuration("core.mon", cpuAffinity = ["9"]),
+                                  create_configuration("core.idle")])
+
+        self.assertEqual(plan.keys(), ["core.gw", "core.tick", "core.rdb", "core.hdb", "core.mon"])
+        self.assertEqual(plan["core.gw"].cpus, [0, 1])
+        self.assertFalse(plan["core.gw"].planned)
+        self.assertEqual(plan["core.gw"].shared, ["core.mon"])  # cpu 9 is SMT sibling of cpu 1
+        # tickerplant and rdb are co-located on node with enough free cores
+        self.assertEqual(plan["core.tick"].cpus, [4, 12])
+        self.assertEqual(plan["core.rdb"].cpus, [5, 6, 13, 14])
+        self.assertEqual(plan["core.tick"].nodes + plan["core.rdb"].nodes, [1, 1])
+        # remaining 3 cores are left to auto
+        self.assertEqual(plan["core.hdb"].cores, [(0, 2), (0, 3), (1, 7)])
+        self.assertTrue(all(plan[uid].planned and not plan[uid].shared for uid in ("core.tick", "core.rdb", "core.hdb")))
+
+    def testAutoCores(self):
+        plan = self.planner.plan([create_configuration("core.tick", cpuCores = "1"),
+                                  create_configuration("core.rdb", cpuCores = "auto"),
+                                  create_configuration("core.hdb", cpuCores = "auto"),
+                                  create_configuration("core.gw", cpuCores = "auto")])
+        # 7 remaining cores are divided, none is left unused
+        self.assertEqual([len(plan[uid].cores) for uid in ("core.rdb", "core.hdb", "core.gw")], [3, 2, 2])
+        self.assertEqual(len(set(core for allocation in plan.values() for core in allocation.cores)), 8)
+
+    def testInsufficientCores(self):
+        self.assertRaises(PlanError, self.planner.plan, [create_configuration("core.rdb", cpuCores = "9")])
+        self.assertRaises(PlanError, self.planner.plan, [create_configuration("core.rdb", cpuCores = "8"),
+                                                         create_configuration("core.hdb", cpuCores = "auto")])
+        self.assertRaises(ConfigurationError, create_configuration, "core.rdb", cpuCores = "many")
+
+    def testCpuList(self):
+        self.assertEqual(parse_cpu_list("0-3,8,10-11\n"), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(format_cpu_list([11, 0, 1, 2, 3, 8, 10]), "0-3,8,10-11")
+        self.assertEqual(format_cpu_list([]), "")
+
+    def testManager(self):
+        with open(os.path.join(self.tmp, "system.cfg"), "w") as f:
+            f.write("[group:core]\n  command = sleep 60\n  [[core.tick]]\n  type = cmd\n  cpuCores = 2\n"
+                    "  [[core.rdb]]\n  type = cmd\n  requires = core.tick\n")
+        os.environ[TOPOLOGY_ENV] = self.topology_file
+        try:
+            manager = ComponentManager(os.path.join(self.tmp, "system.cfg"), os.path.join(self.tmp, "yak.status"))
+            unplanned = manager.configuration["core.tick"].fingerprint
+            manager.assign_cores(["core.rdb"])
+            self.assertIsNone(manager.configuration["core.tick"].planned_affinity)
+
+            manager.assign_cores(["core.tick"])
+            self.assertEqual(manager.configuration["core.tick"].planned_affinity, [0, 1, 8, 9])
+            self.assertNotEqual(manager.configuration["core.tick"].fingerprint, unplanned)
+            topology, plan = manager.cpu_plan()
+            self.assertEqual(plan.keys(), ["core.tick"])
+        finally:
+            del os.environ[TOPOLOGY_ENV]
+
+    def testHostTopology(self):
+        try:
+            host = CpuTopology.from_sysfs()
+        except PlanError:
+            self.skipTest("cpu topology is not available")
+        with open(os.path.join(self.tmp, "system.cfg"), "w") as f:
+            f.write("[group:core]\n  [[core.tick]]\n  type = cmd\n  command = sleep 60\n  cpuCores = 1\n")
+        manager = ComponentManager(os.path.join(self.tmp, "system.cfg"), os.path.join(self.tmp, "yak.status"))
+
+        # affinity of yak (e.g. started with taskset) does not limit the plan
+        get_affinity, osutil.get_affinity = osutil.get_affinity, lambda pid: [len(host.cpus) + 1]
+        try:
+            topology, plan = manager.cpu_plan()
+        finally:
+            osutil.get_affinity = get_affinity
+        self.assertEqual(topology.cpus, host.cpus)
+        self.assertEqual(len(plan["core.tick"].cores), 1)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
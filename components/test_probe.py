@@ -0,0 +1,126 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from components.component import Component, ComponentError, ConfigurationError
+from components.probe import FileProbe, OutputProbe, PortProbe, ProbeError, create_probe
+from components.q import QComponentConfiguration
+
+
+
+class StubConfiguration(object):
+    def __init__(self, **kwargs):
+        self.port = None
+        self.start_wait = 1
+        self.ready_check = None
+        self.__dict__.update(kwargs)
+
+
+
+class TestProbes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testCreateProbe(self):
+        self.assertIsInstance(create_probe("port"), PortProbe)
+        self.assertEqual(create_probe("port:5010").port, 5010)
+        self.assertIsInstance(create_probe("stdout:^ready, set$"), OutputProbe)
+        self.assertIsInstance(create_probe("log:ready"), OutputProbe)
+        self.assertEqual(create_probe("file:/tmp/ready").path, "/tmp/ready")
+
+        for spec in ["tcp", "port:abc", "stdout:", "log:(", "file:"]:
+            with self.assertRaises(ProbeError):
+                create_probe(spec)
+
+    def testPortProbe(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("localhost", 0))
+        port = listener.getsockname()[1]
+
+        component = Component("core.hdb", configuration = StubConfiguration(port = -port))
+        probe = create_probe("port")
+        self.assertFalse(probe.is_ready(component))
+
+        listener.listen(1)
+        try:
+            self.assertTrue(probe.is_ready(component))
+        finally:
+            listener.close()
+
+    def testPortProbeWithoutPort(self):
+        with self.assertRaises(ProbeError):
+            create_probe("port").is_ready(Component("core.hdb", configuration = StubConfiguration()))
+
+    def testOutputProbe(self):
+        component = Component("core.hdb", configuration = StubConfiguration(), stdout = os.path.join(self.tmp, "hdb.out"))
+        probe = create_probe("stdout:^ready on \d+$")
+        self.assertFalse(probe.is_ready(component))
+
+        with open(component.stdout, "w") as f:
+            f.write("loading\nready on ")
+        self.assertFalse(probe.is_ready(component))
+
+        with open(component.stdout, "a") as f:
+            f.write("5010\n")
+        self.assertTrue(probe.is_ready(component))
+
+    def testFileProbe(self):
+        path = os.path.join(self.tmp, "ready")
+        probe = FileProbe(path)
+        self.assertFalse(probe.is_ready(None))
+        open(path, "w").close()
+        self.assertTrue(probe.is_ready(None))
+
+    def testWaitReady(self):
+        path = os.path.join(self.tmp, "ready")
+        component = Component("core.hdb", configuration = StubConfiguration(start_wait = 5, ready_check = "file:" + path))
+        open(path, "w").close()
+
+        started = time.time()
+        component.wait_ready()
+        self.assertLess(time.time() - started, 1)
+
+    def testWaitReadyTimeout(self):
+        component = Component("core.hdb", configuration = StubConfiguration(start_wait = 0.2, ready_check = "file:" + os.path.join(self.tmp, "ready")))
+        with self.assertRaises(ComponentError):
+            component.wait_ready()
+
+    def testConfiguration(self):
+        cfg = ({"type": "q:hdb", "command": "q hdb.q", "port": "5010", "readyCheck": "port"}, {}, {})
+        self.assertEqual(QComponentConfiguration.create_instance("q", ("core", "hdb"), cfg).ready_check, "port")
+
+        cfg[0]["readyCheck"] = "socket"
+        with self.assertRaises(ConfigurationError):
+            QComponentConfiguration.create_instance("q", ("core", "hdb"), cfg)
+
+        cfg[0].update(readyCheck = "port", startWait = "0")
+        with self.assertRaises(ConfigurationError):
+            QComponentConfiguration.create_instance("q", ("core", "hdb"), cfg)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import unittest
+
+from components.component import Status
+from components.q import QComponent, QComponentConfiguration, QConnection, QConnectionError
+from components.testutils import create_component
+
+
+
+class FakeQProcess(object):
+    """Stand-in for q process: accepts IPC handshake and answers queries."""
+
+    def __init__(self, credentials = "user:pass", response = struct.pack("<bq", -7, 1), on_message = None):
+        self.credentials = credentials
+        self.response = response
+        self.on_message = on_message
+        self.received = []
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(("localhost", 0))
+        self._listener.listen(5)
+        self.port = self._listener.getsockname()[1]
+        self._thread = threading.Thread(target = self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except socket.error:
+                return
+
+            handshake = ""
+            while not handshake.endswith("\0"):
+                handshake += conn.recv(1)
+            if handshake[:-2] != self.credentials:
+                conn.close()
+                continue
+            conn.sendall(handshake[-2])
+
+            while True:
+                header = conn.recv(8)
+                if len(header) < 8:
+                    break
+                size = struct.unpack("<i", header[4:])[0]
+                body = ""
+                while len(body) < size - 8:
+                    body += conn.recv(size - 8 - len(body))
+                self.received.append((ord(header[1]), body[6:]))
+                if self.on_message:
+                    self.on_message(body[6:])
+                if ord(header[1]) == QConnection.SYNC:
+                    conn.sendall(struct.pack("<bbhi", 1, 2, 0, 8 + len(self.response)) + self.response)
+            conn.close()
+
+    def close(self):
+        self._listener.close()
+
+
+
+class TestQConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.q = FakeQProcess()
+
+    def tearDown(self):
+        self.q.close()
+
+    def testQuery(self):
+        with QConnection("localhost", self.q.port, "user", "pass", 1.0) as q:
+            self.assertEqual(q.query("1"), struct.pack("<bq", -7, 1))
+            q.send("exit 0")
+        self.assertEqual(self.q.received[0], (QConnection.SYNC, "1"))
+
+    def testHandshakeRejected(self):
+        connection = QConnection("localhost", self.q.port, "user", "wrong", 1.0)
+        with self.assertRaises(QConnectionError):
+            connection.open()
+        self.assertIsNone(connection._socket)
+
+    def testQueryError(self):
+        self.q.response = struct.pack("b", -128) + "type\0"
+        with QConnection("localhost", self.q.port, "user", "pass", 1.0) as q:
+            with self.assertRaises(QConnectionError):
+                q.query("1+`a")
+
+    def testHealthCheck(self):
+        cfg = ({"type": "q:rdb", "command": "q rdb.q", "port": str(self.q.port), "kdbUser": "user", "kdbPassword": "pass",
+                "ipcCheck": "True", "ipcQuery": "::", "silent": "True"}, {}, {})
+        component = QComponent("core.rdb", configuration = QComponentConfiguration.create_instance("q", ("core", "rdb"), cfg),
+                               pid = os.getpid(), executed_cmd = "", started = True)
+        component.check_health()
+        self.assertEqual(component.status, Status.RESPONSIVE)
+        self.assertGreater(component.ipc_latency, 0)
+
+        component.configuration.kdb_password = "wrong"
+        component.check_health()
+        self.assertEqual(component.status, Status.UNRESPONSIVE)
+        self.assertIsNone(component.ipc_latency)
+
+
+    def testGracefulShutdown(self):
+        process = subprocess.Popen(["sleep", "30"])
+        self.q.on_message = lambda expression: process.kill() if expression == "exit 0" else None
+        cfg = ({"type": "q:rdb", "command": "q rdb.q", "port": str(self.q.port), "kdbUser": "user", "kdbPassword": "pass",
+                "ipcShutdown": "True", "drainTimeout": "5"}, {}, {})
+        component = QComponent("core.rdb", configuration = QComponentConfiguration.create_instance("q", ("core", "rdb"), cfg),
+                               pid = process.pid, executed_cmd = "")
+        try:
+            component.terminate()
+            self.assertEqual(self.q.received, [(QConnection.ASYNC, "exit 0")])
+            self.assertIsNone(component.pid)
+            self.assertIsNotNone(component.stopped)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+    def testShutdownFallback(self):
+        process = subprocess.Popen(["sleep", "30"])
+        cfg = ({"type": "q:rdb", "command": "q rdb.q", "port": str(self.q.port), "kdbUser": "user", "kdbPassword": "pass",
+                "ipcShutdown": "True", "drainTimeout": "0.2"}, {}, {})
+        component = QComponent("core.rdb", configuration = QComponentConfiguration.create_instance("q", ("core", "rdb"), cfg),
+                               pid = process.pid, executed_cmd = "")
+        component.terminate()
+        self.assertEqual(process.wait(), -15)
+
+
+
+class TestQLaunch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        for version in ("q1", "q2"):
+            os.mkdir(os.path.join(self.tmp, version))
+            with open(os.path.join(self.tmp, version, "q"), "w") as f:
+                f.write("#!/bin/sh\necho $0 $PATH\n")
+            os.chmod(os.path.join(self.tmp, version, "q"), 0755)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def component(self, uid, q_path):
+        return create_component(uid, self.tmp, type = "q:rdb", command = "q rdb.q", qPath = os.path.join(self.tmp, q_path),
+                                logPath = os.path.join(self.tmp, "log"))
+
+    def testExecute(self):
+        path = os.environ.get("PATH")
+        components = [self.component("core.q1", "q1"), self.component("core.q2", "q2")]
+        threads = []
+        for component in components:
+            component.initialize()
+            threads.append(threading.Thread(target = component.execute))
+            threads[-1].start()
+        for thread, component in zip(threads, components):
+            thread.join()
+            component.check_process()
+        self.assertEqual(os.environ.get("PATH"), path)
+
+        for version, component in zip(("q1", "q2"), components):
+            with open(component.stdout) as f:
+                executable, child_path = f.read().split()
+            self.assertEqual(executable, os.path.join(self.tmp, version, "q"))
+            self.assertTrue(child_path.startswith(os.path.join(self.tmp, version) + os.pathsep))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import unittest
+
+from components.selector import ComponentSelector, SelectorError
+
+
+
+class TestSelector(unittest.TestCase):
+
+    ORDER = ["core.hdb", "core.rdb", "cep.feed_0", "cep.feed_1", "cep.cep", "core.monitor", "access.ap", "core2.hdb"]
+    GROUPS = {"kdb": ["core.rdb", "core.hdb"], "cep": ["cep.cep", "cep.feed_0", "cep.feed_1"]}
+    STATUS = {"core.hdb": "RUNNING", "core.rdb": "TERMINATED", "cep.feed_1": "TERMINATED"}
+
+    def setUp(self):
+        self.selector = ComponentSelector(self.ORDER, self.GROUPS)
+
+    def select(self, *selectors):
+        return self.selector.select(selectors, status = lambda uid: self.STATUS.get(uid, "STOPPED"))
+
+    def testSelect(self):
+        self.assertEqual(self.select("*"), self.ORDER)
+        self.assertEqual(self.select("core.monitor", "kdb"), ["core.hdb", "core.rdb", "core.monitor"])
+        self.assertEqual(self.select("core"), ["core.hdb", "core.rdb", "core.monitor", "core2.hdb"])  # namespace is an identifier prefix
+        self.assertEqual(self.select("acc"), ["access.ap"])  # identifier prefix
+        self.assertEqual(self.select("core.rdb", "core.rdb"), ["core.rdb"])
+
+    def testNegation(self):
+        self.assertEqual(self.select("*", "!cep", "!core.hdb"), ["core.rdb", "core.monitor", "access.ap", "core2.hdb"])
+        self.assertEqual(self.select("!cep"), [])
+
+    def testPatterns(self):
+        self.assertEqual(self.select("cep.feed_*"), ["cep.feed_0", "cep.feed_1"])
+        self.assertEqual(self.select("*.?db"), ["core.hdb", "core.rdb", "core2.hdb"])
+        self.assertEqual(self.select("/^c.*[0-9]$/"), ["cep.feed_0", "cep.feed_1"])
+        self.assertEqual(self.select("*", "!/feed/"), ["core.hdb", "core.rdb", "cep.cep", "core.monitor", "access.ap", "core2.hdb"])
+        self.assertEqual(self.select("*", "!missing.*", "!/missing/"), self.ORDER)
+
+    def testStatus(self):
+        self.assertEqual(self.select("status=terminated"), ["core.rdb", "cep.feed_1"])
+        self.assertEqual(self.select("core", "!status=RUNNING,TERMINATED"), ["core.monitor", "core2.hdb"])
+        with self.assertRaises(SelectorError):
+            self.selector.select(["status=RUNNING"])
+
+    def testInvalid(self):
+        for selector in ("missing", "core.missing", "a.b.c", "/(/", "missing.*", "/missing/"):
+            with self.assertRaises(SelectorError):
+                self.select(selector)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
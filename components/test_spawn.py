@@ -0,0 +1,105 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import errno
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from osutil import _spawn
+from osutil._common import find_executable
+
+
+
+@unittest.skipUnless(_spawn.is_supported(), "posix_spawn is not available")
+class TestSpawn(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def spawn(self, script, **kwargs):
+        return _spawn.spawn([os.path.basename(sys.executable), "-c", script], **kwargs)
+
+    def testSpawn(self):
+        env = {"PATH": os.path.dirname(sys.executable), "YAK_TEST": "spawned"}
+        with open(os.path.join(self.tmp, "stdout"), "w") as stdout:
+            p = self.spawn("import os; print os.environ['YAK_TEST'], os.getpgrp() == os.getpid(), os.getcwd()",
+                           cwd = self.tmp, env = env, stdout = stdout)
+        self.assertEqual(p.wait(), 0)
+        self.assertEqual(p.poll(), 0)
+        with open(os.path.join(self.tmp, "stdout")) as f:
+            self.assertEqual(f.read().split(), ["spawned", "True", os.path.realpath(self.tmp)])
+
+    def testDescriptors(self):
+        env = {"PATH": os.path.dirname(sys.executable)}
+        functions = _spawn._functions()
+        try:
+            with open(os.path.join(self.tmp, "open"), "w") as opened, open(os.devnull, "w") as devnull:
+                for closefrom in (functions[2], None):  # closefrom_np and descriptors closed one by one
+                    _spawn.__functions__ = functions[:2] + (closefrom,)
+                    p = self.spawn("import os; os.fstat({0})".format(opened.fileno()), env = env, stderr = devnull)
+                    self.assertEqual(p.wait(), 1)  # descriptor is not inherited
+        finally:
+            _spawn.__functions__ = functions
+
+    def testLazyLibrary(self):
+        # importing osutil neither loads the C library nor runs ldconfig via ctypes.util.find_library
+        script = "import sys, osutil; print 'ctypes.util' in sys.modules, osutil._common.__libc__ is None, osutil._spawn.__functions__ is None"
+        output = subprocess.check_output([sys.executable, "-c", script], cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.split(), ["False", "True", "True"])
+
+    def testReturnCode(self):
+        env = {"PATH": os.path.dirname(sys.executable)}
+        self.assertEqual(self.spawn("import sys; sys.exit(3)", env = env).wait(), 3)
+
+        p = self.spawn("import time; time.sleep(30)", env = env)
+        self.assertEqual(p.poll(), None)
+        os.kill(p.pid, signal.SIGTERM)
+        self.assertEqual(p.wait(), -signal.SIGTERM)
+
+    def testMissingExecutable(self):
+        with self.assertRaises(OSError) as cm:
+            _spawn.spawn(["yak_missing_executable"], env = {"PATH": self.tmp})
+        self.assertEqual(cm.exception.errno, errno.ENOENT)
+
+        if _spawn.is_supported(self.tmp):
+            with self.assertRaises(OSError) as cm:
+                _spawn.spawn([sys.executable, "-c", "pass"], cwd = os.path.join(self.tmp, "missing"))
+            self.assertEqual(cm.exception.errno, errno.ENOENT)
+
+    def testFindExecutable(self):
+        executable = os.path.join(self.tmp, "run")
+        with open(executable, "w") as f:
+            f.write("#!/bin/sh\n")
+        self.assertIsNone(find_executable("run", self.tmp))
+        os.chmod(executable, 0755)
+        self.assertEqual(find_executable("run", os.pathsep.join(["/nonexistent", self.tmp])), executable)
+        self.assertEqual(find_executable("bin/run", "/nonexistent"), "bin/run")
+        self.assertEqual(find_executable("run", ".", cwd = self.tmp), executable)
+
+        # absolute executable is started as given, without searching the path
+        self.assertEqual(_spawn.spawn([executable], env = {"PATH": "/nonexistent"}).wait(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
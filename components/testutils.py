@@ -0,0 +1,40 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from components.component import Component, ComponentConfiguration
+
+
+def create_configuration(uid, tmp = None, **settings):
+    """
+    Parses configuration of a single component as if it was defined in the configuration file.
+    @param uid: component identifier
+    @param tmp: directory used as binPath, dataPath and logPath unless given in settings
+    @param settings: component parameters, type defaults to cmd
+    @return: ComponentConfiguration
+    """
+    cfg = dict(type = "cmd", command = "sleep 60", startWait = "0")
+    if tmp:
+        cfg.update(binPath = tmp, dataPath = tmp, logPath = tmp)
+    cfg.update(settings)
+    return ComponentConfiguration.create_instance(cfg["type"].split(":")[0], tuple(uid.split(".")), (cfg, {}, {}))
+
+def create_component(uid, tmp = None, **settings):
+    """
+    Creates component with configuration parsed by create_configuration.
+    @return: Component of the configured type
+    """
+    configuration = create_configuration(uid, tmp, **settings)
+    return Component.create_instance(settings.get("type", "cmd").split(":")[0], uid, configuration = configuration)
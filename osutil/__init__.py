@@ -14,20 +14,29 @@
 #  limitations under the License.
 #
 
+import errno
 import os
 import sys
+import threading
+
+from contextlib import contextmanager
+
+from osutil._common import MEMORY_POLICIES, ProcessInfo, find_executable
 
 
 __all__ = ["is_alive", "is_empty", "execute",
            "terminate", "interrupt", "get_command_line",
            "get_username", "symlink", "get_affinity", "set_affinity",
            "get_cpu_sys", "get_cpu_user", "get_cpu_percent",
-           "get_mem_sys", "get_mem_user", "get_mem_percent"]
+           "get_mem_sys", "get_mem_user", "get_mem_percent",
+           "get_start_time", "get_boot_id", "ProcessInfo", "snapshot", "find_executable",
+           "get_numa_nodes", "placement", "MEMORY_POLICIES"]
 
 def __nop__(*args):
     pass
 
 def set_affinity(pid, cpus):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.cpu_affinity(cpus)
@@ -35,12 +44,54 @@ def set_affinity(pid, cpus):
         pass
 
 def get_affinity(pid):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.cpu_affinity()
     except psutil.NoSuchProcess:
         pass
 
+def get_start_time(pid):
+    """Returns token identifying process start time, None if process is not alive"""
+    import psutil
+    try:
+        p = psutil.Process(pid)
+        return p.create_time() if p.status() != psutil.STATUS_ZOMBIE else None
+    except psutil.NoSuchProcess:
+        return None
+
+def get_boot_id():
+    """Returns identifier of the current system boot: boot time in whole seconds, may drift by a second between calls"""
+    import psutil
+    return str(int(round(psutil.boot_time())))
+
+def get_numa_nodes():
+    """Returns dictionary: numa node -> list of its cpus, empty if NUMA topology is not available"""
+    return dict()
+
+__placement_lock__ = threading.RLock()
+
+@contextmanager
+def placement(cpus = None, nodes = None, policy = None):
+    """
+    Applies cpu affinity to processes started within the block. Affinity is inherited from the current process,
+    so it is set for the duration of the block and concurrent blocks are serialized.
+    @param cpus: list of cpus
+    @param nodes: list of numa nodes memory allocation is bound to
+    @param policy: memory policy, one of MEMORY_POLICIES
+    """
+    if policy and policy != "default":
+        raise OSError(errno.ENOSYS, "Memory policy is not supported on {0}".format(sys.platform))
+    with __placement_lock__:
+        affinity = get_affinity(os.getpid()) if cpus else None
+        if cpus:
+            set_affinity(os.getpid(), cpus)
+        try:
+            yield
+        finally:
+            if affinity:
+                set_affinity(os.getpid(), affinity)
+
 
 if sys.platform.lower().startswith("win32"):
     from osutil._win32 import *
@@ -61,6 +112,7 @@ def file_size(path):
 
 # generic from psutil
 def get_cpu_sys(pid):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.cpu_times().system
@@ -68,6 +120,7 @@ def get_cpu_sys(pid):
         pass
 
 def get_cpu_user(pid):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.cpu_times().user
@@ -75,6 +128,7 @@ def get_cpu_user(pid):
         pass
 
 def get_cpu_percent(pid):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.cpu_percent(interval = None)
@@ -82,6 +136,7 @@ def get_cpu_percent(pid):
         pass
 
 def get_memory_rss(pid):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.memory_info().rss
@@ -89,6 +144,7 @@ def get_memory_rss(pid):
         pass
 
 def get_memory_vms(pid):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.memory_info().vms
@@ -96,9 +152,55 @@ def get_memory_vms(pid):
         pass
 
 def get_memory_percent(pid):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.memory_percent()
     except psutil.NoSuchProcess:
         pass
 
+@contextmanager
+def __oneshot__(p):
+    if hasattr(p, "oneshot"):  # psutil >= 5.0
+        with p.oneshot():
+            yield
+    else:
+        yield
+
+def psutil_snapshot(pids, affinity = False):
+    """
+    Collects information about multiple processes in a single pass.
+    @param pids: list of process identifiers
+    @param affinity: whether cpu affinity should be collected
+    @return: dictionary: pid -> ProcessInfo, processes which do not exist are reported as not alive
+    """
+    import psutil
+    processes = dict()
+    total_memory = None
+
+    for pid in set(pids):
+        try:
+            p = psutil.Process(pid)
+            with __oneshot__(p):
+                alive = p.status() != psutil.STATUS_ZOMBIE
+                cmdline = p.cmdline()
+                create_time = p.create_time()
+                cpu = p.cpu_times()
+                mem = p.memory_info()
+                cpus = p.cpu_affinity() if affinity and hasattr(p, "cpu_affinity") else None
+            total_memory = total_memory or psutil.virtual_memory().total
+            processes[pid] = ProcessInfo(pid, alive, cmdline, create_time, create_time if alive else None,
+                                         cpu.user, cpu.system, mem.rss, mem.vms, mem.rss * 100.0 / total_memory, cpus)
+        except psutil.NoSuchProcess:
+            processes[pid] = ProcessInfo(pid, False, None, None, None, None, None, None, None, None, None)
+        except psutil.AccessDenied:
+            processes[pid] = ProcessInfo(pid, True, None, None, get_start_time(pid), None, None, None, None, None, None)
+
+    return processes
+
+
+# native /proc reader replaces psutil based snapshot on linux
+if sys.platform.lower().startswith("linux"):
+    from osutil._linux import read_processes as snapshot
+else:
+    snapshot = psutil_snapshot
@@ -0,0 +1,101 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import ctypes
+import os
+import sys
+
+from collections import namedtuple
+
+
+def parse_cpu_list(value):
+    """Parses list of cpus in format used by the kernel, e.g.: 0-3,8,10-11"""
+    cpus = []
+    for cpu_range in value.strip().split(","):
+        if cpu_range:
+            bounds = map(int, cpu_range.split("-"))
+            cpus.extend(range(bounds[0], bounds[-1] + 1))
+    return cpus
+
+def format_cpu_list(cpus):
+    """Formats list of cpus in format used by the kernel, e.g.: 0-3,8,10-11"""
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else "{0}-{1}".format(first, last) for first, last in ranges)
+
+
+# memory policies of set_mempolicy(2)
+MEMORY_POLICIES = {"default": 0, "preferred": 1, "bind": 2, "interleave": 3, "local": 4}
+
+ProcessInfo = namedtuple("ProcessInfo", ["pid", "alive", "cmdline", "create_time", "start_time", "cpu_user", "cpu_sys", "mem_rss", "mem_vms", "mem_percent", "cpu_affinity"])
+
+
+__libc__ = None
+
+def load_libc():
+    """
+    Returns handle of the C library shared by osutil modules, loaded on first use. The library is located with
+    ctypes.util.find_library only if it cannot be loaded by its usual name, find_library runs ldconfig on Linux.
+    @raise OSError: if the library cannot be loaded
+    """
+    global __libc__
+    if __libc__ is None:
+        try:
+            __libc__ = ctypes.CDLL("libc.so.6" if sys.platform.startswith("linux") else "libc.dylib", use_errno = True)
+        except OSError:
+            from ctypes.util import find_library
+            __libc__ = ctypes.CDLL(find_library("c"), use_errno = True)
+    return __libc__
+
+
+__executables__ = dict()
+
+def _is_executable(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+def find_executable(name, path, cwd = None):
+    """
+    Locates executable in the search path, locations are cached per (search path, name) pair.
+    @param name: name of the executable, returned unchanged if it contains directory
+    @param path: search path, list of directories separated with os.pathsep
+    @param cwd: directory relative entries of the search path are resolved against
+    @return: absolute location of the executable, None if executable cannot be found
+    """
+    if os.path.dirname(name):
+        return name
+
+    key = (path, name, cwd)
+    location = __executables__.get(key)
+    if location and _is_executable(location):
+        return location
+
+    extensions = [""]
+    if sys.platform.lower().startswith("win32") and not os.path.splitext(name)[1]:
+        extensions += os.environ.get("PATHEXT", ".EXE").split(os.pathsep)
+
+    for directory in path.split(os.pathsep):
+        for extension in extensions:
+            location = os.path.abspath(os.path.join(cwd or os.curdir, directory, name + extension))
+            if _is_executable(location):
+                __executables__[key] = location
+                return location
+    __executables__.pop(key, None)
+    return None
@@ -16,21 +16,54 @@
 
 import signal
 
+import ctypes
+import errno
 import os
-import psutil
+import platform
 import pwd
 import subprocess
 
+from contextlib import contextmanager
+
+from osutil import _spawn
+
+from osutil._common import MEMORY_POLICIES, ProcessInfo, format_cpu_list, load_libc, parse_cpu_list
+
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+PROC_ROOT = "/proc"
+NODE_ROOT = "/sys/devices/system/node"
+
+# (get_mempolicy, set_mempolicy) system call numbers, glibc does not provide wrappers
+MEMPOLICY_SYSCALLS = {"x86_64": (239, 238), "aarch64": (236, 237), "i386": (275, 276), "i686": (275, 276),
+                      "ppc64": (260, 261), "ppc64le": (260, 261), "s390x": (269, 270)}
+
+MASK_BITS = 1024
+
+__boot_id__ = None
+
 def signal_ignore():
     os.setpgrp()
 
 def is_alive(pid):
+    import psutil
     if pid:
-        return psutil.pid_exists(pid)
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+        except psutil.AccessDenied:
+            return True
     else:
         return False
 
 def execute(cmd, bin_path, env, stdin = open(os.devnull, "r+"), stdout = None, stderr = None):
+    if _spawn.is_supported(bin_path):
+        return _spawn.spawn(cmd, cwd = bin_path, env = env, stdin = stdin, stdout = stdout, stderr = stderr)
+    return execute_popen(cmd, bin_path, env, stdin, stdout, stderr)
+
+def execute_popen(cmd, bin_path, env, stdin = open(os.devnull, "r+"), stdout = None, stderr = None):
     return subprocess.Popen(cmd,
                              stdin = stdin,
                              stdout = stdout,
@@ -41,6 +74,7 @@ def execute(cmd, bin_path, env, stdin = open(os.devnull, "r+"), stdout = None, s
                              )
 
 def terminate(pid, force = False):
+    import psutil
     if pid:
         try:
             p = psutil.Process(pid)
@@ -52,6 +86,7 @@ def terminate(pid, force = False):
             raise OSError("Failed attempt to terminate process with pid: %s.\n%s" % (pid, e))
 
 def interrupt(pid):
+    import psutil
     if pid:
         try:
             p = psutil.Process(pid)
@@ -66,9 +101,181 @@ def symlink(file, link):
     os.symlink(file, link)
 
 def get_command_line(pid):
+    import psutil
     try:
         p = psutil.Process(pid)
         return p.cmdline()
     except psutil.NoSuchProcess:
         pass
 
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _boot_time():
+    for line in _read(os.path.join(PROC_ROOT, "stat")).splitlines():
+        if line.startswith("btime"):
+            return float(line.split()[1])
+
+def _total_memory():
+    for line in _read(os.path.join(PROC_ROOT, "meminfo")).splitlines():
+        if line.startswith("MemTotal:"):
+            return int(line.split()[1]) * 1024
+
+def get_numa_nodes():
+    """Returns dictionary: numa node -> list of its cpus, empty if NUMA topology is not available"""
+    nodes = dict()
+    try:
+        entries = os.listdir(NODE_ROOT)
+    except OSError:
+        return nodes
+    for entry in entries:
+        if entry.startswith("node") and entry[4:].isdigit():
+            try:
+                nodes[int(entry[4:])] = parse_cpu_list(_read(os.path.join(NODE_ROOT, entry, "cpulist")))
+            except (IOError, OSError):
+                pass
+    return nodes
+
+
+def _mask(values):
+    word = 8 * ctypes.sizeof(ctypes.c_ulong)
+    mask = (ctypes.c_ulong * ((max([MASK_BITS] + [v + 1 for v in values]) + word - 1) // word))()
+    for value in values:
+        mask[value // word] |= 1 << (value % word)
+    return mask
+
+def _unmask(mask):
+    word = 8 * ctypes.sizeof(ctypes.c_ulong)
+    return [i * word + bit for i in xrange(len(mask)) for bit in xrange(word) if mask[i] >> bit & 1]
+
+def _errcheck(result):
+    if result < 0:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e))
+    return result
+
+def _mempolicy_syscall(index, *args):
+    syscalls = MEMPOLICY_SYSCALLS.get(platform.machine())
+    if not syscalls:
+        raise OSError(errno.ENOSYS, "Memory policy is not supported on {0}".format(platform.machine()))
+    return _errcheck(load_libc().syscall(syscalls[index], *args))
+
+def _get_thread_affinity():
+    mask = _mask([])
+    _errcheck(load_libc().sched_getaffinity(0, ctypes.sizeof(mask), mask))
+    return _unmask(mask)
+
+def _set_thread_affinity(cpus):
+    mask = _mask(cpus)
+    _errcheck(load_libc().sched_setaffinity(0, ctypes.sizeof(mask), mask))
+
+def _get_thread_mempolicy():
+    mode, mask = ctypes.c_int(), _mask([])
+    _mempolicy_syscall(0, ctypes.byref(mode), mask, ctypes.c_ulong(len(mask) * 8 * ctypes.sizeof(ctypes.c_ulong)), None, ctypes.c_ulong(0))
+    return mode.value, _unmask(mask)
+
+def _set_thread_mempolicy(mode, nodes):
+    mask = _mask(nodes)
+    _mempolicy_syscall(1, ctypes.c_int(mode), mask if nodes else None, ctypes.c_ulong(len(mask) * 8 * ctypes.sizeof(ctypes.c_ulong) + 1 if nodes else 0))
+
+@contextmanager
+def placement(cpus = None, nodes = None, policy = None):
+    """
+    Applies cpu affinity and memory policy to the calling thread for the duration of the block. Processes
+    started within the block inherit them, other threads and the yak process itself are not affected.
+    @param cpus: list of cpus
+    @param nodes: list of numa nodes memory allocation is bound to
+    @param policy: memory policy, one of MEMORY_POLICIES
+    """
+    affinity = mempolicy = None
+    try:
+        if cpus:
+            affinity = _get_thread_affinity()
+            try:
+                _set_thread_affinity(cpus)
+            except OSError, e:
+                raise OSError(e.errno, "Cannot set cpu affinity {0}: {1}".format(format_cpu_list(cpus), e.strerror))
+        if policy:
+            mempolicy = _get_thread_mempolicy()
+            try:
+                _set_thread_mempolicy(MEMORY_POLICIES[policy], nodes if policy != "local" else [])
+            except OSError, e:
+                raise OSError(e.errno, "Cannot set memory policy {0} {1}: {2}".format(policy, format_cpu_list(nodes or []), e.strerror))
+        yield
+    finally:
+        if mempolicy:
+            _set_thread_mempolicy(*mempolicy)
+        if affinity:
+            _set_thread_affinity(affinity)
+
+def get_start_time(pid):
+    """Returns process start time in clock ticks since boot, None if process is not alive"""
+    try:
+        stat = _read(os.path.join(PROC_ROOT, str(pid), "stat"))
+    except (IOError, OSError):
+        return None
+    fields = stat[stat.rfind(")") + 2:].split()
+    return int(fields[19]) if fields[0] != "Z" else None
+
+def get_boot_id():
+    """Returns identifier of the current system boot"""
+    global __boot_id__
+    if not __boot_id__:
+        __boot_id__ = _read(os.path.join(PROC_ROOT, "sys", "kernel", "random", "boot_id")).strip()
+    return __boot_id__
+
+def read_processes(pids, affinity = False):
+    """
+    Reads information about multiple processes directly from /proc.
+    @param pids: list of process identifiers
+    @param affinity: whether cpu affinity should be collected
+    @return: dictionary: pid -> ProcessInfo, processes which do not exist are reported as not alive
+    """
+    processes = dict()
+    boot_time = None
+    total_memory = None
+
+    for pid in set(pids):
+        path = os.path.join(PROC_ROOT, str(pid))
+        try:
+            stat = _read(os.path.join(path, "stat"))
+            fields = stat[stat.rfind(")") + 2:].split()
+            statm = _read(os.path.join(path, "statm")).split()
+            cmdline = _read(os.path.join(path, "cmdline"))
+            cpus = None
+            if affinity:
+                for line in _read(os.path.join(path, "status")).splitlines():
+                    if line.startswith("Cpus_allowed_list:"):
+                        cpus = parse_cpu_list(line.split(":", 1)[1])
+        except (IOError, OSError), e:
+            if e.errno in (errno.ENOENT, errno.ESRCH):
+                processes[pid] = ProcessInfo(pid, False, None, None, None, None, None, None, None, None, None)
+            elif e.errno in (errno.EPERM, errno.EACCES):
+                processes[pid] = ProcessInfo(pid, True, None, None, get_start_time(pid), None, None, None, None, None, None)
+            else:
+                raise
+            continue
+
+        boot_time = boot_time or _boot_time()
+        total_memory = total_memory or _total_memory()
+
+        if cmdline.endswith("\x00"):
+            cmdline = cmdline[:-1]
+        rss = int(statm[1]) * PAGE_SIZE
+        alive = fields[0] != "Z"
+
+        processes[pid] = ProcessInfo(pid = pid,
+                                     alive = alive,
+                                     cmdline = cmdline.split("\x00") if cmdline else [],
+                                     create_time = boot_time + float(fields[19]) / CLOCK_TICKS,
+                                     start_time = int(fields[19]) if alive else None,
+                                     cpu_user = float(fields[11]) / CLOCK_TICKS,
+                                     cpu_sys = float(fields[12]) / CLOCK_TICKS,
+                                     mem_rss = rss,
+                                     mem_vms = int(statm[0]) * PAGE_SIZE,
+                                     mem_percent = rss * 100.0 / total_memory,
+                                     cpu_affinity = cpus)
+
+    return processes
@@ -21,16 +21,28 @@ import psutil
 import pwd
 import subprocess
 
+from osutil import _spawn
+
 def signal_ignore():
     os.setpgrp()
 
 def is_alive(pid):
     if pid:
-        return psutil.pid_exists(pid)
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+        except psutil.AccessDenied:
+            return True
     else:
         return False
 
 def execute(cmd, bin_path, env, stdin = open(os.devnull, "r+"), stdout = None, stderr = None):
+    if _spawn.is_supported(bin_path):
+        return _spawn.spawn(cmd, cwd = bin_path, env = env, stdin = stdin, stdout = stdout, stderr = stderr)
+    return execute_popen(cmd, bin_path, env, stdin, stdout, stderr)
+
+def execute_popen(cmd, bin_path, env, stdin = open(os.devnull, "r+"), stdout = None, stderr = None):
     return subprocess.Popen(cmd,
                              stdin = stdin,
                              stdout = stdout,
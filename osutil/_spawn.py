@@ -0,0 +1,219 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+"""
+Process launcher based on posix_spawn(3) called via ctypes.
+
+Unlike subprocess.Popen with preexec_fn, no Python code is executed in the child: process group,
+working directory and standard streams are set up by the C library between fork (or vfork) and exec,
+which keeps launch latency independent of the size of the yak process.
+"""
+
+import ctypes
+import errno
+import os
+import sys
+
+from osutil._common import find_executable, load_libc
+
+
+POSIX_SPAWN_SETPGROUP = 0x02
+
+# posix_spawnattr_t and posix_spawn_file_actions_t are opaque, buffer is larger than both on supported platforms
+OPAQUE_SIZE = 1024
+
+_active = []
+
+__functions__ = None
+
+
+def _load_libc():
+    try:
+        libc = load_libc()
+        libc.posix_spawn.argtypes = [ctypes.POINTER(ctypes.c_int), ctypes.c_char_p, ctypes.c_void_p, ctypes.c_void_p,
+                                     ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_char_p)]
+        libc.posix_spawnattr_init.argtypes = [ctypes.c_void_p]
+        libc.posix_spawnattr_destroy.argtypes = [ctypes.c_void_p]
+        libc.posix_spawnattr_setflags.argtypes = [ctypes.c_void_p, ctypes.c_short]
+        libc.posix_spawnattr_setpgroup.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        libc.posix_spawn_file_actions_init.argtypes = [ctypes.c_void_p]
+        libc.posix_spawn_file_actions_destroy.argtypes = [ctypes.c_void_p]
+        libc.posix_spawn_file_actions_adddup2.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int]
+        libc.posix_spawn_file_actions_addclose.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None, None, None
+
+    try:  # glibc >= 2.29, macOS >= 10.15
+        addchdir = libc.posix_spawn_file_actions_addchdir_np
+        addchdir.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    except AttributeError:
+        addchdir = None
+    try:  # glibc >= 2.34
+        addclosefrom = libc.posix_spawn_file_actions_addclosefrom_np
+        addclosefrom.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    except AttributeError:
+        addclosefrom = None
+    return libc, addchdir, addclosefrom
+
+
+def _functions():
+    """Returns (libc, addchdir, addclosefrom) loaded on first use, libc is None if posix_spawn is not available"""
+    global __functions__
+    if __functions__ is None:
+        __functions__ = _load_libc()
+    return __functions__
+
+
+def _needs_chdir(cwd):
+    return bool(cwd) and cwd != os.curdir
+
+
+def is_supported(cwd = None):
+    """Returns True if process with given working directory can be started with posix_spawn"""
+    libc, addchdir, _ = _functions()
+    return libc is not None and (addchdir is not None or not _needs_chdir(cwd))
+
+
+def _encode(value):
+    return value.encode(sys.getfilesystemencoding() or "utf-8") if isinstance(value, unicode) else value
+
+
+def _array(values):
+    values = [_encode(v) for v in values]
+    return (ctypes.c_char_p * (len(values) + 1))(*(values + [None]))
+
+
+def _check(result):
+    if result:
+        raise OSError(result, os.strerror(result))
+
+
+def _fileno(stream):
+    return stream if isinstance(stream, (int, long)) else stream.fileno()
+
+
+def _inherited_descriptors():
+    """Returns descriptors above standard streams open in the current process"""
+    descriptors = []
+    for name in os.listdir("/proc/self/fd" if os.path.isdir("/proc/self/fd") else "/dev/fd"):
+        fd = int(name)
+        if fd > 2:
+            try:
+                os.fstat(fd)  # skips descriptor used by listdir
+                descriptors.append(fd)
+            except OSError:
+                pass
+    return descriptors
+
+
+def _cleanup():
+    for process in _active[:]:
+        if process.poll() is not None:
+            _active.remove(process)
+
+
+class SpawnedProcess(object):
+    """Handle of the spawned process, provides the subset of subprocess.Popen interface used by components"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def __del__(self):
+        # reaped by the next spawn, as subprocess does for Popen objects
+        if self.returncode is None and _active is not None:
+            _active.append(self)
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+            except OSError, e:
+                if e.errno != errno.ECHILD:
+                    raise
+                pid, status = self.pid, 0
+            if pid == self.pid:
+                self._set_returncode(status)
+        return self.returncode
+
+    def wait(self):
+        while self.returncode is None:
+            try:
+                _, status = os.waitpid(self.pid, 0)
+            except OSError, e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno != errno.ECHILD:
+                    raise
+                status = 0
+            self._set_returncode(status)
+        return self.returncode
+
+    def _set_returncode(self, status):
+        if os.WIFSIGNALED(status):
+            self.returncode = -os.WTERMSIG(status)
+        else:
+            self.returncode = os.WEXITSTATUS(status)
+
+
+def spawn(cmd, cwd = None, env = None, stdin = None, stdout = None, stderr = None):
+    """
+    Starts command in a new process group. Descriptors other than standard streams are not inherited.
+    @param cmd: command as a list of arguments, executable is searched in PATH from env unless it contains directory
+    @param cwd: working directory of the process
+    @param env: environment of the process, current environment by default
+    @param stdin, stdout, stderr: files or descriptors standard streams are redirected to, inherited if None
+    @return: SpawnedProcess
+    @raise OSError: if process cannot be started
+    """
+    if not is_supported(cwd):
+        raise OSError(errno.ENOSYS, "posix_spawn is not supported")
+
+    libc, addchdir, addclosefrom = _functions()
+    _cleanup()
+    env = os.environ if env is None else env
+    path = find_executable(cmd[0], env.get("PATH", os.defpath), cwd)
+    if not path:
+        raise OSError(errno.ENOENT, os.strerror(errno.ENOENT))
+    argv = _array(cmd)
+    envp = _array("{0}={1}".format(_encode(key), _encode(value)) for key, value in env.iteritems())
+
+    attr = ctypes.create_string_buffer(OPAQUE_SIZE)
+    actions = ctypes.create_string_buffer(OPAQUE_SIZE)
+    _check(libc.posix_spawnattr_init(attr))
+    try:
+        _check(libc.posix_spawn_file_actions_init(actions))
+        try:
+            _check(libc.posix_spawnattr_setflags(attr, POSIX_SPAWN_SETPGROUP))
+            _check(libc.posix_spawnattr_setpgroup(attr, 0))
+            if _needs_chdir(cwd):
+                _check(addchdir(actions, _encode(cwd)))
+            for fd, stream in enumerate((stdin, stdout, stderr)):
+                if stream is not None:
+                    _check(libc.posix_spawn_file_actions_adddup2(actions, _fileno(stream), fd))
+            if addclosefrom is not None:
+                _check(addclosefrom(actions, 3))
+            else:
+                for fd in _inherited_descriptors():
+                    _check(libc.posix_spawn_file_actions_addclose(actions, fd))
+
+            pid = ctypes.c_int()
+            _check(libc.posix_spawn(ctypes.byref(pid), _encode(path), actions, attr, argv, envp))
+            return SpawnedProcess(pid.value)
+        finally:
+            libc.posix_spawn_file_actions_destroy(actions)
+    finally:
+        libc.posix_spawnattr_destroy(attr)
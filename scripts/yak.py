@@ -14,6 +14,7 @@
 #  limitations under the License.
 #
 
+import bisect
 import cmd
 import logging
 import os
@@ -27,8 +28,8 @@ from datetime import datetime
 from functools import partial
 from optparse import OptionParser
 
-from osutil import get_username
-from components import manager, component
+from components import daemon
+from components.selector import ComponentSelector, SelectorError
 from components.utils import get_full_exc_info, get_short_exc_info, to_camel_case, to_underscore
 
 try:
@@ -42,9 +43,17 @@ IMPRINT = {'script': 'yak', 'tstamp': '20151223143450', 'version': '3.2.1', 'nam
 ROOT_DIR = os.path.dirname(sys.path[0])
 VIEWER = None
 HLINE = "-" * 80
+# commands interacting with the terminal are never forwarded to the daemon
+LOCAL_COMMANDS = ("console", "out", "err", "log", "quit")
 
 
 
+def get_username():
+    # osutil (psutil) is imported on first use: commands forwarded to the daemon do not pay for the import
+    from osutil import get_username
+    return get_username()
+
+
 def show_file(path, internal = False):
     if not path:
         return
@@ -76,9 +85,13 @@ class ComponentManagerShell(cmd.Cmd):
     def __init__(self, options):
         cmd.Cmd.__init__(self)
         self._options = options
-        self._manager = manager.ComponentManager(os.path.normpath(options.config), os.path.normpath(options.status))
-        self._parse_format(options.format, options.delimiter)
-        self._complete_names = sorted(set(self._manager.groups.keys()) | set(self._manager.namespaces)) + self._manager.dependencies_order[:]
+        from components.manager import ComponentManager
+        from components.cache import CompletionCache
+        self._manager = ComponentManager(os.path.normpath(options.config), os.path.normpath(options.status), options.lazy)
+        self._completion_cache = CompletionCache(completion_file(options), options.config)
+        self._selector = None
+        self._info_layout = self._parse_format(options.format, options.delimiter)
+        self._index_names()
 
         if options.alias:
             for alias, commands in options.alias.iteritems():
@@ -92,19 +105,53 @@ class ComponentManagerShell(cmd.Cmd):
                         raise ComponentManagerShellError("Alias: '{0}' refers to unknown command: '{1}'".format(alias, c))
                 setattr(self, "do_" + alias, partial(self._evaluate_alias, alias_eval))
 
-    def _parse_format(self, formating, delimiter):
+    @staticmethod
+    def _parse_format(formating, delimiter):
+        """Returns tuple (columns, header, row format) of the info command"""
         r = re.compile("\d+")
         format = [tuple(column.split(":")) for column in formating.split("#")]
-        self._info_parameters = ["{0}".format(c, r.search(f).group(0)) for (c, f) in format]
+        parameters = ["{0}".format(c, r.search(f).group(0)) for (c, f) in format]
         if delimiter == " ":
-            self._info_header = " ".join(["{0:{1}.{1}}".format(c, r.search(f).group(0)) for (c, f) in format])
-            self._info_header += "\n" + "-" * len(self._info_header)
-            self._info_format = " ".join(["{{{0}:{1}}}".format(c, f) for (c, f) in format])
+            header = " ".join(["{0:{1}.{1}}".format(c, r.search(f).group(0)) for (c, f) in format])
+            header += "\n" + "-" * len(header)
+            row_format = " ".join(["{{{0}:{1}}}".format(c, f) for (c, f) in format])
         else:
-            self._info_header = delimiter.join(self._info_parameters)
-            self._info_format = delimiter.join(["{" + p + "}" for p in self._info_parameters])
+            header = delimiter.join(parameters)
+            row_format = delimiter.join(["{" + p + "}" for p in parameters])
+        return parameters, header, row_format
+
+    def _index_names(self):
+        self._indexed_groups = set(self._manager.groups.keys()) | set(self._manager.namespaces)
+        self._complete_names = sorted(self._indexed_groups) + self._manager.dependencies_order[:]
+        self._complete_index = sorted(set(self._complete_names))  # prefix index, see completedefault
+        self._completion_cache.store(self._manager.config_digest, self._complete_names)
+
+    def _reload_configuration(self):
+        try:
+            changes = self._manager.reload_configuration()
+        except:
+            print "Configuration not reloaded, previous configuration is used:"
+            print get_short_exc_info()
+            ComponentManagerShell.logger.error(get_full_exc_info(), extra = {"user": get_username()})
+            return
+
+        if changes:
+            added, removed, modified = changes
+            ComponentManagerShell.logger.info("configuration reloaded: added %s, removed %s, modified %s", added, removed, modified, extra = {"user": get_username()})
+            print "Configuration reloaded"
+            for label, uids in (("added", added), ("removed", removed), ("modified", modified)):
+                if uids:
+                    print "  {0:<10} {1}".format(label + ":", ", ".join(uids))
+            if added or removed or self._indexed_groups != set(self._manager.groups.keys()) | set(self._manager.namespaces):
+                self._index_names()
+            else:
+                self._completion_cache.store(self._manager.config_digest, self._complete_names)
 
     # behavior configuration
+    def precmd(self, line):
+        self._reload_configuration()
+        return line
+
     def postcmd(self, stop, line):
         sys.stdout.flush()
         return False
@@ -120,13 +167,20 @@ class ComponentManagerShell(cmd.Cmd):
     def completedefault(self, text, *ignored):
         if text:
             if not text.startswith("!"):
-                return [uid for uid in self._complete_names if uid.startswith(text)]
+                return self._complete_prefix(text)
             else:
-                text = text[1:]
-                return ["!" + uid for uid in self._complete_names if uid.startswith(text)]
+                return ["!" + uid for uid in self._complete_prefix(text[1:])]
         else:
             return self._complete_names
 
+    def _complete_prefix(self, text):
+        index = self._complete_index
+        start = bisect.bisect_left(index, text)
+        end = start
+        while end < len(index) and index[end].startswith(text):
+            end += 1
+        return index[start:end]
+
     def parseline(self, line):
         if line:
             if line[0] == "%":  # add special command "%"
@@ -148,47 +202,24 @@ class ComponentManagerShell(cmd.Cmd):
         opt_parser = OptionParser()
         opt_parser.add_option("-a", "--arguments", default = None)
         opt_parser.add_option("-F", "--filter", default = None)
+        opt_parser.add_option("-j", "--jobs", type = "int", default = self._options.jobs)
+        opt_parser.add_option("-f", "--format", default = None)
+        opt_parser.add_option("-d", "--delimiter", default = None)
+        opt_parser.add_option("-c", "--config", default = None)
         return opt_parser
 
+    def serves(self, config):
+        """Returns True if commands for the given configuration file are executed with configuration of the shell"""
+        return not config or os.path.abspath(config) == os.path.abspath(self._options.config)
+
     def _get_components_list(self, identifiers):
-        components = []
-        ignored_components = set()
-
-        if len(identifiers) > 0:
-            for id in identifiers:
-                if id.startswith("!"):
-                    ignored = True
-                    id = id[1:]
-                else:
-                    ignored = False
-
-                if id == "*":
-                    if not ignored:
-                        components = self._manager.dependencies_order[:]
-                    else:
-                        ignored_components = set(self._manager.dependencies_order[:])
-                else:
-                    ids = id.split(".")
-                    if len(ids) == 1:  # namespace or group
-                        if id in self._manager.groups:
-                            group = self._manager.groups[id]
-                        else:
-                            group = [uid for uid in self._manager.dependencies_order if uid.startswith(id)]
-                        if (group):
-                            components.extend(group) if not ignored else ignored_components.update(group)
-                        else:
-                            raise ComponentManagerShellError("Trying to refer unmanaged group: {0}".format(id))
-                    elif len(ids) == 2:  # component
-                        if (id in self._manager.dependencies_order):
-                            components.append(id) if not ignored else ignored_components.add(id)
-                        else:
-                            raise ComponentManagerShellError("Trying to refer unmanaged component: {0}".format(id))
-                    else:  # error
-                        raise ComponentManagerShellError("Malformed group/component identifier: {0}".format(id))
-
-            # remove duplicates, restore runtime order, remove ignored components
-            components = [s for s in self._manager.dependencies_order if s in components and s not in ignored_components]
-        return components
+        order = self._manager.dependencies_order
+        if self._selector is None or self._selector.order != order or self._selector.groups is not self._manager.groups:
+            self._selector = ComponentSelector(order, self._manager.groups)
+        try:
+            return self._selector.select(identifiers, status = lambda uid: self._manager.components[uid].status)
+        except SelectorError, e:
+            raise ComponentManagerShellError(str(e))
 
     def _error_handler(f):  # @NoSelf
         def tracked_command(self, args):
@@ -204,6 +235,8 @@ class ComponentManagerShell(cmd.Cmd):
         def line_split(self, args):
             (params, identifiers) = self._opt_parser.parse_args(args = shlex.split(args))
             params = vars(params)
+            if not self.serves(params["config"]):
+                raise ComponentManagerShellError("Configuration {0} is not loaded, shell uses {1}".format(params["config"], self._options.config))
             f(self, identifiers, params)
         return line_split
 
@@ -316,6 +349,9 @@ class ComponentManagerShell(cmd.Cmd):
         print ""
         print "  %-10s %s" % ("-a", "allows start/restart process with extra arguments")
         print "  {0:10} {1}".format("-F", "filter info output by components status")
+        print "  {0:10} {1}".format("-j", "number of components started/stopped in parallel")
+        print "  {0:10} {1}".format("-f", "display format for info command")
+        print "  {0:10} {1}".format("-d", "column delimiter for info command")
 
     def do_quit(self, args):
         print self.outro
@@ -327,20 +363,30 @@ class ComponentManagerShell(cmd.Cmd):
     @_multiple_components_allowed
     def do_info(self, components, params):
         status_filter = params["filter"].upper().split("#") if params["filter"] else None
+        self._manager.snapshot(components)
+        self._manager.check_health(components)
+        if params["format"] or params["delimiter"]:
+            info_parameters, info_header, info_format = self._parse_format(params["format"] or self._options.format,
+                                                                           params["delimiter"] or self._options.delimiter)
+        else:
+            info_parameters, info_header, info_format = self._info_layout
 
-        print self._info_header
+        print info_header
         for component_uid in sorted(components):
             parameters = dict()
             component = self._manager.components[component_uid]
             if not status_filter or component.status in status_filter:
-                for attr in self._info_parameters:
+                for attr in info_parameters:
                     parameters[attr] = self._format_parameter(attr, getattr(component, to_underscore(attr).lower(), ""), "")
-                print self._info_format.format(**parameters)
+                print info_format.format(**parameters)
 
     @_error_handler
     @_cmd_line_split
     @_multiple_components_allowed
     def do_details(self, components, params):
+        self._manager.snapshot(components)
+        self._manager.check_health(components)
+        self._manager.assign_cores(components)
         print HLINE
         for component_uid in sorted(components):
             component = self._manager.components[component_uid]
@@ -359,6 +405,28 @@ class ComponentManagerShell(cmd.Cmd):
 
             print HLINE
 
+    @_error_handler
+    @_cmd_line_split
+    @_allow_empty_components_list
+    @_multiple_components_allowed
+    def do_check(self, components, params):
+        print "Checking configuration..."
+        failed = False
+
+        def status_callback(component_uid, status):
+            print "\t{0:<30}\t{1}".format(component_uid, "Failed" if isinstance(status, Exception) else ("OK" if status else "Skipped"))
+
+        for component_uid, status in self._manager.check(components, callback = status_callback):
+            if isinstance(status, Exception):
+                failed = True
+                print HLINE
+                print "Invalid configuration: {0}".format(component_uid)
+                print status
+
+        if failed:
+            print HLINE
+            return 1
+
     @_error_handler
     @_cmd_line_split
     @_multiple_components_allowed
@@ -371,12 +439,58 @@ class ComponentManagerShell(cmd.Cmd):
     @_multiple_components_allowed
     def do_stop(self, components, params):
         print "Stopping components..."
-        return self._apply_command(self._manager.stop, list(reversed(components)))
+        return self._apply_command(self._manager.stop, list(reversed(components)), jobs = params["jobs"])
 
     def do_restart(self, args):
         retval = self.do_stop(args)
         return retval if retval else self.do_start(args)
 
+    @_error_handler
+    @_cmd_line_split
+    @_allow_empty_components_list
+    @_multiple_components_allowed
+    def do_apply(self, components, params):
+        modified, restarted = self._manager.changed(components)
+        if not restarted:
+            print "Configuration is up to date"
+            return
+
+        print "Modified configuration:"
+        for component_uid in modified:
+            print "\t{0}".format(component_uid)
+        print "Stopping components..."
+        retval = self._apply_command(self._manager.stop, list(reversed(restarted)), jobs = params["jobs"])
+        if not retval:
+            print "Starting components..."
+            retval = self._apply_command(self._manager.start, restarted, jobs = params["jobs"])
+        return retval
+
+    @_error_handler
+    @_cmd_line_split
+    @_allow_empty_components_list
+    @_multiple_components_allowed
+    def do_plan(self, components, params):
+        from osutil._common import format_cpu_list
+        topology, allocations = self._manager.cpu_plan()
+        if not topology:
+            print "No component has cpuAffinity or cpuCores configured"
+            return
+
+        entry_format = "{0:<30} {1:<9} {2:<6} {3:>5}  {4:<20} {5}"
+        print "Topology: {0}".format(topology)
+        print HLINE
+        print entry_format.format("uid", "source", "node", "cores", "cpus", "shared with")
+        print HLINE
+        for component_uid in allocations:
+            if component_uid in components:
+                allocation = allocations[component_uid]
+                print entry_format.format(component_uid, "planned" if allocation.planned else "explicit", ",".join(map(str, allocation.nodes)),
+                                          len(allocation.cores), format_cpu_list(allocation.cpus), ", ".join(allocation.shared))
+        print HLINE
+        used = set(core for allocation in allocations.values() for core in allocation.cores)
+        free = [core for core in topology.cores if not core in used]
+        print "Free: {0} core(s), cpus: {1}".format(len(free), format_cpu_list(cpu for core in free for cpu in topology.cores[core]) or "-")
+
     @_error_handler
     @_cmd_line_split
     @_single_component_allowed
@@ -414,6 +528,7 @@ class ComponentManagerShell(cmd.Cmd):
 COMMANDS = (("start", "start component or components group"),
             ("stop", "stop component or components group"),
             ("restart", "restart component or components group"),
+            ("apply", "restart components with modified configuration and their dependents"),
             ("interrupt", "send INT signal to component or components group"),
             ("info", "display status of component or components group"),
             ("details", "display detailed information on component or components group"),
@@ -421,6 +536,8 @@ COMMANDS = (("start", "start component or components group"),
             ("out", "show single component stdout"),
             ("err", "show single component stderr"),
             ("console", "start single component in interactive mode"),
+            ("check", "validate configuration of component or components group"),
+            ("plan", "display allocation of cpu cores to components"),
             )
 
 USAGE = "Usage: %prog [COMMAND] [COMPONENT|GROUP] [OPTIONS]\n\nCommands:\n"\
@@ -445,9 +562,18 @@ def get_opt_parser():
     opt_parser.add_option("-F", "--filter", help = "status filter for info command", default = "")
     opt_parser.add_option("-A", "--alias", help = "define command alias e.g.: --alias restart_console \"stop, console\"", action = "callback", callback = define_aliases, nargs = 2, type = "str")
     opt_parser.add_option("-a", "--arguments", help = "additional arguments passed to process - valid only for 'start', 'restart' and 'console' commands", default = "")
+    opt_parser.add_option("-j", "--jobs", help = "number of components started/stopped in parallel [default: sequential]", type = "int", default = 0)
+    opt_parser.add_option("-D", "--daemon", help = "run as a daemon serving commands of yak invocations using the same status file", action = "store_true", default = False)
+    opt_parser.add_option("--completion-file", help = "print location of the completion cache and exit", action = "store_true", default = False)
+    opt_parser.add_option("-L", "--lazy", help = "parse configuration of components on first use, use 'check' command to validate configuration", action = "store_true", default = False)
     return opt_parser
 
 
+def completion_file(options):
+    """Returns location of the completion cache used by the bash completion script"""
+    return os.path.normpath(options.status) + ".completion"
+
+
 def load_history(history_file):
     try:
         import readline
@@ -478,22 +604,95 @@ def init_logging(logfile):
                         )
 
 
+def get_exit_code(exit_status):
+    if exit_status is None or isinstance(exit_status, (int, long)):
+        return exit_status or 0
+    print exit_status
+    return 1
+
+
+def command_line(args, options, forwarded = False):
+    """
+    Returns command line executed by the shell. Command line forwarded to the daemon passes all options of
+    the invocation accepted by shell commands explicitly, so that the daemon does not apply its own defaults.
+    """
+    quote = lambda value: "\"{0}\"".format(str(value).replace("\\", "\\\\").replace("\"", "\\\""))
+    line = " ".join(args)
+    if options.arguments:
+        line += " -a " + quote(options.arguments)
+    if options.filter:
+        line += " -F " + quote(options.filter)
+    if forwarded:
+        line += " -j {0} -f {1} -d {2} -c {3}".format(options.jobs, quote(options.format), quote(options.delimiter),
+                                                       quote(os.path.abspath(options.config)))
+    return line
+
+
+def run_command(shell, line):
+    """
+    Executes command received by the daemon, output is forwarded to the client. Commands referring
+    to a different configuration file are declined and executed by the client.
+    """
+    shell.stdout = sys.stdout
+    try:
+        command, args, _ = shell.parseline(line)
+        if command and not shell.serves(vars(shell._opt_parser.parse_args(shlex.split(args or ""))[0])["config"]):
+            return None
+    except SystemExit:
+        pass  # invalid options are reported by the command
+    try:
+        shell.precmd(line)
+        return get_exit_code(shell.onecmd(line))
+    except SystemExit, e:
+        return get_exit_code(e.code)
+    except:
+        print get_short_exc_info()
+        ComponentManagerShell.logger.error(get_full_exc_info(), extra = {"user": get_username()})
+        return 1
+
+
+def serve(shell, options):
+    server = daemon.DaemonServer(daemon.socket_path(os.path.normpath(options.status)), partial(run_command, shell))
+    server.bind()
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
+    print "Serving commands on: {0}".format(server.path)
+    sys.stdout.flush()
+    server.serve_forever()
+
+
 if __name__ == "__main__":
     opts = shlex.split(os.environ.get("YAK_OPTS", "").replace('\\', '/'), posix = True)
     opts.extend(sys.argv[1:])
 
     opt_parser = get_opt_parser()
     (options, args) = opt_parser.parse_args(args = opts)
+    if options.completion_file:
+        print os.path.abspath(completion_file(options))
+        sys.exit(0)
+    line = command_line(args, options)
+
+    # aliases defined by the invocation are not known to the daemon
+    if args and not options.daemon and not args[0] in LOCAL_COMMANDS and not args[0] in (options.alias or {}):
+        try:
+            exit_status = daemon.execute(daemon.socket_path(os.path.normpath(options.status)), command_line(args, options, True))
+        except daemon.DaemonError, e:
+            print "Daemon failed to execute command: {0}".format(e)
+            sys.exit(1)
+        if exit_status is not None:
+            sys.exit(exit_status)  # served by the daemon
+
     init_logging(options.log)
     load_history(os.path.expanduser("~/.yak.history"))
     VIEWER = options.viewer
     signal.signal(signal.SIGINT, signal.SIG_IGN)  # ignore keyboard interrupt
     try:
         shell = ComponentManagerShell(options)
-        if len(args) == 0:
+        if options.daemon:
+            exit_status = serve(shell, options)
+        elif len(args) == 0:
             exit_status = shell.cmdloop()
         elif len(args) >= 1:
-            exit_status = shell.onecmd(" ".join(args) + (" -a \"" + options.arguments + "\""  if options.arguments else "") + (" -F \"" + options.filter + "\""  if options.filter else ""))
+            exit_status = shell.onecmd(line)
     except (SystemExit, KeyboardInterrupt):
         exit_status = 0
     except:
@@ -1,11 +1,47 @@
+# completion cache is written by yak next to the status file, its location is taken from
+# YAK_COMPLETION or from the -s/--status option (YAK_OPTS or command line); otherwise the default
+# location is reported by 'yak --completion-file' and remembered for the current YAK_OPTS
+_yak_completion_file() {
+  local words=( ${YAK_OPTS} "${COMP_WORDS[@]}" ) status i
+  if [ -n "${YAK_COMPLETION}" ]; then
+      _yak_completion="${YAK_COMPLETION}"
+      return 0
+  fi
+  for ((i = 0; i < ${#words[@]}; i++)); do
+      case "${words[i]}" in
+          -s|--status) status="${words[i+1]}" ;;
+          --status=*) status="${words[i]#--status=}" ;;
+          -s*) status="${words[i]#-s}" ;;
+      esac
+  done
+  if [ -n "${status}" ]; then
+      _yak_completion="${status}.completion"
+  elif [ -z "${_yak_default_completion}" ] || [ "${_yak_default_completion_opts}" != "${YAK_OPTS}" ]; then
+      _yak_default_completion="$(yak --completion-file 2>/dev/null)"
+      _yak_default_completion_opts="${YAK_OPTS}"
+      _yak_completion="${_yak_default_completion}"
+  else
+      _yak_completion="${_yak_default_completion}"
+  fi
+}
+
+# cache is used only if its header ('# <sha1 of the configuration> <configuration file>') matches
+# the current contents of the configuration file
+_yak_completion_valid() {
+  local mark digest config actual
+  [ -n "${_yak_completion}" ] && [ -r "${_yak_completion}" ] || return 1
+  read -r mark digest config < "${_yak_completion}"
+  [ "${mark}" = "#" ] && [ -n "${digest}" ] && [ -r "${config}" ] || return 1
+  actual="$( (sha1sum || shasum) < "${config}" 2>/dev/null )"
+  [ "${actual%% *}" = "${digest}" ]
+}
+
 _yak() {
   local cur prev opts services
   COMPREPLY=()
   cur="${COMP_WORDS[COMP_CWORD]}"
   prev="${COMP_WORDS[COMP_CWORD-1]}"
-  opts="start stop restart info interrupt console log err out details test"
-  services="$(yak !)"
-  negservices="$(yak ! | sed -e 's/^/!/g')"
+  opts="start stop restart apply info interrupt console log err out details check plan"
 
   case "${prev}" in
       yak)
@@ -13,7 +49,17 @@ _yak() {
           return 0
           ;;
       *)
-          COMPREPLY=( $(compgen -W "${services} ${negservices}" -- ${cur}) )
+          _yak_completion_file
+          if _yak_completion_valid; then
+              services="$(grep -v '^#' "${_yak_completion}")"
+          else
+              services="$(yak !)"
+          fi
+          if [ "${cur:0:1}" = "!" ]; then
+              COMPREPLY=( $(compgen -P "!" -W "${services}" -- "${cur:1}") )
+          else
+              COMPREPLY=( $(compgen -W "${services}" -- ${cur}) )
+          fi
           return 0
           ;;
   esac